@@ -0,0 +1,175 @@
+"""
+Modelo y delegate de la tabla 'Analytes'.
+
+AnalytesModel guarda por fila el texto del Amount y el resultado calculado (Final
+Result / Status); AmountDelegate crea un único QLineEdit (con validador) mientras
+se edita una celda de Amount, en lugar de un widget por analito. El pegado de
+varias celdas se resuelve por número de fila (pasteRequested).
+"""
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, pyqtSignal
+from PyQt5.QtGui import QColor, QDoubleValidator, QKeySequence
+from PyQt5.QtWidgets import QApplication, QLineEdit, QStyledItemDelegate
+
+ANALYTE_HEADERS = ("Analyte Name", "Amount", "LOQ", "State Limit", "Final Result", "Status")
+AMOUNT_COLUMN = 1
+RESULT_COLUMN = 4
+STATUS_COLUMN = 5
+
+_CENTERED = Qt.AlignCenter
+_ND_BACKGROUND = QColor('lightgreen')
+_RESULT_BACKGROUND = QColor('white')
+_STATUS_COLORS = {"Fail": QColor('red'), "Pass": QColor('darkgreen')}
+# La vista pide muchos roles por celda (ResizeToContents recorre todas las filas):
+# los que no se usan se descartan antes de mirar el índice
+_DATA_ROLES = frozenset((Qt.DisplayRole, Qt.EditRole, Qt.TextAlignmentRole, Qt.BackgroundRole, Qt.ForegroundRole))
+
+
+class AnalytesModel(QAbstractTableModel):
+    """
+    Una fila por analito. Solo la columna Amount es editable.
+
+    - amountChanged(row): el usuario editó el Amount de esa fila (setData). Los
+      cambios por código (set_amount_texts) no la emiten, como un blockSignals.
+    """
+    amountChanged = pyqtSignal(int)
+
+    def __init__(self, analytes, loq, state_limits, parent=None):
+        super().__init__(parent)
+        self.analytes = list(analytes)
+        self._fixed = [(str(loq), str(state_limits.get(name, 0.0))) for name in self.analytes]
+        self._amounts = ["0"] * len(self.analytes)
+        self._results = ["ND"] * len(self.analytes)
+        self._statuses = ["-"] * len(self.analytes)
+
+    # ---------- Amounts ----------
+    def amount_text(self, row):
+        return self._amounts[row]
+
+    def amount_texts(self):
+        return list(self._amounts)
+
+    def set_amount_texts(self, texts_by_row):
+        """
+        Asigna varios Amounts {fila: texto} sin emitir amountChanged; un solo
+        dataChanged para el rango afectado. Devuelve las filas cambiadas.
+        """
+        changed = []
+        for row, text in texts_by_row.items():
+            if self._amounts[row] != text:
+                self._amounts[row] = text
+                changed.append(row)
+        if changed:
+            self.dataChanged.emit(self.index(min(changed), AMOUNT_COLUMN),
+                                  self.index(max(changed), AMOUNT_COLUMN))
+        return changed
+
+    # ---------- Resultados ----------
+    def result(self, row):
+        return self._results[row], self._statuses[row]
+
+    def set_results(self, rows, final_results, statuses):
+        """Actualiza Final Result / Status de 'rows'; dataChanged solo si algo cambió."""
+        changed = []
+        for row, final_result, status in zip(rows, final_results, statuses):
+            if self._results[row] != final_result or self._statuses[row] != status:
+                self._results[row] = final_result
+                self._statuses[row] = status
+                changed.append(row)
+        if changed:
+            self.dataChanged.emit(self.index(min(changed), RESULT_COLUMN),
+                                  self.index(max(changed), STATUS_COLUMN))
+
+    # ---------- Interfaz de QAbstractTableModel ----------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.analytes)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(ANALYTE_HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return ANALYTE_HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role not in _DATA_ROLES or not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            if column == 0:
+                return self.analytes[row]
+            if column == AMOUNT_COLUMN:
+                return self._amounts[row]
+            if column == RESULT_COLUMN:
+                return self._results[row]
+            if column == STATUS_COLUMN:
+                return self._statuses[row]
+            return self._fixed[row][column - 2]
+        if role == Qt.TextAlignmentRole and column > AMOUNT_COLUMN:
+            return _CENTERED
+        if role == Qt.BackgroundRole and column == RESULT_COLUMN:
+            return _ND_BACKGROUND if self._results[row] == "ND" else _RESULT_BACKGROUND
+        if role == Qt.ForegroundRole and column == STATUS_COLUMN:
+            return _STATUS_COLORS.get(self._statuses[row])
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid() or index.column() != AMOUNT_COLUMN:
+            return False
+        row = index.row()
+        text = "" if value is None else str(value)
+        if self._amounts[row] == text:
+            return True
+        self._amounts[row] = text
+        self.dataChanged.emit(index, index)
+        self.amountChanged.emit(row)
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsSelectable | Qt.ItemIsEnabled
+        if index.column() == AMOUNT_COLUMN:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+
+class AmountDelegate(QStyledItemDelegate):
+    """
+    Editor de la columna Amount: un QLineEdit con QDoubleValidator que vuelca
+    cada cambio al modelo (recálculo en vivo, como con los widgets fijos).
+
+    - pasteRequested(row, text): Ctrl+V con varias líneas/columnas en el editor
+      de esa fila; el editor se cierra y el pegado lo resuelve la ventana.
+    """
+    pasteRequested = pyqtSignal(int, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._validator = QDoubleValidator(0.0, 1000000.0, 5, self)
+
+    def createEditor(self, parent, option, index):
+        editor = QLineEdit(parent)
+        editor.setValidator(self._validator)
+        editor.setProperty("row", index.row())
+        editor.textEdited.connect(lambda _text, editor=editor: self.commitData.emit(editor))
+        return editor
+
+    def setEditorData(self, editor, index):
+        text = index.data(Qt.EditRole) or ""
+        if editor.text() != text:
+            editor.setText(text)
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.text(), Qt.EditRole)
+
+    def eventFilter(self, editor, event):
+        if (event.type() == QEvent.KeyPress and isinstance(editor, QLineEdit)
+                and event.matches(QKeySequence.Paste)):
+            text = QApplication.clipboard().text()
+            if ('\n' in text) or ('\t' in text) or ('\r' in text):
+                row = editor.property("row")
+                self.closeEditor.emit(editor, QStyledItemDelegate.NoHint)
+                self.pasteRequested.emit(row, text)
+                return True
+        return super().eventFilter(editor, event)
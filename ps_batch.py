@@ -0,0 +1,625 @@
+"""
+Motor batch headless (sin Qt) para generar reportes PSQuants desde el archivo
+de "raw results" (Excel, CSV/TSV o Parquet; ver ps_ingest).
+
+Uso:
+    python -m ps_batch <archivo.xlsx|.csv|.tsv|.parquet> [-o carpeta_salida] [--db saved_samples.db] [--limit N] [--stream] [-j WORKERS]
+
+Re-correr el mismo archivo solo regenera los samples cuyo contenido cambió (ver
+sample_fingerprint); --force los regenera todos.
+"""
+import sys
+import os
+import argparse
+import datetime
+import json
+import math
+import time
+import hashlib
+import sqlite3
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import numpy as np
+
+import ps_db
+import ps_metrics
+from ps_ingest import read_raw_results, read_raw_results_cached, iter_raw_results_rows
+from ps_quants_core import (
+    ANALYTES, ANALYTE_NAME_SET, DEFAULT_BATCH_LIMIT, calculate_results_matrix,
+    normalize_sample_id_text, map_component_to_analyte, map_components_to_analytes, component_mapping_cache_info,
+    extract_batch_date_from_path, make_output_filename, get_default_output_dir_today,
+)
+from ps_reports import REPORT_WRITERS, make_export_rows, make_sample_info, write_sample_report
+
+
+def _as_ui_number(value):
+    """
+    Mass/DF tal como los usaba la GUI: se mostraban con '{:g}' en el QLineEdit
+    y se volvían a leer de ahí, así que el valor efectivo es float(f"{v:g}").
+    Vacío (None/NaN) equivale a 0.0.
+    """
+    if value is None or pd.isna(value):
+        return 0.0
+    return float(f"{float(value):g}")
+
+
+def resolve_batch_date(input_path):
+    """Fecha ISO (YYYY-MM-DD) embebida en el nombre del archivo; si no hay, hoy."""
+    date_str = extract_batch_date_from_path(input_path)
+    if date_str:
+        try:
+            return datetime.datetime.strptime(date_str, "%Y%m%d").date().isoformat()
+        except ValueError:
+            pass
+    return datetime.date.today().isoformat()
+
+
+def _parse_limit(limit_reports, default):
+    """Máximo de samples a procesar; si el límite no es válido, ignora y procesa todos."""
+    if limit_reports is None:
+        return default
+    try:
+        return max(0, int(limit_reports))
+    except:
+        return default
+
+
+def iter_batch_samples(df, limit_reports=None):
+    """
+    Recorre los samples con al menos un componente include=YES (en orden de aparición).
+    Para cada uno devuelve un dict con:
+        sample_number, mass_mg, dilution_factor (primer no nulo) y
+        amounts ({analito: Amount} con la PRIMERA ocurrencia por analito).
+    """
+    # 1) Filtra SOLO filas YES
+    df_yes = df[df['include']].copy()
+    if df_yes.empty:
+        raise ValueError("No hay filas con include=YES en la hoja seleccionada.")
+
+    # 2) Samples únicos en orden de aparición: código 0..n-1 por fila (una sola pasada)
+    codes, samples_unique = pd.factorize(df_yes['sample'], sort=False)
+
+    # Si se especifica un límite, recorta la lista; si no, procesa todos
+    n_samples = min(len(samples_unique), _parse_limit(limit_reports, len(samples_unique)))
+    if n_samples < len(samples_unique):
+        keep = codes < n_samples
+        df_yes, codes = df_yes[keep], codes[keep]
+    df_yes = df_yes.assign(_code=codes)
+
+    # Mass (mg) y DF por muestra (primer no nulo; groupby.first() ignora NaN)
+    by_sample = df_yes.groupby('_code', sort=True)
+    first_mass = by_sample['mass_mg'].first().reindex(range(n_samples))
+    first_df = by_sample['df'].first().reindex(range(n_samples))
+
+    # Mapea componente -> analito base y QUÉDATE con la PRIMERA ocurrencia por
+    # (sample, analito), para todos los samples a la vez
+    df_yes['analyte_base'] = map_components_to_analytes(df_yes['component'])
+    dedup = df_yes.dropna(subset=['calc_conc']).drop_duplicates(subset=['_code', 'analyte_base'], keep='first')
+    dedup = dedup[dedup['analyte_base'].isin(ANALYTE_NAME_SET)]
+
+    # Partición: orden estable por código y límites de cada bloque
+    dedup_codes = dedup['_code'].to_numpy()
+    order = np.argsort(dedup_codes, kind='stable')
+    dedup_codes = dedup_codes[order]
+    analyte_names = dedup['analyte_base'].to_numpy()[order]
+    amounts = dedup['calc_conc'].to_numpy(dtype=float)[order]
+    bounds = np.searchsorted(dedup_codes, np.arange(n_samples + 1), side='left')
+
+    for code in range(n_samples):
+        start, end = bounds[code], bounds[code + 1]
+        if start == end:
+            continue
+        mass_val = first_mass.iloc[code]
+        df_val = first_df.iloc[code]
+        yield {
+            "sample_number": normalize_sample_id_text(samples_unique[code]),
+            "mass_mg": None if pd.isna(mass_val) else mass_val,
+            "dilution_factor": None if pd.isna(df_val) else df_val,
+            "amounts": dict(zip(analyte_names[start:end].tolist(), amounts[start:end].tolist())),
+        }
+
+
+def iter_batch_samples_from_rows(rows, limit_reports=None):
+    """
+    Igual que iter_batch_samples(), pero a partir de un iterable de filas
+    (sample, component, calc_conc, mass_mg, df, include) como las de
+    ps_ingest.iter_raw_results_rows, sin DataFrame: solo se guarda el estado por
+    sample (Mass/DF y primer Amount por analito), no las filas leídas.
+    """
+    nmax = _parse_limit(limit_reports, None)
+    samples = {}   # sample -> estado (en orden de aparición)
+    seen_yes = False
+    for sample, component, calc_conc, mass_mg, df_val, include in rows:
+        if not include:
+            continue
+        seen_yes = True
+        state = samples.get(sample)
+        if state is None:
+            if nmax is not None and len(samples) >= nmax:
+                continue
+            state = samples[sample] = {"mass_mg": None, "dilution_factor": None, "amounts": {}}
+
+        # Mass (mg) y DF por muestra (primer no nulo)
+        if state["mass_mg"] is None and not math.isnan(mass_mg):
+            state["mass_mg"] = mass_mg
+        if state["dilution_factor"] is None and not math.isnan(df_val):
+            state["dilution_factor"] = df_val
+
+        # PRIMERA ocurrencia (con Amount) por analito
+        if math.isnan(calc_conc):
+            continue
+        analyte_name = map_component_to_analyte(component)
+        if analyte_name in ANALYTE_NAME_SET and analyte_name not in state["amounts"]:
+            state["amounts"][analyte_name] = calc_conc
+
+    if not seen_yes:
+        raise ValueError("No hay filas con include=YES en la hoja seleccionada.")
+
+    for sample, state in samples.items():
+        if not state["amounts"]:
+            continue
+        yield {
+            "sample_number": normalize_sample_id_text(sample),
+            "mass_mg": state["mass_mg"],
+            "dilution_factor": state["dilution_factor"],
+            "amounts": state["amounts"],
+        }
+
+
+def compute_samples(samples, sample_date_str, client_name=""):
+    """
+    Calcula todos los samples de iter_batch_samples() en una sola pasada
+    vectorizada (matriz samples x ANALYTES): filas del reporte, cabecera y fila
+    de BD (mismo contenido que producía la GUI al rellenar los widgets).
+    """
+    if not samples:
+        return []
+    dilution_factors = np.array([_as_ui_number(s["dilution_factor"]) for s in samples])
+    masses = np.array([_as_ui_number(s["mass_mg"]) for s in samples])
+
+    # 0 en todos y luego los analitos presentes con sus Amounts
+    analyte_index = {a_name: col for col, a_name in enumerate(ANALYTES)}
+    amounts = np.zeros((len(samples), len(ANALYTES)))
+    for row, sample in enumerate(samples):
+        for a_name, amount_val in sample["amounts"].items():
+            amounts[row, analyte_index[a_name]] = amount_val
+
+    calc = calculate_results_matrix(amounts, masses, dilution_factors)
+
+    results = []
+    for row, sample in enumerate(samples):
+        sample_number = sample["sample_number"]
+        dilution_factor = float(dilution_factors[row])
+        mass_mg = float(masses[row])
+        amount_row = amounts[row].tolist()
+        export_data, has_calculable_data = make_export_rows(
+            amount_row, calc["final_result"][row], calc["status"][row])
+        sample_info = make_sample_info(sample_number, client_name, sample_date_str, dilution_factor, mass_mg)
+        fingerprint = sample_fingerprint(sample_number, client_name, sample_date_str,
+                                         dilution_factor, mass_mg, sample["amounts"])
+        db_row = (
+            ps_db.make_db_key(sample_date_str, sample_number), sample_number, client_name,
+            sample_date_str, dilution_factor, mass_mg, json.dumps(dict(zip(ANALYTES, amount_row))),
+            fingerprint,
+        )
+        results.append({
+            "sample_number": sample_number,
+            "fingerprint": fingerprint,
+            "export_data": export_data,
+            "has_calculable_data": has_calculable_data,
+            "sample_info": sample_info,
+            "db_row": db_row,
+        })
+    return results
+
+
+FINGERPRINT_VERSION = 1
+# {nombre de reporte: {"fingerprint": huella, "writer": writer}} en la carpeta de salida
+REPORT_MANIFEST_NAME = ".psquants_manifest.json"
+
+
+def sample_fingerprint(sample_number, client_name, sample_date_str, dilution_factor, mass_mg, amounts):
+    """
+    Huella SHA-256 de todo lo que determina el reporte y la fila de BD de un
+    sample: cabecera (sample, cliente, fecha, DF, Mass) y los analitos presentes
+    con sus Amounts. El writer del reporte no entra (se guarda aparte en el
+    manifiesto de reportes).
+    """
+    payload = json.dumps([
+        FINGERPRINT_VERSION, str(sample_number), client_name, sample_date_str,
+        float(dilution_factor), float(mass_mg),
+        sorted((name, float(value)) for name, value in amounts.items()),
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_report_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, REPORT_MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+        return manifest if isinstance(manifest, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_report_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, REPORT_MANIFEST_NAME)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=0, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+BATCH_CANCELLED = "cancelado"
+STREAM_SAVE_EVERY = 25   # filas por commit al guardar en BD en modo streaming (saved_callback)
+
+
+def _write_report_task(items, writer="pandas"):
+    """
+    Escribe uno o más reportes [(out_path, export_data, sample_info), ...] en orden.
+    Corre dentro de un proceso del pool; devuelve (errores, segundos) de cada reporte
+    (error None = OK).
+    """
+    errors, durations = [], []
+    for out_path, export_data, sample_info in items:
+        start = time.perf_counter()
+        try:
+            write_sample_report(out_path, export_data, sample_info, writer=writer)
+            errors.append(None)
+        except Exception as e:
+            errors.append(str(e) or type(e).__name__)
+        durations.append(time.perf_counter() - start)
+    return errors, durations
+
+
+def write_reports(results, workers=None, on_done=None, writer="pandas", cancel_event=None):
+    """
+    Escribe el reporte de cada resultado de compute_samples() (con 'out_path' ya asignado).
+
+    - workers: procesos del pool (None => os.cpu_count(); 1 => en serie, sin pool).
+    - writer: ver ps_reports.write_sample_report ('pandas', 'streaming' o 'template').
+    - on_done(index, error): se llama al terminar cada reporte (error es None si salió bien);
+      antes se deja en results[index]["write_s"] lo que tardó (None si no se sabe).
+    - cancel_event (threading.Event): si se activa, no se empiezan más reportes; los
+      pendientes quedan con error BATCH_CANCELLED y sin llamar a on_done.
+    Un error en un sample no detiene el resto. Devuelve la lista de errores (None = OK).
+    """
+    errors = [BATCH_CANCELLED] * len(results)
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    # Reportes con el mismo archivo de salida van juntos y en orden (gana el último, como en serie)
+    tasks = {}
+    for idx, result in enumerate(results):
+        tasks.setdefault(result["out_path"], []).append(idx)
+    tasks = list(tasks.values())
+
+    def payload(task):
+        return [(results[idx]["out_path"], results[idx]["export_data"], results[idx]["sample_info"]) for idx in task]
+
+    def finish(task, task_errors, durations):
+        for idx, error, seconds in zip(task, task_errors, durations):
+            errors[idx] = error
+            results[idx]["write_s"] = seconds
+            if on_done is not None:
+                on_done(idx, error)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+
+    if workers <= 1:
+        for task in tasks:
+            if cancelled():
+                break
+            finish(task, *_write_report_task(payload(task), writer))
+        return errors
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_write_report_task, payload(task), writer): task for task in tasks}
+        for future in as_completed(futures):
+            if cancelled():
+                # Los que aún no empezaron se descartan; los que están en curso se esperan
+                for pending in futures:
+                    pending.cancel()
+            if future.cancelled():
+                continue
+            task = futures[future]
+            try:
+                task_errors, durations = future.result()
+            except Exception as e:
+                # p.ej. el proceso del pool murió: se marca todo el bloque como fallido
+                task_errors, durations = [str(e) or type(e).__name__] * len(task), [None] * len(task)
+            finish(task, task_errors, durations)
+    return errors
+
+
+def run_batch(input_path, output_dir, db_conn=None, limit_reports=None, client_name="",
+              workers=None, progress_callback=None, report_writer="pandas", stream=False,
+              commit_every=None, use_cache=True, incremental=True, cancel_event=None,
+              saved_callback=None, metrics=None):
+    """
+    Un reporte por sample (solo samples con al menos un componente include=YES):
+    - Amount = col D (calc_conc); Mass (mg) = col E; DF = col F (tal cual).
+    - Exporta cada reporte a output_dir (en paralelo con 'workers' procesos, ver
+      write_reports) y, si hay db_conn, guarda en BD los que se escribieron bien
+      en una sola transacción (ps_db.upsert_samples; commit_every=N hace commit
+      cada N filas).
+    - progress_callback(done, total, sample_number) se llama tras cada sample.
+    - report_writer: 'pandas', 'streaming' o 'template' (ver ps_reports.write_sample_report).
+    - stream=True lee el archivo fila a fila (ps_ingest.iter_raw_results_rows) en
+      lugar de cargar la hoja completa en un DataFrame.
+    - use_cache=True reutiliza el DataFrame ya parseado de una corrida anterior
+      del mismo archivo (ps_ingest.read_raw_results_cached).
+    - incremental=True: no se reescribe un reporte si ya existe con la misma
+      huella y el mismo report_writer (manifiesto REPORT_MANIFEST_NAME de la
+      carpeta de salida), ni la fila de BD si ya tiene la misma huella. Los
+      samples sin cambios en ambos se listan en "skipped".
+    - cancel_event (threading.Event): al activarse no se empiezan más reportes; lo
+      ya escrito se guarda en BD y el resumen queda con "cancelled": True.
+    - saved_callback(db_keys): si se indica, las filas se guardan en BD a medida que
+      se escriben los reportes, en commits de commit_every (o STREAM_SAVE_EVERY)
+      filas, y se avisa tras cada commit con las claves guardadas.
+    - metrics (ps_metrics.BatchMetrics): si se indica, se registran el tiempo de cada
+      etapa (read, map, compute, plan, write_reports, db, manifest), la latencia de
+      cada reporte y los contadores de filas / samples / reportes / filas de BD (con
+      saved_callback los commits ocurren durante write_reports y cuentan en ambas),
+      más los aciertos / fallos de la caché de componentes en esta corrida.
+
+    Devuelve un resumen:
+        {"processed": n, "failed": [(sample_number, error), ...], "skipped": [sample_number, ...],
+         "total": n, "output_dir": ..., "db_saved": n, "db_keys": [claves guardadas], "db_error": None | texto,
+         "cancelled": bool}
+    """
+    if not os.path.isfile(input_path):
+        raise FileNotFoundError(f"Archivo no encontrado: {input_path}")
+    if not os.path.isdir(output_dir):
+        raise NotADirectoryError(f"Carpeta de salida inválida: {output_dir}")
+    if report_writer not in REPORT_WRITERS:
+        raise ValueError(f"Writer de reportes desconocido: {report_writer}")
+
+    stage = metrics.stage if metrics is not None else (lambda _name: nullcontext())
+    count = metrics.count if metrics is not None else (lambda _name, _n=1: None)
+
+    sample_date_str = resolve_batch_date(input_path)
+    cache_before = component_mapping_cache_info()
+    if stream:
+        def counted(rows):
+            for row in rows:
+                count("rows_included")
+                yield row
+
+        # Lectura y mapeo van juntos (fila a fila); solo llegan las filas include=YES
+        with stage("read"):
+            rows = counted(iter_raw_results_rows(input_path))
+            samples = list(iter_batch_samples_from_rows(rows, limit_reports=limit_reports))
+    else:
+        with stage("read"):
+            df = read_raw_results_cached(input_path) if use_cache else read_raw_results(input_path)
+        count("rows_read", len(df))
+        with stage("map"):
+            samples = list(iter_batch_samples(df, limit_reports=limit_reports))
+    cache_after = component_mapping_cache_info()
+    count("component_cache_hits", cache_after.hits - cache_before.hits)
+    count("component_cache_misses", cache_after.misses - cache_before.misses)
+    with stage("compute"):
+        results = compute_samples(samples, sample_date_str, client_name=client_name)
+        for result in results:
+            result["out_path"] = make_output_filename(sample_number=result["sample_number"], out_dir=output_dir)
+    count("samples", len(results))
+
+    summary = {"processed": 0, "failed": [], "skipped": [], "total": len(results), "output_dir": output_dir,
+               "db_saved": 0, "db_keys": [], "db_error": None, "cancelled": False}
+    if cancel_event is not None and cancel_event.is_set():
+        summary["cancelled"] = True
+        return summary
+
+    # Qué hay que rehacer: reporte (huella del manifiesto) y/o fila de BD (huella guardada)
+    with stage("plan"):
+        manifest = load_report_manifest(output_dir) if incremental else {}
+        db_fingerprints = {}
+        if incremental and db_conn is not None:
+            db_fingerprints = ps_db.fetch_fingerprints(db_conn, [r["db_row"][0] for r in results])
+        path_counts = {}
+        for result in results:
+            path_counts[result["out_path"]] = path_counts.get(result["out_path"], 0) + 1
+        to_write, report_ok = [], []
+        for idx, result in enumerate(results):
+            name = os.path.basename(result["out_path"])
+            # Otro writer => el reporte se reescribe (la fila de BD no depende del writer)
+            entry = {"fingerprint": result["fingerprint"], "writer": report_writer}
+            report_current = (incremental and path_counts[result["out_path"]] == 1
+                              and manifest.get(name) == entry and os.path.isfile(result["out_path"]))
+            db_current = db_conn is None or db_fingerprints.get(result["db_row"][0]) == result["fingerprint"]
+            if report_current:
+                report_ok.append(idx)
+                if db_current:
+                    summary["skipped"].append(result["sample_number"])
+            else:
+                to_write.append(idx)
+    count("samples_skipped", len(summary["skipped"]))
+
+    # Filas de BD pendientes (índices en results); en modo streaming se guardan por tandas
+    pending = []
+    save_every = (commit_every or STREAM_SAVE_EVERY) if saved_callback is not None else None
+
+    def flush_db():
+        if db_conn is None or not pending or summary["db_error"]:
+            return
+        db_rows = [results[idx]["db_row"] for idx in sorted(pending)]
+        del pending[:]
+        start = time.perf_counter()
+        try:
+            with stage("db"):
+                saved = ps_db.upsert_samples(db_conn, db_rows, commit_every=commit_every)
+        except sqlite3.Error as e:
+            summary["db_error"] = str(e)
+            print(f"[Batch save] DB error: {e}")
+            return
+        summary["db_saved"] += saved
+        count("db_rows", saved)
+        if metrics is not None:
+            metrics.observe("db_flush", time.perf_counter() - start)
+        db_keys = [row[0] for row in db_rows]
+        summary["db_keys"].extend(db_keys)
+        if saved_callback is not None:
+            saved_callback(db_keys)
+
+    def queue_db(idx):
+        if db_conn is None or db_fingerprints.get(results[idx]["db_row"][0]) == results[idx]["fingerprint"]:
+            return
+        pending.append(idx)
+        if save_every and len(pending) >= save_every:
+            flush_db()
+
+    done = {"n": len(report_ok)}
+    for n, idx in enumerate(report_ok, start=1):
+        queue_db(idx)
+        if progress_callback is not None:
+            progress_callback(n, summary["total"], results[idx]["sample_number"])
+
+    def on_done(i, error):
+        idx = to_write[i]
+        result = results[idx]
+        name = os.path.basename(result["out_path"])
+        if metrics is not None and result.get("write_s") is not None:
+            metrics.observe("report", result["write_s"])
+        if error is not None:
+            summary["failed"].append((result["sample_number"], error))
+            manifest.pop(name, None)
+            count("reports_failed")
+        else:
+            count("reports_written")
+            manifest[name] = {"fingerprint": result["fingerprint"], "writer": report_writer}
+            summary["processed"] += 1
+            queue_db(idx)
+        done["n"] += 1
+        if progress_callback is not None:
+            progress_callback(done["n"], summary["total"], result["sample_number"])
+
+    with stage("write_reports"):
+        write_reports([results[idx] for idx in to_write], workers=workers, on_done=on_done, writer=report_writer,
+                      cancel_event=cancel_event)
+    summary["cancelled"] = done["n"] < summary["total"]
+    if to_write:
+        try:
+            with stage("manifest"):
+                save_report_manifest(output_dir, manifest)
+        except OSError as e:
+            print(f"[Batch] No se pudo guardar el manifiesto de reportes: {e}")
+
+    flush_db()
+    return summary
+
+
+def log_batch_run(metrics, summary, input_path, log_path=None):
+    """
+    Agrega al registro de corridas (ps_metrics.metrics_log_path de la carpeta de
+    salida, o log_path) una línea con las métricas y el resultado del batch; la
+    deja también en summary["metrics"]. Devuelve la ruta del registro (None si no
+    se pudo escribir).
+    """
+    record = metrics.summary()
+    record.update({
+        "input": os.path.abspath(input_path),
+        "output_dir": os.path.abspath(summary["output_dir"]),
+        "total": summary["total"],
+        "processed": summary["processed"],
+        "failed": len(summary["failed"]),
+        "skipped": len(summary["skipped"]),
+        "db_saved": summary["db_saved"],
+        "db_error": summary["db_error"],
+        "cancelled": summary["cancelled"],
+    })
+    summary["metrics"] = record
+    log_path = log_path or ps_metrics.metrics_log_path(summary["output_dir"])
+    try:
+        ps_metrics.append_run_log(log_path, record)
+    except OSError as e:
+        print(f"[Batch] No se pudo guardar el registro de métricas: {e}")
+        return None
+    return log_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m ps_batch",
+        description="Genera reportes PSQuants desde el archivo de 'raw results' sin abrir la GUI."
+    )
+    parser.add_argument("input", help="Archivo de entrada: Excel (hoja 'raw results'), CSV, TSV o Parquet (según la extensión).")
+    parser.add_argument("-o", "--output-dir", default=None,
+                        help="Carpeta de salida (por defecto ./Excel reports/<YYYYMMDD>).")
+    parser.add_argument("--db", default=ps_db.DB_NAME, help=f"Base de datos SQLite (por defecto {ps_db.DB_NAME}).")
+    parser.add_argument("--no-db", action="store_true", help="No guardar las muestras en la base de datos.")
+    parser.add_argument("--limit", type=int, default=DEFAULT_BATCH_LIMIT, help="Máximo de reportes a generar.")
+    parser.add_argument("--client", default="", help="Client Name para los reportes y la BD.")
+    parser.add_argument("--writer", choices=REPORT_WRITERS, default="pandas",
+                        help="Writer de reportes: 'pandas' (por defecto) o 'streaming' (openpyxl write-only, más rápido).")
+    parser.add_argument("--commit-every", type=int, default=None,
+                        help="Commit en la BD cada N muestras (por defecto: una sola transacción).")
+    parser.add_argument("--stream", action="store_true",
+                        help="Lee el archivo fila a fila con memoria constante.")
+    parser.add_argument("--force", action="store_true",
+                        help="Regenera todos los reportes y filas de BD aunque no hayan cambiado.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="No usar la caché de archivos ya parseados (.ps_quants_cache).")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Procesos para escribir reportes (por defecto: núcleos de la CPU; 1 = en serie).")
+    parser.add_argument("--metrics", action="store_true",
+                        help="Muestra el tiempo por etapa y los ritmos al terminar.")
+    parser.add_argument("--metrics-log", default=None,
+                        help=f"Registro JSON lines de corridas (por defecto {ps_metrics.METRICS_LOG_NAME} "
+                             f"junto a la carpeta de salida).")
+    parser.add_argument("--no-metrics-log", action="store_true", help="No escribir el registro de corridas.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Perfil cProfile de la corrida (.prof junto al registro; con -j 1 incluye los reportes).")
+    parser.add_argument("--trace-memory", action="store_true", help="Pico de memoria y mayores asignaciones (tracemalloc).")
+    args = parser.parse_args(argv)
+
+    output_dir = args.output_dir or get_default_output_dir_today()
+    log_path = args.metrics_log or ps_metrics.metrics_log_path(output_dir)
+    profile_path = None
+    if args.profile:
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        profile_path = os.path.join(os.path.dirname(os.path.abspath(log_path)), f"psquants_batch_{stamp}.prof")
+    metrics = ps_metrics.BatchMetrics(profile=args.profile, trace_memory=args.trace_memory,
+                                      profile_path=profile_path)
+    db_conn = None if args.no_db else ps_db.connect(args.db)
+    try:
+        with metrics.run():
+            summary = run_batch(args.input, output_dir, db_conn=db_conn,
+                                limit_reports=args.limit, client_name=args.client, workers=args.workers,
+                                report_writer=args.writer, stream=args.stream,
+                                commit_every=args.commit_every, use_cache=not args.no_cache,
+                                incremental=not args.force, metrics=metrics)
+    except Exception as e:
+        print(f"Error en batch: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if db_conn is not None:
+            db_conn.close()
+
+    if not args.no_metrics_log:
+        log_batch_run(metrics, summary, args.input, log_path=log_path)
+    else:
+        summary["metrics"] = metrics.summary()
+
+    print(f"Se generaron {summary['processed']} reporte(s) en: {output_dir}")
+    if args.metrics:
+        print(ps_metrics.format_metrics(summary["metrics"]))
+        if profile_path and summary["metrics"]["profile"]["path"]:
+            print(f"Perfil: {profile_path}")
+    if summary["skipped"]:
+        print(f"Sin cambios (omitidos): {len(summary['skipped'])} sample(s)")
+    for sample_number, error in summary["failed"]:
+        print(f"[{sample_number}] Error: {error}", file=sys.stderr)
+    if summary["db_error"]:
+        print(f"Error guardando en la BD: {summary['db_error']}", file=sys.stderr)
+    return 1 if summary["failed"] or summary["db_error"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
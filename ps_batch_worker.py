@@ -0,0 +1,107 @@
+"""
+Ejecución del batch en segundo plano para la GUI.
+
+BatchWorker corre ps_batch.run_batch en un QThread con su propia conexión de
+escritura a la BD y comunica el avance con señales (que Qt entrega en el hilo de
+la ventana): la GUI sigue respondiendo, puede cancelar, y las muestras guardadas
+aparecen en 'Saved Samples' a medida que se confirman en la BD. ps_batch (y con
+él pandas/openpyxl) se importa dentro del hilo, al correr el primer batch.
+"""
+import threading
+import time
+
+from PyQt5.QtCore import Qt, QObject, QThread, pyqtSignal, pyqtSlot
+
+import ps_db
+
+
+class BatchWorker(QObject):
+    """
+    Señales:
+    - progress(done, total, sample_number, rate, eta): rate en samples/s y eta en
+      segundos (-1 mientras no hay datos suficientes).
+    - saved(db_keys): tanda de muestras confirmada en la BD.
+    - finished(summary): resumen de ps_batch.run_batch.
+    - failed(message): el batch no pudo correr (archivo inválido, etc.).
+
+    Cada corrida queda en el registro de métricas (ps_batch.log_batch_run) y en
+    summary["metrics"]; profile / trace_memory activan cProfile / tracemalloc.
+    """
+    progress = pyqtSignal(int, int, str, float, float)
+    saved = pyqtSignal(list)
+    finished = pyqtSignal(dict)
+    failed = pyqtSignal(str)
+
+    def __init__(self, input_path, output_dir, db_path=None, profile=False, trace_memory=False, **batch_options):
+        super().__init__()
+        self.input_path = input_path
+        self.output_dir = output_dir
+        self.db_path = db_path
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.batch_options = batch_options
+        self.cancel_event = threading.Event()
+        self._started = None
+        self._first_done = 0
+
+    def cancel(self):
+        """Se puede llamar desde cualquier hilo."""
+        self.cancel_event.set()
+
+    def _on_progress(self, done, total, sample_number):
+        now = time.perf_counter()
+        if self._started is None:
+            # El ritmo se mide desde el primer sample (sin contar la lectura del archivo
+            # ni los samples omitidos, que llegan todos de golpe)
+            self._started, self._first_done = now, done
+            rate, eta = 0.0, -1.0
+        else:
+            elapsed = now - self._started
+            rate = (done - self._first_done) / elapsed if elapsed > 0 else 0.0
+            eta = (total - done) / rate if rate > 0 else -1.0
+        self.progress.emit(done, total, str(sample_number), rate, eta)
+
+    @pyqtSlot()
+    def run(self):
+        db_conn = None
+        try:
+            import ps_batch
+            import ps_metrics
+            metrics = ps_metrics.BatchMetrics(profile=self.profile, trace_memory=self.trace_memory)
+            if self.db_path is not None:
+                db_conn = ps_db.connect(self.db_path)
+            with metrics.run():
+                summary = ps_batch.run_batch(
+                    self.input_path, self.output_dir, db_conn=db_conn,
+                    progress_callback=self._on_progress,
+                    cancel_event=self.cancel_event,
+                    saved_callback=self.saved.emit,
+                    metrics=metrics,
+                    **self.batch_options
+                )
+        except Exception as e:
+            self.failed.emit(str(e) or type(e).__name__)
+            return
+        finally:
+            if db_conn is not None:
+                db_conn.close()
+        ps_batch.log_batch_run(metrics, summary, self.input_path)
+        self.finished.emit(summary)
+
+
+def start_batch_thread(worker, parent=None):
+    """
+    Mueve el worker a un QThread nuevo y lo arranca. El hilo termina solo al
+    emitirse finished/failed; devuelve el QThread (para esperar con wait()).
+    """
+    thread = QThread(parent)
+    worker.moveToThread(thread)
+    thread.started.connect(worker.run)
+    # Conexión directa: quit() es seguro entre hilos y así el hilo termina aunque la
+    # ventana esté bloqueada en thread.wait() (p.ej. al cerrar con un batch en curso)
+    worker.finished.connect(thread.quit, Qt.DirectConnection)
+    worker.failed.connect(thread.quit, Qt.DirectConnection)
+    thread.finished.connect(worker.deleteLater)
+    thread.finished.connect(thread.deleteLater)
+    thread.start()
+    return thread
@@ -0,0 +1,353 @@
+"""
+Benchmarks de los caminos críticos de PS Quants.
+
+Uso:
+    python -m ps_bench [--sizes 100,1000,10000] [-o resultados.json] [--compare anterior.json] [--no-gui]
+
+Genera archivos sintéticos de "raw results" (N samples x ANALYTES, con réplicas
+tipo "Permethrins 2", include YES/NO e IDs de sample con formato float), en
+Excel y CSV, y mide para cada tamaño:
+- read_raw_results (Excel y CSV), lo que usa PSCalculatorApp._read_raw_results_excel
+- map_component_to_analyte por fila (caché vacía) y map_components_to_analytes
+- calculate_results_matrix y ps_batch.compute_samples
+- ps_batch.run_batch completo (sin GUI)
+- con GUI (Qt offscreen): PSCalculatorApp._write_export_excel,
+  save_current_sample_silent y batch_generate_reports_from_excel completo
+Todo corre en una carpeta temporal (BD, caché y reportes propios); los archivos
+generados se reutilizan entre corridas (BENCH_CACHE_DIRNAME). El resultado es un
+JSON comparable entre versiones: --compare marca las regresiones.
+"""
+import sys
+import os
+import csv
+import json
+import time
+import random
+import shutil
+import argparse
+import datetime
+import platform
+import statistics
+import subprocess
+import tempfile
+
+from ps_quants_core import ANALYTES, RAW_SHEET_NAME
+
+BENCH_SIZES = (100, 1000, 10000)
+BENCH_CACHE_DIRNAME = ".ps_bench_cache"
+BENCH_GENERATOR_VERSION = 1   # subirlo si cambia synthetic_raw_rows
+BENCH_PER_ITEM_LIMIT = 200    # samples por repetición en los benchmarks por muestra
+BENCH_REGRESSION_THRESHOLD = 0.10
+
+RAW_HEADER = ("Sample", "Component", "X", "Calc Conc", "Mass", "DF", "Include")
+INCLUDE_YES = ("YES", "yes", "Y", "TRUE")
+REPLICATE_RATE = 0.15      # filas "<analito> 2" (réplicas, casi siempre include=NO)
+EXCLUDED_SAMPLE_RATE = 0.05  # samples con todo en NO (no generan reporte)
+ND_RATE = 0.6
+
+
+# =========================
+# Workload sintético
+# =========================
+def synthetic_raw_rows(n_samples, seed=0, first_sample=14000):
+    """
+    Filas (A..G) de un archivo de raw results sintético, reproducible por 'seed':
+    Sample como float (14000.0, como lo exporta el instrumento), Component con
+    el nombre del analito (sin '*' de los alias) y réplicas "<nombre> 2",
+    Calc Conc (0 = ND en ~60%), Mass, DF e Include YES/NO.
+    """
+    rng = random.Random(seed)
+    for i in range(n_samples):
+        sample_id = float(first_sample + i)
+        mass = round(rng.uniform(200.0, 600.0), 1)
+        dilution = rng.choice((1, 2, 5, 10, 500))
+        excluded = rng.random() < EXCLUDED_SAMPLE_RATE
+        for analyte in ANALYTES:
+            component = analyte.rstrip("*")
+            amount = 0 if rng.random() < ND_RATE else round(rng.uniform(0.0, 5.0), 4)
+            include = "NO" if excluded else rng.choice(INCLUDE_YES)
+            yield (sample_id, component, None, amount, mass, dilution, include)
+            if rng.random() < REPLICATE_RATE:
+                replicate = round(rng.uniform(0.0, 5.0), 4)
+                yield (sample_id, f"{component} 2", None, replicate, mass, dilution,
+                       "YES" if rng.random() < 0.1 else "NO")
+
+
+def write_raw_results_excel(path, rows):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(RAW_SHEET_NAME)
+    ws.append(RAW_HEADER)
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+
+
+def write_raw_results_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(RAW_HEADER)
+        for row in rows:
+            writer.writerow(["" if value is None else value for value in row])
+
+
+def workload_paths(n_samples, seed=0, cache_dir=None):
+    """
+    {'excel': ruta, 'csv': ruta} del workload de n_samples, generándolo si no
+    está en la caché. El prefijo de fecha fija la fecha de los reportes.
+    """
+    cache_dir = os.path.abspath(cache_dir or BENCH_CACHE_DIRNAME)
+    os.makedirs(cache_dir, exist_ok=True)
+    stem = f"20250101_bench_{n_samples}_s{seed}_v{BENCH_GENERATOR_VERSION}"
+    paths = {'excel': os.path.join(cache_dir, stem + ".xlsx"), 'csv': os.path.join(cache_dir, stem + ".csv")}
+    writers = {'excel': write_raw_results_excel, 'csv': write_raw_results_csv}
+    for fmt, path in paths.items():
+        if not os.path.isfile(path):
+            tmp_path = path + ".tmp"
+            writers[fmt](tmp_path, synthetic_raw_rows(n_samples, seed=seed))
+            os.replace(tmp_path, path)
+    return paths
+
+
+# =========================
+# Medición
+# =========================
+def time_call(fn, repeat=3, setup=None):
+    """Segundos de cada una de 'repeat' llamadas a fn() (setup() antes de cada una, sin medir)."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def time_per_item(fn, items, repeat=3, prepare=None):
+    """Como time_call, pero mide solo fn(item) para cada item (prepare(item) antes, sin medir)."""
+    times = []
+    for _ in range(repeat):
+        total = 0.0
+        for item in items:
+            if prepare is not None:
+                prepare(item)
+            start = time.perf_counter()
+            fn(item)
+            total += time.perf_counter() - start
+        times.append(total)
+    return times
+
+
+def make_result(name, n_samples, times, items):
+    best = min(times)
+    return {
+        "benchmark": name,
+        "n_samples": n_samples,
+        "items": items,
+        "repeat": len(times),
+        "best_s": best,
+        "median_s": statistics.median(times),
+        "per_item_ms": best / items * 1000 if items else None,
+        "times_s": times,
+    }
+
+
+def run_core_benchmarks(n_samples, paths, workdir, repeat=3):
+    """Benchmarks sin Qt para un tamaño; devuelve la lista de resultados."""
+    import ps_batch
+    import ps_db
+    import ps_quants_core
+    from ps_ingest import read_raw_results
+
+    results = []
+    df = read_raw_results(paths['csv'])   # mismo contenido que el Excel, se lee mucho más rápido
+    for fmt in ('excel', 'csv'):
+        times = time_call(lambda: read_raw_results(paths[fmt]), repeat)
+        results.append(make_result(f"read_raw_results[{fmt}]", n_samples, times, len(df)))
+
+    components = df['component'].tolist()
+    times = time_call(lambda: [ps_quants_core.map_component_to_analyte(c) for c in components], repeat,
+                      setup=ps_quants_core._map_component_cached.cache_clear)
+    results.append(make_result("map_component_to_analyte", n_samples, times, len(components)))
+    times = time_call(lambda: ps_quants_core.map_components_to_analytes(df['component']), repeat,
+                      setup=ps_quants_core._map_component_cached.cache_clear)
+    results.append(make_result("map_components_to_analytes", n_samples, times, len(components)))
+
+    samples = list(ps_batch.iter_batch_samples(df))
+    sample_date_str = ps_batch.resolve_batch_date(paths['excel'])
+    amounts = [[s["amounts"].get(a, 0.0) for a in ANALYTES] for s in samples]
+    masses = [ps_batch._as_ui_number(s["mass_mg"]) for s in samples]
+    dilutions = [ps_batch._as_ui_number(s["dilution_factor"]) for s in samples]
+    times = time_call(lambda: ps_quants_core.calculate_results_matrix(amounts, masses, dilutions), repeat)
+    results.append(make_result("calculate_results_matrix", n_samples, times, len(samples)))
+    times = time_call(lambda: ps_batch.compute_samples(samples, sample_date_str), repeat)
+    results.append(make_result("compute_samples", n_samples, times, len(samples)))
+
+    def run_batch():
+        run_dir = tempfile.mkdtemp(dir=workdir)
+        db_conn = ps_db.connect(os.path.join(run_dir, "bench.db"))
+        try:
+            ps_batch.run_batch(paths['excel'], run_dir, db_conn=db_conn)
+        finally:
+            db_conn.close()
+    times = time_call(run_batch, 1)
+    results.append(make_result("run_batch", n_samples, times, len(samples)))
+    return results
+
+
+def run_gui_benchmarks(n_samples, paths, workdir, repeat=3):
+    """
+    Benchmarks de los métodos de PSCalculatorApp (Qt offscreen). Se corre con
+    'workdir' como carpeta actual, así que la ventana usa su propia saved_samples.db.
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    import ps_batch
+    import ps_calculator_app
+    from ps_ingest import read_raw_results
+
+    app = QApplication.instance() or QApplication([])
+    window = ps_calculator_app.PSCalculatorApp()
+    try:
+        window._finish_startup()
+        results = []
+        samples = list(ps_batch.iter_batch_samples(read_raw_results(paths['csv'])))
+        subset = samples[:BENCH_PER_ITEM_LIMIT]
+
+        def fill(sample):
+            # Como al cargar una muestra: inputs + Amounts + recálculo (no se mide)
+            window.sample_input.setText(sample["sample_number"])
+            window.mass_mg_input.setText(str(ps_batch._as_ui_number(sample["mass_mg"])))
+            window.dilution_input.setText(str(ps_batch._as_ui_number(sample["dilution_factor"])))
+            window._fill_amounts_from_dict(sample["amounts"])
+
+        export_path = os.path.join(workdir, "export.xlsx")
+        export_frames = {}
+
+        def prepare_export(sample):
+            fill(sample)
+            rows, _ = window._collect_export_rows()
+            export_frames["current"] = window._export_dataframe(rows)
+
+        times = time_per_item(lambda _sample: window._write_export_excel(export_path, export_frames["current"]),
+                              subset, repeat, prepare=prepare_export)
+        results.append(make_result("PSCalculatorApp._write_export_excel", n_samples, times, len(subset)))
+
+        times = time_per_item(lambda _sample: window.save_current_sample_silent(), subset, repeat, prepare=fill)
+        results.append(make_result("PSCalculatorApp.save_current_sample_silent", n_samples, times, len(subset)))
+
+        def batch():
+            window.batch_generate_reports_from_excel(paths['excel'], tempfile.mkdtemp(dir=workdir))
+        times = time_call(batch, 1)
+        results.append(make_result("PSCalculatorApp.batch_generate_reports_from_excel", n_samples, times,
+                                   len(samples)))
+        app.processEvents()
+        return results
+    finally:
+        window.close()
+
+
+def _git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(sizes=BENCH_SIZES, repeat=3, gui=True, seed=0, cache_dir=None, progress=print):
+    """Corre todos los benchmarks; devuelve el documento JSON (dict)."""
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+        "generator_version": BENCH_GENERATOR_VERSION,
+        "results": [],
+    }
+    for n_samples in sizes:
+        progress(f"[{n_samples} samples] generando / buscando workload…")
+        paths = workload_paths(n_samples, seed=seed, cache_dir=cache_dir)
+        # BD, caché de lectura (.ps_quants_cache) y reportes quedan en una carpeta temporal
+        workdir = tempfile.mkdtemp(prefix="ps_bench_")
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            groups = [run_core_benchmarks] + ([run_gui_benchmarks] if gui else [])
+            for group in groups:
+                for result in group(n_samples, paths, workdir, repeat=repeat):
+                    progress(f"  {result['benchmark']:<52} {result['best_s'] * 1000:10.1f} ms")
+                    report["results"].append(result)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def compare_reports(current, baseline, threshold=BENCH_REGRESSION_THRESHOLD):
+    """
+    [(benchmark, n_samples, base_s, actual_s, ratio, regresión)] para los
+    benchmarks presentes en ambos (compara best_s).
+    """
+    base = {(r["benchmark"], r["n_samples"]): r["best_s"] for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        key = (result["benchmark"], result["n_samples"])
+        if key not in base or not base[key]:
+            continue
+        ratio = result["best_s"] / base[key]
+        rows.append((key[0], key[1], base[key], result["best_s"], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m ps_bench",
+        description="Mide los caminos críticos de PS Quants sobre archivos de raw results sintéticos."
+    )
+    parser.add_argument("--sizes", default=",".join(str(n) for n in BENCH_SIZES),
+                        help="Tamaños (samples) separados por coma (por defecto 100,1000,10000).")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por benchmark (se reporta la mejor).")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla del generador sintético.")
+    parser.add_argument("--no-gui", action="store_true", help="Omitir los benchmarks de PSCalculatorApp (Qt).")
+    parser.add_argument("--cache-dir", default=None,
+                        help=f"Carpeta de workloads generados (por defecto ./{BENCH_CACHE_DIRNAME}).")
+    parser.add_argument("-o", "--output", default=None,
+                        help="Archivo JSON de resultados (por defecto ps_bench_<fecha>_<hora>.json).")
+    parser.add_argument("--compare", default=None, help="JSON de una corrida anterior para comparar.")
+    parser.add_argument("--threshold", type=float, default=BENCH_REGRESSION_THRESHOLD,
+                        help="Fracción de empeoramiento que cuenta como regresión (por defecto 0.10).")
+    args = parser.parse_args(argv)
+
+    try:
+        sizes = [int(n) for n in args.sizes.split(",") if n.strip()]
+    except ValueError:
+        parser.error(f"--sizes inválido: {args.sizes}")
+    report = run_benchmarks(sizes, repeat=args.repeat, gui=not args.no_gui, seed=args.seed,
+                            cache_dir=args.cache_dir)
+
+    output = args.output or f"ps_bench_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados en: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare_reports(report, baseline, threshold=args.threshold)
+        regressions = [row for row in rows if row[5]]
+        print(f"Comparado con {args.compare} (revisión {baseline.get('revision')}):")
+        for name, n_samples, base_s, current_s, ratio, regression in rows:
+            flag = "  REGRESIÓN" if regression else ""
+            print(f"  {name:<52} {n_samples:>6} {base_s * 1000:10.1f} -> {current_s * 1000:10.1f} ms  x{ratio:.2f}{flag}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,57 +1,56 @@
+import time
+_STARTUP_T0 = time.perf_counter()
+
 import sys
-import os
-import pandas as pd
 import datetime
 import sqlite3
 import json
-import math
-import re
 
 
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
     QPushButton, QFileDialog, QMessageBox,
-    QGroupBox, QTableWidget, QTableWidgetItem, QHeaderView,
-    QSplitter, QDateEdit, QMenu, QAction
+    QGroupBox, QTableView, QAbstractItemView, QHeaderView,
+    QSplitter, QDateEdit, QMenu, QAction, QProgressBar
+)
+from PyQt5.QtGui import QDoubleValidator, QFont, QKeySequence
+from PyQt5.QtCore import Qt, QDate, QEvent, QTimer
+
+import ps_db
+from ps_samples_model import SavedSamplesModel
+from ps_analytes_model import AnalytesModel, AmountDelegate, AMOUNT_COLUMN, RESULT_COLUMN
+from ps_batch_worker import BatchWorker, start_batch_thread
+from ps_db import DB_NAME
+# pandas / openpyxl (ps_batch, ps_ingest, ps_reports) se importan recién cuando
+# un batch o un export los necesita: no retrasan la apertura de la ventana
+from ps_quants_core import (
+    DEFAULT_BATCH_LIMIT, LOQ, STATE_LIMITS, ANALYTES, NON_NUMERIC_RESULTS,
+    format_sigfigs_no_sci, calculate_results_matrix,
+    normalize_sample_id_text, map_component_to_analyte, parse_pasted_amounts,
+    extract_batch_date_from_path, make_output_filename, get_default_output_dir_today,
 )
-from PyQt5.QtGui import QDoubleValidator, QFont, QColor, QKeySequence
-from PyQt5.QtCore import Qt, QDate, QEvent
-from openpyxl.utils import get_column_letter
-
-# =========================
-# CONFIGURACIÓN
-# =========================
-# Por defecto: procesa TODOS los samples con YES (puedes pasar un número para limitar)
-DEFAULT_BATCH_LIMIT = None
-RAW_SHEET_NAME = "raw results"        # hoja de entrada del Excel
-
-# =========================
-# LÓGICA EXISTENTE
-# =========================
-LOQ = 0.1  # Limit of Quantitation
-
-STATE_LIMITS = {
-    "Abamectin": 0.5, "Acephate": 0.4, "Acequinocyl": 2.0, "Acetamiprid": 0.2, "Aldicarb": 0.4,
-    "Azoxystrobin": 0.2, "Bifenazate": 0.2, "Bifenthrin": 0.2, "Boscalid": 0.4, "Carbaryl": 0.2,
-    "Carbofuran": 0.2, "Chlorantraniliprole": 0.2, "Chlorfenapyr": 1.0, "Chlorpyrifos": 0.2,
-    "Clofentezine": 0.2, "Cyfluthrin": 1.0, "Cypermethrin": 1.0, "Daminozide": 1.0, "Diazinon": 0.2,
-    "Dichlorvos": 1.0, "Dimethoate": 0.2, "Ethoprophos": 0.2, "Etofenprox": 0.4, "Etoxazole": 0.2,
-    "Fenoxycarb": 0.2, "Fenpyroximate": 0.4, "Fipronil": 0.4, "Flonicamid": 1.0, "Fludioxonil": 0.4,
-    "Hexythiazox": 1.0, "Imazalil": 0.2, "Imidacloprid": 0.4, "Kresoxim-methyl": 0.4, "Malathion A": 0.2,
-    "Metalaxyl": 0.2, "Methiocarb": 0.2, "Methomyl": 0.4, "Methyl parathion": 0.2, "MGK 264": 0.2,
-    "Myclobutanil": 0.2, "Naled": 0.5, "Oxamyl": 1.0, "Paclobutrazol": 0.4, "Permethrins*": 0.2,
-    "Phosmet": 0.2, "Piperonyl butoxide": 2.0, "Prallethrin": 0.2, "Propiconazole": 0.4, "Propoxure": 0.2,
-    "Pyrethrins*": 1.0, "Pyridaben": 0.2, "Spinosad*": 0.2, "Spiromesifen": 0.2, "Spirotetramat": 0.2,
-    "Spiroxamine": 0.4, "Tebuconazole": 0.4, "Thiacloprid": 0.2, "Thiamethoxam": 0.2, "Trifloxystrobin": 0.2
-}
-ANALYTES = list(STATE_LIMITS.keys())
-ANALYTE_ALIAS_MAP = {
-    "Permethrins": "Permethrins*",
-    "Pyrethrins": "Pyrethrins*",
-    "Spinosad": "Spinosad*",
-}
-ANALYTE_NAME_SET = set(ANALYTES)
-DB_NAME = "saved_samples.db"
+
+RECALC_DEBOUNCE_MS = 80   # espera tras la última edición antes de recalcular
+
+# Tiempos de arranque [(fase, segundos desde que empezó a cargarse este módulo)];
+# se imprimen con --startup-report
+STARTUP_PHASES = []
+
+
+def record_startup_phase(name):
+    STARTUP_PHASES.append((name, time.perf_counter() - _STARTUP_T0))
+
+
+def format_startup_report():
+    lines = ["Arranque de PS Quants:"]
+    previous = 0.0
+    for name, elapsed in STARTUP_PHASES:
+        lines.append(f"  {name:<28} {(elapsed - previous) * 1000:8.1f} ms   (total {elapsed * 1000:8.1f} ms)")
+        previous = elapsed
+    return "\n".join(lines)
+
+
+record_startup_phase("imports")
 
 STYLESHEET = """
 QWidget { font-size: 10pt; background-color: #fcfcfc; color: #333333; }
@@ -65,7 +64,7 @@ QPushButton:pressed { background-color: #217a70; }
 QPushButton#delete_button { background-color: #e76f51; border-color: #e76f51; }
 QPushButton#delete_button:hover { background-color: #d66041; border-color: #d66041; }
 QPushButton#delete_button:pressed { background-color: #c55131; }
-QTableWidget { border: 1px solid #e0e0e0; border-radius: 3px; gridline-color: #e0e0e0; background-color: #ffffff; alternate-background-color: #f8f8f8; }
+QTableView { border: 1px solid #e0e0e0; border-radius: 3px; gridline-color: #e0e0e0; background-color: #ffffff; alternate-background-color: #f8f8f8; }
 QHeaderView::section { background-color: #f0f0f0; padding: 5px; border: none; border-bottom: 1px solid #e0e0e0; font-weight: bold; }
 QSplitter::handle { background-color: #e0e0e0; height: 1px; }
 QSplitter::handle:horizontal { width: 1px; margin: 0 4px; }
@@ -75,31 +74,39 @@ QSplitter::handle:vertical { height: 1px; margin: 4px 0; }
 class PSCalculatorApp(QWidget):
     def __init__(self):
         super().__init__()
-        self.analyte_amount_inputs = {}
-        self.db_conn = None
-        self.setup_database()
+        self.db = None
+        self.db_conn = None        # conexión de escritura
+        self.db_read_conn = None   # conexión de solo lectura (lista / carga de muestras)
+        self._batch_worker = None  # batch en curso (ver start_batch_from_excel)
+        self._batch_thread = None
+        self._startup_done = False
         self.initUI()
+        record_startup_phase("ventana (initUI + show)")
+        # BD y 'Saved Samples' se cargan con la ventana ya visible
+        QTimer.singleShot(0, self._finish_startup)
+
+    def _finish_startup(self):
+        """Abre la BD y llena 'Saved Samples' (una sola vez; ver __init__)."""
+        if self._startup_done:
+            return
+        self._startup_done = True
+        self.setup_database()
+        self.load_samples_table()
+        record_startup_phase("BD + Saved Samples")
 
     # ---------------- DB ----------------
     def setup_database(self):
         try:
-            self.db_conn = sqlite3.connect(DB_NAME)
-            cursor = self.db_conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS samples (
-                    sample_number TEXT PRIMARY KEY,      -- yyyymmdd_originalSampleNumber
-                    original_sample_number TEXT,
-                    client_name TEXT,
-                    sample_date TEXT,                    -- YYYY-MM-DD
-                    dilution_factor REAL,
-                    mass_mg REAL,
-                    analyte_data TEXT
-                )
-            """)
-            self.db_conn.commit()
+            self.db = ps_db.SampleDB(DB_NAME)
+            self.db_conn = self.db.writer()
+            self.db_read_conn = self.db.reader()
         except sqlite3.Error as e:
             QMessageBox.critical(self, "Database Error", f"Could not initialize database: {e}")
+            if self.db:
+                self.db.close()
+            self.db = None
             self.db_conn = None
+            self.db_read_conn = None
 
     def _show_saved_table_context_menu(self, pos):
         """
@@ -127,68 +134,59 @@ class PSCalculatorApp(QWidget):
 
         menu.exec_(self.saved_samples_table.viewport().mapToGlobal(pos))
 
+    def _filter_saved_samples(self, text):
+        if not self.db_conn:
+            return
+        try:
+            self.saved_samples_model.set_filter(text)
+        except sqlite3.Error as e:
+            QMessageBox.warning(self, "Database Error", f"Could not filter samples table: {e}")
+
     def load_samples_table(self):
+        """
+        Recarga 'Saved Samples' desde la BD (primera página; el resto se trae al
+        hacer scroll). Se usa al iniciar o si falla la actualización incremental.
+        """
         if not self.db_conn:
             return
-        current_selection_key = None
-        selected_row = self.saved_samples_table.currentRow()
-        if selected_row >= 0:
-            item = self.saved_samples_table.item(selected_row, 0)
-            if item:
-                current_selection_key = item.data(Qt.UserRole)
-
-        self.saved_samples_table.setRowCount(0)
-        self.saved_samples_table.setSortingEnabled(False)
+        _row, current_selection_key = self._selected_saved_sample()
         try:
-            cursor = self.db_conn.cursor()
-            cursor.execute("""SELECT sample_number, original_sample_number, sample_date, dilution_factor, mass_mg
-                              FROM samples ORDER BY sample_number DESC""")
-            samples = cursor.fetchall()
-            row_to_reselect = -1
-            self.saved_samples_table.setRowCount(len(samples))
-            for row, (db_key, original_num, sample_date, dilution, mass_mg) in enumerate(samples):
-                item_date = QTableWidgetItem(sample_date or '(NoDate)')
-                item_date.setData(Qt.UserRole, db_key)
-                item_num = QTableWidgetItem(original_num or '(NoNum)')
-                try:
-                    item_dil = QTableWidgetItem(f"{float(dilution):g}")
-                except Exception:
-                    item_dil = QTableWidgetItem(str(dilution))
-                item_mass = QTableWidgetItem(str(mass_mg))
-                for it in (item_date, item_num, item_dil, item_mass):
-                    it.setFlags(it.flags() & ~Qt.ItemIsEditable)
-                self.saved_samples_table.setItem(row, 0, item_date)
-                self.saved_samples_table.setItem(row, 1, item_num)
-                self.saved_samples_table.setItem(row, 2, item_dil)
-                self.saved_samples_table.setItem(row, 3, item_mass)
-                if db_key == current_selection_key:
-                    row_to_reselect = row
-            if row_to_reselect >= 0:
-                self.saved_samples_table.selectRow(row_to_reselect)
+            self.saved_samples_model.set_connection(self.db_read_conn)
         except sqlite3.Error as e:
             QMessageBox.warning(self, "Database Error", f"Could not load samples table: {e}")
-        finally:
-            self.saved_samples_table.setSortingEnabled(True)
-
-    def _format_sigfigs_no_sci(self, x: float, sig: int = 3) -> str:
+            return
+        if current_selection_key is not None:
+            self._select_saved_sample(current_selection_key)
+
+    def _selected_saved_sample(self):
+        """(fila, clave BD) de la muestra seleccionada en 'Saved Samples' o (-1, None)."""
+        selection = self.saved_samples_table.selectionModel()
+        rows = selection.selectedRows() if selection is not None else []
+        if not rows:
+            return -1, None
+        row = rows[0].row()
+        return row, self.saved_samples_model.key_at(row)
+
+    def _select_saved_sample(self, db_key):
+        row = self.saved_samples_model.row_for_key(db_key)
+        if row >= 0:
+            self.saved_samples_table.selectRow(row)
+
+    def refresh_saved_samples(self, db_keys):
         """
-        Formatea 'x' con 'sig' cifras significativas SIN notación científica.
-        - Redondea correctamente (usa round con decimales calculados por orden de magnitud).
-        - No agrega ceros extra al final (quita ceros/punto sobrantes).
+        Actualización incremental de 'Saved Samples' para las claves indicadas
+        (ver SavedSamplesModel.refresh_keys). Si algo falla, recarga completa.
         """
-        if x == 0 or not math.isfinite(x):
-            return "0"
-        power = math.floor(math.log10(abs(x)))
-        decimals = sig - 1 - power
-        # Redondeo a 'decimals' (si decimals < 0 redondea a decenas, centenas, etc.)
-        rounded = round(x, decimals)
-        if decimals > 0:
-            s = f"{rounded:.{decimals}f}"
-            s = s.rstrip("0").rstrip(".")  # no agregar ceros innecesarios
-            return s if s else "0"
-        else:
-            # Sin decimales
-            return f"{rounded:.0f}"
+        if not self.db_conn:
+            return
+        try:
+            self.saved_samples_model.refresh_keys(db_keys)
+        except sqlite3.Error:
+            self.load_samples_table()
+
+    def _format_sigfigs_no_sci(self, x: float, sig: int = 3) -> str:
+        """Ver ps_quants_core.format_sigfigs_no_sci."""
+        return format_sigfigs_no_sci(x, sig=sig)
 
 
     # --------------- UI -----------------
@@ -197,6 +195,15 @@ class PSCalculatorApp(QWidget):
         self.setGeometry(100, 100, 1100, 780)
         self.setStyleSheet(STYLESHEET)
 
+        # Recálculo con debounce: solo las filas cuyo Amount cambió (todas si
+        # cambia Mass/DF), RECALC_DEBOUNCE_MS después de la última edición.
+        self._recalc_rows = set()
+        self._recalc_all = False
+        self._recalc_timer = QTimer(self)
+        self._recalc_timer.setSingleShot(True)
+        self._recalc_timer.setInterval(RECALC_DEBOUNCE_MS)
+        self._recalc_timer.timeout.connect(self._flush_recalculation)
+
         main_splitter = QSplitter(Qt.Horizontal)
         top_layout = QVBoxLayout(self)
         top_layout.addWidget(main_splitter)
@@ -245,7 +252,7 @@ class PSCalculatorApp(QWidget):
         dilution_layout.addWidget(QLabel("Dilution Factor:"))
         self.dilution_input = QLineEdit()
         self.dilution_input.setValidator(QDoubleValidator(0.0, 1000000.0, 5))
-        self.dilution_input.textChanged.connect(self._update_results_table)
+        self.dilution_input.textChanged.connect(lambda _text: self._schedule_recalculation())
         dilution_layout.addWidget(self.dilution_input)
         input_layout.addLayout(dilution_layout)
 
@@ -254,7 +261,7 @@ class PSCalculatorApp(QWidget):
         mass_mg_layout.addWidget(QLabel("Mass (mg):"))
         self.mass_mg_input = QLineEdit()
         self.mass_mg_input.setValidator(QDoubleValidator(0.01, 10000000.0, 5))
-        self.mass_mg_input.textChanged.connect(self._update_results_table)
+        self.mass_mg_input.textChanged.connect(lambda _text: self._schedule_recalculation())
         mass_mg_layout.addWidget(self.mass_mg_input)
         input_layout.addLayout(mass_mg_layout)
 
@@ -263,51 +270,26 @@ class PSCalculatorApp(QWidget):
         # Analytes table
         analyte_groupbox = QGroupBox("Analytes")
         analyte_layout = QVBoxLayout(); analyte_groupbox.setLayout(analyte_layout)
-        self.analytes_table = QTableWidget()
-        self.analytes_table.setRowCount(len(ANALYTES))
-        self.analytes_table.setColumnCount(6)
-        self.analytes_table.setHorizontalHeaderLabels(["Analyte Name", "Amount", "LOQ", "State Limit", "Final Result", "Status"])
+        # Modelo + delegate: un solo QLineEdit mientras se edita un Amount, en vez
+        # de un widget por analito (ver ps_analytes_model)
+        self.analytes_model = AnalytesModel(ANALYTES, LOQ, STATE_LIMITS, parent=self)
+        self.analytes_model.amountChanged.connect(self._schedule_recalculation)
+        self.amount_delegate = AmountDelegate(self)
+        self.amount_delegate.pasteRequested.connect(self._paste_values_into_amounts)
+        self._update_results_table()   # antes de setModel: la vista mide las columnas una sola vez
+        self.analytes_table = QTableView()
+        self.analytes_table.setModel(self.analytes_model)
+        self.analytes_table.setItemDelegateForColumn(AMOUNT_COLUMN, self.amount_delegate)
+        self.analytes_table.setEditTriggers(QAbstractItemView.AllEditTriggers)
         self.analytes_table.setAlternatingRowColors(True)
-
-        double_validator = QDoubleValidator(0.0, 1000000.0, 5)
-        for row, analyte_name in enumerate(ANALYTES):
-            name_item = QTableWidgetItem(analyte_name)
-            name_item.setFlags(name_item.flags() & ~Qt.ItemIsEditable)
-            self.analytes_table.setItem(row, 0, name_item)
-
-            amount_input = QLineEdit("0")
-            amount_input.setValidator(double_validator)
-            amount_input.textChanged.connect(self._update_results_table)
-            amount_input.installEventFilter(self)  # multi-cell paste
-            self.analytes_table.setCellWidget(row, 1, amount_input)
-            self.analyte_amount_inputs[analyte_name] = amount_input
-
-            loq_item = QTableWidgetItem(str(LOQ))
-            loq_item.setFlags(loq_item.flags() & ~Qt.ItemIsEditable)
-            loq_item.setTextAlignment(Qt.AlignCenter)
-            self.analytes_table.setItem(row, 2, loq_item)
-
-            state_limit = STATE_LIMITS.get(analyte_name, 0.0)
-            limit_item = QTableWidgetItem(str(state_limit))
-            limit_item.setFlags(limit_item.flags() & ~Qt.ItemIsEditable)
-            limit_item.setTextAlignment(Qt.AlignCenter)
-            self.analytes_table.setItem(row, 3, limit_item)
-
-            result_item = QTableWidgetItem("ND")
-            result_item.setFlags(result_item.flags() & ~Qt.ItemIsEditable)
-            result_item.setTextAlignment(Qt.AlignCenter)
-            self.analytes_table.setItem(row, 4, result_item)
-
-            status_item = QTableWidgetItem("-")
-            status_item.setFlags(status_item.flags() & ~Qt.ItemIsEditable)
-            status_item.setTextAlignment(Qt.AlignCenter)
-            self.analytes_table.setItem(row, 5, status_item)
+        self.analytes_table.installEventFilter(self)  # multi-cell paste sin editor abierto
 
         header = self.analytes_table.horizontalHeader()
         header.setSectionResizeMode(0, QHeaderView.Stretch)
-        header.setSectionResizeMode(1, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(2, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(3, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(1, QHeaderView.Fixed)
+        header.resizeSection(1, 150)
+        header.setSectionResizeMode(2, QHeaderView.Fixed)
+        header.setSectionResizeMode(3, QHeaderView.Fixed)
         header.setSectionResizeMode(4, QHeaderView.ResizeToContents)
         header.setSectionResizeMode(5, QHeaderView.ResizeToContents)
         self.analytes_table.verticalHeader().setVisible(False)
@@ -340,25 +322,49 @@ class PSCalculatorApp(QWidget):
         button_layout.addStretch()
         main_layout.addLayout(button_layout)
 
+        # Avance del batch en segundo plano (oculto si no hay batch en curso)
+        self.batch_progress = QProgressBar()
+        self.batch_progress.setTextVisible(True)
+        self.batch_status_label = QLabel("")
+        self.batch_cancel_button = QPushButton("Cancelar")
+        self.batch_cancel_button.setObjectName("delete_button")
+        self.batch_cancel_button.clicked.connect(self.cancel_batch)
+        self.batch_progress_widget = QWidget()
+        batch_progress_layout = QHBoxLayout(self.batch_progress_widget)
+        batch_progress_layout.setContentsMargins(0, 0, 0, 0)
+        batch_progress_layout.addWidget(self.batch_progress, 1)
+        batch_progress_layout.addWidget(self.batch_status_label)
+        batch_progress_layout.addWidget(self.batch_cancel_button)
+        self.batch_progress_widget.hide()
+        main_layout.addWidget(self.batch_progress_widget)
+
         # Right (Saved Samples)
         right_widget = QWidget()
         right_layout = QVBoxLayout(); right_widget.setLayout(right_layout)
         main_splitter.addWidget(right_widget)
 
         right_layout.addWidget(QLabel("Saved Samples"))
-        self.saved_samples_table = QTableWidget()
-        self.saved_samples_table.setColumnCount(4)
-        self.saved_samples_table.setHorizontalHeaderLabels(["Date", "Sample Number", "Dilution", "Mass (mg)"])
-        self.saved_samples_table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.saved_samples_table.setSelectionMode(QTableWidget.SingleSelection)
-        self.saved_samples_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.saved_samples_filter = QLineEdit()
+        self.saved_samples_filter.setPlaceholderText("Filtrar por fecha, cliente o sample…")
+        self.saved_samples_filter.textChanged.connect(self._filter_saved_samples)
+        right_layout.addWidget(self.saved_samples_filter)
+
+        # Modelo paginado: las filas se traen de la BD al hacer scroll y el
+        # orden/filtro se resuelven en SQL (ver ps_samples_model)
+        self.saved_samples_model = SavedSamplesModel(parent=self)
+        self.saved_samples_table = QTableView()
+        self.saved_samples_table.setModel(self.saved_samples_model)
+        self.saved_samples_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.saved_samples_table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.saved_samples_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.saved_samples_table.verticalHeader().setVisible(False)
         self.saved_samples_table.setAlternatingRowColors(True)
-        self.saved_samples_table.itemSelectionChanged.connect(self.load_selected_sample)
+        self.saved_samples_table.selectionModel().selectionChanged.connect(self.load_selected_sample)
         self.saved_samples_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
         self.saved_samples_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
         self.saved_samples_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.ResizeToContents)
         self.saved_samples_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeToContents)
+        self.saved_samples_table.horizontalHeader().setSortIndicator(0, Qt.DescendingOrder)
         self.saved_samples_table.setSortingEnabled(True)
         self.saved_samples_table.verticalHeader().setDefaultSectionSize(22)
 
@@ -380,8 +386,12 @@ class PSCalculatorApp(QWidget):
 
         main_splitter.setSizes([720, 380])
 
-        self.load_samples_table()
-        self._update_results_table()
+        # LOQ y State Limit no cambian: se miden una vez, ya con el estilo aplicado
+        # (ResizeToContents recorrería el modelo en cada pasada de layout)
+        self.analytes_table.horizontalHeader().ensurePolished()
+        self.analytes_table.resizeColumnToContents(2)
+        self.analytes_table.resizeColumnToContents(3)
+
         self.show()
 
     # =========================
@@ -398,7 +408,6 @@ class PSCalculatorApp(QWidget):
             return
 
         sample_date_str = self.sample_date_input.date().toString(Qt.ISODate)  # YYYY-MM-DD
-        db_key = f"{sample_date_str.replace('-', '')}_{sample_number}"  # yyyymmdd_sampleNumber
 
         client_name = self.client_name_input.text().strip()
         dilution_text = self.dilution_input.text().strip()
@@ -412,8 +421,8 @@ class PSCalculatorApp(QWidget):
             return
 
         analyte_amounts = {}
-        for analyte_name, input_widget in self.analyte_amount_inputs.items():
-            amount_text = input_widget.text().strip()
+        for analyte_name, amount_text in zip(ANALYTES, self.analytes_model.amount_texts()):
+            amount_text = amount_text.strip()
             try:
                 analyte_amounts[analyte_name] = float(amount_text) if amount_text else 0.0
             except ValueError:
@@ -421,10 +430,11 @@ class PSCalculatorApp(QWidget):
                 return
 
         analyte_data_json = json.dumps(analyte_amounts)
+        db_key = ps_db.make_db_key(sample_date_str, sample_number)
 
         overwrite = False
         try:
-            cursor = self.db_conn.cursor()
+            cursor = self.db_read_conn.cursor()
             cursor.execute("SELECT 1 FROM samples WHERE sample_number = ?", (db_key,))
             exists = cursor.fetchone()
             if exists:
@@ -442,30 +452,19 @@ class PSCalculatorApp(QWidget):
             return
 
         try:
-            cursor = self.db_conn.cursor()
-            cursor.execute("""
-                INSERT OR REPLACE INTO samples
-                (sample_number, original_sample_number, client_name, sample_date, dilution_factor, mass_mg, analyte_data)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (db_key, sample_number, client_name, sample_date_str, dilution_factor, mass_mg, analyte_data_json))
-            self.db_conn.commit()
+            ps_db.upsert_sample(self.db_conn, (db_key, sample_number, client_name, sample_date_str,
+                                               dilution_factor, mass_mg, analyte_data_json, None))
             save_message = "updated" if overwrite else "saved"
             QMessageBox.information(self, "Success", f"Sample '{sample_number}' for {sample_date_str} {save_message} successfully.")
-            self.load_samples_table()
+            self.refresh_saved_samples([db_key])
         except sqlite3.Error as e:
             QMessageBox.critical(self, "Database Error", f"Could not save sample '{db_key}': {e}")
 
     def load_selected_sample(self):
-        selected_row = self.saved_samples_table.currentRow()
+        selected_row, db_key = self._selected_saved_sample()
         if selected_row < 0:
             return
 
-        db_key_item = self.saved_samples_table.item(selected_row, 0)
-        if not db_key_item:
-            QMessageBox.warning(self, "Error", "Could not retrieve item for selected row.")
-            return
-
-        db_key = db_key_item.data(Qt.UserRole)
         if not db_key:
             QMessageBox.warning(self, "Error", "Could not retrieve key for selected item.")
             return
@@ -475,8 +474,10 @@ class PSCalculatorApp(QWidget):
             return
 
         try:
-            cursor = self.db_conn.cursor()
-            cursor.execute("SELECT * FROM samples WHERE sample_number = ?", (db_key,))
+            cursor = self.db_read_conn.cursor()
+            cursor.execute("""SELECT sample_number, original_sample_number, client_name, sample_date,
+                                     dilution_factor, mass_mg, analyte_data
+                              FROM samples WHERE sample_number = ?""", (db_key,))
             sample_data = cursor.fetchone()
 
             if not sample_data:
@@ -508,10 +509,8 @@ class PSCalculatorApp(QWidget):
             self.mass_mg_input.blockSignals(False)
 
             analyte_amounts = json.loads(analyte_data_json)
-            for analyte_name, amount_widget in self.analyte_amount_inputs.items():
-                amount_widget.blockSignals(True)
-                amount_widget.setText(str(analyte_amounts.get(analyte_name, 0.0)))
-                amount_widget.blockSignals(False)
+            self.analytes_model.set_amount_texts(
+                {row: str(analyte_amounts.get(analyte_name, 0.0)) for row, analyte_name in enumerate(ANALYTES)})
 
             self._update_results_table()
 
@@ -521,23 +520,17 @@ class PSCalculatorApp(QWidget):
             QMessageBox.critical(self, "Data Error", f"Could not parse analyte data for sample '{db_key}'.")
 
     def delete_selected_sample(self):
-        selected_row = self.saved_samples_table.currentRow()
+        selected_row, db_key = self._selected_saved_sample()
         if selected_row < 0:
             QMessageBox.warning(self, "Selection Error", "Please select a sample from the table to delete.")
             return
 
-        db_key_item = self.saved_samples_table.item(selected_row, 0)
-        if not db_key_item:
-            QMessageBox.warning(self, "Error", "Could not retrieve item data for deletion.")
-            return
-
-        db_key = db_key_item.data(Qt.UserRole)
         if not db_key:
             QMessageBox.warning(self, "Error", "Could not retrieve key for selected item to delete.")
             return
 
-        date_text = self.saved_samples_table.item(selected_row, 0).text()
-        num_text = self.saved_samples_table.item(selected_row, 1).text()
+        date_text = self.saved_samples_model.index(selected_row, 0).data()
+        num_text = self.saved_samples_model.index(selected_row, 1).data()
         display_text = f"{num_text} ({date_text})"
 
         reply = QMessageBox.question(
@@ -548,26 +541,51 @@ class PSCalculatorApp(QWidget):
 
         if reply == QMessageBox.Yes:
             try:
-                cursor = self.db_conn.cursor()
-                cursor.execute("DELETE FROM samples WHERE sample_number = ?", (db_key,))
-                self.db_conn.commit()
+                ps_db.delete_sample(self.db_conn, db_key)
                 QMessageBox.information(self, "Deleted", f"Sample '{display_text}' deleted.")
-                self.load_samples_table()
+                self.saved_samples_model.remove_key(db_key)
             except sqlite3.Error as e:
                 QMessageBox.critical(self, "Database Error", f"Could not delete sample '{db_key}': {e}")
 
     # ============================
     # Cálculo & Export
     # ============================
-    def _update_results_table(self):
+    def _schedule_recalculation(self, row=None):
+        """
+        Marca filas para recalcular y (re)inicia el temporizador de debounce:
+        row=None => todas (cambió Mass/DF); si no, solo esa fila (cambió su Amount).
         """
-        Recalcula y actualiza la columna 'Final Result' de la tabla.
+        if row is None:
+            self._recalc_all = True
+        else:
+            self._recalc_rows.add(row)
+        self._recalc_timer.start()
+
+    def _flush_recalculation(self):
+        """Aplica ya el recálculo pendiente (antes de leer la tabla para exportar/copiar)."""
+        if self._recalc_timer.isActive():
+            self._recalc_timer.stop()
+        if self._recalc_all:
+            self._update_results_table()
+        elif self._recalc_rows:
+            rows, self._recalc_rows = self._recalc_rows, set()
+            self._update_results_table(rows)
+
+    def _update_results_table(self, rows=None):
+        """
+        Recalcula y actualiza 'Final Result' y 'Status' (todas las filas o solo 'rows').
 
-        NUEVO: Final result = (Amount / Mass_mg) * DF
+        Final result = (Amount / Mass_mg) * DF (ver ps_quants_core.calculate_results_matrix)
         - Mass (mg) se usa tal cual viene en la UI (y del Excel).
-        - Se mantiene ND si resultado < LOQ (0.1).
-        - Formato: 3 cifras significativas ({:.3g}).
+        - Los items existentes se actualizan en el sitio.
         """
+        if rows is None:
+            self._recalc_timer.stop()
+            self._recalc_all = False
+            self._recalc_rows = set()
+            rows = range(len(ANALYTES))
+        else:
+            rows = sorted(rows)
         try:
             dilution_text = self.dilution_input.text().strip()
             mass_mg_text = self.mass_mg_input.text().strip()
@@ -576,116 +594,59 @@ class PSCalculatorApp(QWidget):
         except ValueError:
             return
 
-        mass_is_valid = mass_mg > 0
-
-        for row, analyte_name in enumerate(ANALYTES):
-            final_result_str = "-"
+        amounts = []
+        invalid_rows = set()
+        for row in rows:
+            amount_text = self.analytes_model.amount_text(row).strip()
             try:
-                amount_input_widget = self.analyte_amount_inputs[analyte_name]
-                amount_text = amount_input_widget.text().strip()
-                analyte_amount = float(amount_text) if amount_text else 0.0
-                result_numeric = 0.0
-
-                if analyte_amount == 0.0:
-                    final_result_str = "ND"
-                else:
-                    if mass_is_valid:
-                        # NUEVA FÓRMULA
-                        result_numeric = (analyte_amount / mass_mg) * dilution_factor
-                        # Lógica ND/LOQ se mantiene
-                        if result_numeric < LOQ:
-                            final_result_str = "ND"
-                        else:
-                            #final_result_str = "{:.3g}".format(result_numeric)
-                            final_result_str = self._format_sigfigs_no_sci(result_numeric, sig=3)
-                    else:
-                        final_result_str = "Invalid Mass"
+                amounts.append(float(amount_text) if amount_text else 0.0)
             except ValueError:
-                final_result_str = "Invalid Amt"
-            except Exception as e:
-                print(f"Error updating row {row} ({analyte_name}): {e}")
-                final_result_str = "Error"
-
-            result_item = QTableWidgetItem(final_result_str)
-            result_item.setFlags(result_item.flags() & ~Qt.ItemIsEditable)
-            result_item.setTextAlignment(Qt.AlignCenter)
-
-            if final_result_str == "ND":
-                result_item.setBackground(QColor('lightgreen'))
-            else:
-                result_item.setBackground(QColor('white'))
-
-            self.analytes_table.setItem(row, 4, result_item)
-
-            # Status
-            status_str = "-"
-            state_limit = STATE_LIMITS.get(analyte_name, float('inf'))
-
-            if final_result_str == "ND":
-                status_str = "Pass"
-            elif final_result_str in ("-", "Invalid Mass", "Invalid Amt", "Error"):
-                status_str = "-"
-            else:
-                try:
-                    result_numeric_val = float(final_result_str)
-                    status_str = "Fail" if result_numeric_val > state_limit else "Pass"
-                except ValueError:
-                    status_str = "Error"
-
-            status_item = QTableWidgetItem(status_str)
-            status_item.setFlags(status_item.flags() & ~Qt.ItemIsEditable)
-            status_item.setTextAlignment(Qt.AlignCenter)
-            if status_str == "Fail":
-                status_item.setForeground(QColor('red'))
-            elif status_str == "Pass":
-                status_item.setForeground(QColor('darkgreen'))
-            self.analytes_table.setItem(row, 5, status_item)
+                amounts.append(0.0)
+                invalid_rows.add(row)
+        if not amounts:
+            return
+
+        calc = calculate_results_matrix([amounts], mass_mg, dilution_factor,
+                                        analytes=[ANALYTES[row] for row in rows])
+        final_results = calc["final_result"][0]
+        statuses = calc["status"][0]
+
+        final_results = list(final_results)
+        statuses = list(statuses)
+        for i, row in enumerate(rows):
+            if row in invalid_rows:
+                final_results[i], statuses[i] = "Invalid Amt", "-"
+        self.analytes_model.set_results(rows, final_results, statuses)
 
     def eventFilter(self, obj, event):
-        """Enable multi-cell paste into the Amount column."""
+        """Pegado de varias celdas en la columna Amount (tabla sin editor abierto)."""
         try:
-            if event.type() == QEvent.KeyPress and isinstance(obj, QLineEdit):
-                if event.matches(QKeySequence.Paste):
-                    if obj in self.analyte_amount_inputs.values():
-                        text = QApplication.clipboard().text()
-                        if ('\n' in text) or ('\t' in text) or ('\r' in text):
-                            self._paste_values_into_amounts(obj, text)
-                            return True
+            if (event.type() == QEvent.KeyPress and obj is self.analytes_table
+                    and event.matches(QKeySequence.Paste)):
+                current = self.analytes_table.currentIndex()
+                if current.isValid() and current.column() == AMOUNT_COLUMN:
+                    self._paste_values_into_amounts(current.row(), QApplication.clipboard().text())
+                    return True
         except Exception as e:
             print(f"Paste event handling error: {e}")
         return super().eventFilter(obj, event)
 
-    def _paste_values_into_amounts(self, start_widget, text):
-        start_row = 0
-        for r in range(self.analytes_table.rowCount()):
-            if self.analytes_table.cellWidget(r, 1) is start_widget:
-                start_row = r
-                break
-
-        lines = [line for line in text.splitlines() if line is not None]
-        if not lines:
+    def _paste_values_into_amounts(self, start_row, text):
+        """
+        Pega un bloque (una o varias columnas) en la columna Amount a partir de
+        'start_row': se parsea todo el bloque de una vez (parse_pasted_amounts),
+        se asignan los textos al modelo sin amountChanged y se recalculan solo las
+        filas pegadas en un único paso.
+        """
+        values = parse_pasted_amounts(text)
+        if not values:
             return
 
-        values = []
-        for line in lines:
-            if '\t' in line:
-                cell = line.split('\t', 1)[0]
-            else:
-                cell = line
-            cell = cell.strip()
-            values.append('0' if cell == '' else cell)
-
-        last_row = self.analytes_table.rowCount()
-        for i, val in enumerate(values):
-            row = start_row + i
-            if row >= last_row:
-                break
-            w = self.analytes_table.cellWidget(row, 1)
-            if isinstance(w, QLineEdit):
-                w.blockSignals(True)
-                w.setText(val)
-                w.blockSignals(False)
-        self._update_results_table()
+        values = values[:len(ANALYTES) - start_row]
+        rows = range(start_row, start_row + len(values))
+        self.analytes_model.set_amount_texts(dict(zip(rows, values)))
+        self._recalc_rows.difference_update(rows)
+        self._update_results_table(rows)
 
     def export_results(self):
         """Export con diálogo (manual)."""
@@ -720,8 +681,7 @@ class PSCalculatorApp(QWidget):
             QMessageBox.warning(self, "Export Error", "No data to export.")
             return
 
-        df_results = pd.DataFrame(export_data)
-        df_results = df_results[["Analyte Name", "Analyte Amount", "LOQ", "State Limit", "Final Result", "Status"]]
+        df_results = self._export_dataframe(export_data)
 
         today_date = datetime.date.today().strftime("%Y%m%d")
         safe_sample_number = "".join(c for c in sample_number if c.isalnum() or c in ('_', '-')).rstrip()
@@ -768,29 +728,30 @@ class PSCalculatorApp(QWidget):
         if not export_data:
             raise ValueError("No data to export.")
 
-        df_results = pd.DataFrame(export_data)
-        df_results = df_results[["Analyte Name", "Analyte Amount", "LOQ", "State Limit", "Final Result", "Status"]]
+        df_results = self._export_dataframe(export_data)
         self._write_export_excel(file_path, df_results)
 
+    @staticmethod
+    def _export_dataframe(export_data):
+        import pandas as pd
+        from ps_reports import EXPORT_COLUMNS
+        return pd.DataFrame(export_data)[EXPORT_COLUMNS]
+
     def _collect_export_rows(self):
+        self._flush_recalculation()
         export_data = []
         has_calculable_data = False
+        model = self.analytes_model
         for row, analyte_name in enumerate(ANALYTES):
-            amount_widget = self.analyte_amount_inputs[analyte_name]
-            amount_text = amount_widget.text().strip()
+            amount_text = model.amount_text(row).strip()
             try:
                 analyte_amount = float(amount_text) if amount_text else 0.0
             except ValueError:
                 continue
 
-            loq_item = self.analytes_table.item(row, 2)
-            loq_text = loq_item.text() if loq_item else str(LOQ)
-            final_result_item = self.analytes_table.item(row, 4)
-            final_result_text = final_result_item.text() if final_result_item else "-"
-            state_limit_item = self.analytes_table.item(row, 3)
-            state_limit_text = state_limit_item.text() if state_limit_item else "N/A"
-            status_item = self.analytes_table.item(row, 5)
-            status_text = status_item.text() if status_item else "-"
+            loq_text = model.index(row, 2).data()
+            state_limit_text = model.index(row, 3).data()
+            final_result_text, status_text = model.result(row)
 
             export_data.append({
                 "Analyte Name": analyte_name,
@@ -800,56 +761,35 @@ class PSCalculatorApp(QWidget):
                 "Final Result": final_result_text,
                 "Status": status_text
             })
-            if final_result_text not in ("-", "Invalid Mass", "Invalid Amt", "Error"):
+            if final_result_text not in NON_NUMERIC_RESULTS:
                 has_calculable_data = True
         return export_data, has_calculable_data
 
     def _write_export_excel(self, file_path, df_results):
+        from ps_reports import make_sample_info, write_export_excel
         sample_number = self.sample_input.text().strip()
         dilution_text = self.dilution_input.text().strip()
         mass_mg_text = self.mass_mg_input.text().strip()
         dilution_factor = float(dilution_text) if dilution_text else 0.0
-        mass_in_grams = (float(mass_mg_text) / 1000.0) if mass_mg_text else 0.0
-
-        with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-            sample_info = {
-                "Sample Number:": sample_number,
-                "Client Name:": self.client_name_input.text().strip(),
-                "Sample Date:": self.sample_date_input.date().toString(Qt.ISODate),
-                "Dilution Factor:": dilution_factor,    # sin forzar decimal
-                "Mass (g):": mass_in_grams
-            }
-            df_info_keys = pd.DataFrame(list(sample_info.keys()), columns=["Parameter"])
-            df_info_vals = pd.DataFrame(list(sample_info.values()), columns=["Value"])
-            df_info_keys.to_excel(writer, sheet_name='Sheet1', index=False, header=False, startrow=0, startcol=0)
-            df_info_vals.to_excel(writer, sheet_name='Sheet1', index=False, header=False, startrow=0, startcol=1)
-
-            start_row_results = len(sample_info) + 1
-            df_results.to_excel(writer, sheet_name='Sheet1', index=False, startrow=start_row_results)
-
-            worksheet = writer.sheets['Sheet1']
-            for col_idx, column in enumerate(worksheet.columns):
-                max_length = 0
-                column_letter = get_column_letter(col_idx + 1)
-                for cell in column:
-                    try:
-                        if cell.value:
-                            cell_length = len(str(cell.value))
-                            if cell_length > max_length:
-                                max_length = cell_length
-                    except:
-                        pass
-                adjusted_width = max_length + 2
-                worksheet.column_dimensions[column_letter].width = adjusted_width
+        mass_mg = float(mass_mg_text) if mass_mg_text else 0.0
+
+        sample_info = make_sample_info(
+            sample_number,
+            self.client_name_input.text().strip(),
+            self.sample_date_input.date().toString(Qt.ISODate),
+            dilution_factor,
+            mass_mg,
+        )
+        write_export_excel(file_path, df_results, sample_info)
 
     # ============================
     # Utilidades UI
     # ============================
     def copy_final_results(self):
+        self._flush_recalculation()
         final_results = []
-        for row in range(self.analytes_table.rowCount()):
-            item = self.analytes_table.item(row, 4)
-            final_results.append(item.text() if item else "")
+        for row in range(self.analytes_model.rowCount()):
+            final_results.append(self.analytes_model.index(row, RESULT_COLUMN).data())
         if final_results:
             QApplication.clipboard().setText("\n".join(final_results))
             QMessageBox.information(self, "Copied", "Final results copied to clipboard.")
@@ -867,13 +807,21 @@ class PSCalculatorApp(QWidget):
         self.sample_date_input.setDate(QDate.currentDate())
         self.dilution_input.clear()
         self.mass_mg_input.clear()
-        for amount_widget in self.analyte_amount_inputs.values():
-            amount_widget.setText("0")
+        self.analytes_model.set_amount_texts({row: "0" for row in range(len(ANALYTES))})
+        self._schedule_recalculation()
         QMessageBox.information(self, "Cleared", "Input fields have been cleared.")
 
     def closeEvent(self, event):
-        if self.db_conn:
-            self.db_conn.close()
+        if self._batch_thread is not None:
+            # Se deja terminar el reporte en curso antes de cerrar la BD; lo que el
+            # worker emita después ya no se muestra
+            self._batch_worker.saved.disconnect(self.refresh_saved_samples)
+            self._batch_worker.finished.disconnect(self._on_batch_finished)
+            self._batch_worker.failed.disconnect(self._on_batch_failed)
+            self.cancel_batch()
+            self._batch_thread.wait()
+        if self.db:
+            self.db.close()
             print("Database connection closed.")
         event.accept()
 
@@ -883,162 +831,135 @@ class PSCalculatorApp(QWidget):
     @staticmethod
     def _extract_batch_date_from_path(file_path):
         """Devuelve la fecha YYYYMMDD embebida en el nombre del archivo o None."""
-        base_name = os.path.basename(file_path)
-        name_part, _ = os.path.splitext(base_name)
-        match = re.search(r'([0-9]{8})', name_part)
-        if match:
-            return match.group(1)
-        return None
+        return extract_batch_date_from_path(file_path)
 
     @staticmethod
     def _normalize_sample_id_text(x):
-        """
-        Normaliza el Sample Number:
-        - Si viene como 14936.0 (float/string), devuelve '14936'
-        - Si trae espacios, los recorta
-        """
-        if x is None:
-            return ""
-        s = str(x).strip()
-        # quita .0 al final si es float-like
-        if s.endswith(".0"):
-            try:
-                f = float(s)
-                if f.is_integer():
-                    return str(int(f))
-            except:
-                pass
-        # intenta castear a num y detectar entero
-        try:
-            v = pd.to_numeric(s, errors='coerce')
-            if pd.notna(v) and float(v).is_integer():
-                return str(int(v))
-        except:
-            pass
-        return s
+        """Ver ps_quants_core.normalize_sample_id_text."""
+        return normalize_sample_id_text(x)
 
     def _get_default_output_dir_today(self):
         """Devuelve ./Excel reports/<YYYYMMDD>, creándolo si no existe."""
-        base_dir = os.path.join(os.getcwd(), "Excel reports")
-        today_folder = datetime.date.today().strftime("%Y%m%d")
-        out_dir = os.path.join(base_dir, today_folder)
-        os.makedirs(out_dir, exist_ok=True)
-        return out_dir
+        return get_default_output_dir_today()
 
     def _ui_batch_from_excel_dialog(self):
-        """Pide solo el Excel de entrada. La salida va a ./Excel reports/<YYYYMMDD>/"""
+        """Pide solo el archivo de entrada (Excel/CSV/TSV/Parquet). La salida va a ./Excel reports/<YYYYMMDD>/"""
         xlsx_path, _ = QFileDialog.getOpenFileName(
             self, "Selecciona Excel de entrada",
-            "", "Excel Files (*.xlsx *.xls);;All Files (*)"
+            "", "Raw results (*.xlsx *.xls *.csv *.tsv *.parquet);;Excel Files (*.xlsx *.xls);;"
+                "CSV / TSV (*.csv *.tsv *.tab *.txt);;Parquet (*.parquet *.pq);;All Files (*)"
         )
         if not xlsx_path:
             return
 
         out_dir = self._get_default_output_dir_today()
+        self.start_batch_from_excel(xlsx_path, out_dir, limit_reports=DEFAULT_BATCH_LIMIT)  # None => procesa todos
+
+    def _show_batch_summary(self, summary):
+        out_dir = summary["output_dir"]
+        message = f"Se generaron {summary['processed']} reporte(s) en:\n{out_dir}"
+        if summary["cancelled"]:
+            message = f"Batch cancelado. {message}"
+        if summary["skipped"]:
+            message += f"\n\n{len(summary['skipped'])} sample(s) sin cambios (omitidos)."
+        if summary["failed"]:
+            failed_lines = "\n".join(f"- {num}: {err}" for num, err in summary["failed"][:10])
+            message += f"\n\n{len(summary['failed'])} sample(s) con error:\n{failed_lines}"
+        if summary["db_error"]:
+            message += f"\n\nNo se pudo guardar el batch en la base de datos:\n{summary['db_error']}"
+        if summary.get("metrics"):
+            message += f"\n\nTiempo: {summary['metrics']['wall_s']:.1f} s"
+        QMessageBox.information(self, "Batch cancelado" if summary["cancelled"] else "Batch completado", message)
+
+    # ---------- Batch en segundo plano ----------
+    def start_batch_from_excel(self, xlsx_path, output_dir, limit_reports=None, workers=None):
+        """
+        Corre ps_batch.run_batch en un QThread (ver ps_batch_worker): la ventana sigue
+        respondiendo, la barra muestra avance / ritmo / tiempo restante, y las muestras
+        van apareciendo en 'Saved Samples' a medida que se guardan. No toca los inputs
+        de la muestra en pantalla; el Client Name se toma al arrancar.
+        """
+        if self._batch_thread is not None:
+            return
+        self._finish_startup()
+        self._batch_worker = BatchWorker(
+            xlsx_path, output_dir,
+            db_path=self.db.db_path if self.db else None,
+            limit_reports=limit_reports,
+            client_name=self.client_name_input.text().strip(),
+            workers=workers,
+        )
+        self._batch_worker.progress.connect(self._on_batch_progress)
+        self._batch_worker.saved.connect(self.refresh_saved_samples)
+        self._batch_worker.finished.connect(self._on_batch_finished)
+        self._batch_worker.failed.connect(self._on_batch_failed)
+
+        self.batch_button.setEnabled(False)
+        self.batch_cancel_button.setEnabled(True)
+        self.batch_progress.setRange(0, 0)   # indeterminado mientras se lee el archivo
+        self.batch_status_label.setText("Leyendo archivo…")
+        self.batch_progress_widget.show()
+        self._batch_thread = start_batch_thread(self._batch_worker, parent=self)
+
+    def cancel_batch(self):
+        if self._batch_worker is not None:
+            self._batch_worker.cancel()
+            self.batch_cancel_button.setEnabled(False)
+            self.batch_status_label.setText("Cancelando…")
+
+    def _on_batch_progress(self, done, total, sample_number, rate, eta):
+        self.batch_progress.setRange(0, total)
+        self.batch_progress.setValue(done)
+        self.batch_progress.setFormat(f"{done}/{total}")
+        if not self.batch_cancel_button.isEnabled():
+            return
+        status = f"{sample_number}"
+        if rate > 0:
+            status += f" · {rate:.1f} samples/s"
+        if eta >= 0:
+            minutes, seconds = divmod(int(round(eta)), 60)
+            status += f" · faltan {minutes}:{seconds:02d}"
+        self.batch_status_label.setText(status)
+
+    def _finish_batch(self):
+        self._batch_worker = None
+        self._batch_thread = None
+        self.batch_progress_widget.hide()
+        self.batch_button.setEnabled(True)
+
+    def _on_batch_finished(self, summary):
+        self._finish_batch()
+        if summary["db_error"]:
+            self.load_samples_table()
+        self._show_batch_summary(summary)
 
-        try:
-            processed = self.batch_generate_reports_from_excel(
-                xlsx_path=xlsx_path,
-                output_dir=out_dir,
-                limit_reports=DEFAULT_BATCH_LIMIT  # None => procesa todos
-            )
-            QMessageBox.information(
-                self, "Batch completado",
-                f"Se generaron {processed} reporte(s) en:\n{out_dir}"
-            )
-        except Exception as e:
-            QMessageBox.critical(self, "Error en batch", str(e))
+    def _on_batch_failed(self, message):
+        self._finish_batch()
+        self.load_samples_table()
+        QMessageBox.critical(self, "Error en batch", message)
 
     def _read_raw_results_excel(self, xlsx_path):
-        """
-        Lee el Excel y normaliza columnas clave:
-        A: sample, B: component, D: calc_conc, E: mass_mg, F: df, G: include (YES/NO)
-        (OJO: 'RESULT' ya no existe; ahora G es el include)
-        """
-        try:
-            df = pd.read_excel(xlsx_path, sheet_name=RAW_SHEET_NAME, engine='openpyxl')
-        except Exception:
-            df = pd.read_excel(xlsx_path, sheet_name=RAW_SHEET_NAME, header=None, engine='openpyxl')
-
-        if df is None or df.empty:
-            raise ValueError(f"No se pudo leer datos de la hoja '{RAW_SHEET_NAME}'.")
-
-        # Necesitamos al menos hasta la columna G => 7 columnas
-        if df.shape[1] < 7:
-            raise ValueError("La hoja no tiene al menos 7 columnas (A..G). Verifica el formato.")
-
-        norm = pd.DataFrame({
-            'sample': df.iloc[:, 0],   # A
-            'component': df.iloc[:, 1],# B
-            'calc_conc': df.iloc[:, 3],# D (Amount)
-            'mass_mg': df.iloc[:, 4],  # E
-            'df': df.iloc[:, 5],       # F
-            'include': df.iloc[:, 6],  # G (YES/NO)
-        })
-
-        # Normaliza
-        norm['sample'] = norm['sample'].map(self._normalize_sample_id_text)
-        norm['component'] = norm['component'].astype(str).str.strip()
-        norm['calc_conc'] = pd.to_numeric(norm['calc_conc'], errors='coerce')
-        norm['mass_mg'] = pd.to_numeric(norm['mass_mg'], errors='coerce')
-        norm['df'] = pd.to_numeric(norm['df'], errors='coerce')
-        norm['include'] = norm['include'].astype(str).str.strip().str.upper().isin(['YES', 'Y', 'TRUE', '1'])
-
-        # Filtra filas con sample y component no vacíos
-        norm = norm[(norm['sample'] != '') & (norm['component'] != '')]
-        return norm
+        """Ver ps_ingest.read_raw_results (Excel, CSV/TSV o Parquet según la extensión)."""
+        from ps_ingest import read_raw_results
+        return read_raw_results(xlsx_path)
 
     @staticmethod
     def _map_component_to_analyte(component_name: str) -> str:
         """Normaliza etiquetas de componentes para coincidir con ANALYTES."""
-        name = component_name.strip()
-        if not name:
-            return ""
-
-        name = re.sub(r"\s+", " ", name)
-        tokens = name.split(" ")
-
-        def is_suffix_token(token: str) -> bool:
-            clean = token.strip()
-            if not clean:
-                return False
-            clean = clean.strip("()[]{}.,;:-")
-            if not clean:
-                return False
-            if clean.isdigit():
-                return True
-            return bool(re.fullmatch(r"[IVXLCDM]+", clean.upper()))
-
-        while tokens:
-            candidate = " ".join(tokens)
-            mapped = ANALYTE_ALIAS_MAP.get(candidate, candidate)
-            if mapped in ANALYTE_NAME_SET:
-                return mapped
-            if not is_suffix_token(tokens[-1]):
-                break
-            tokens.pop()
-
-        base_candidate = " ".join(tokens).strip()
-        mapped = ANALYTE_ALIAS_MAP.get(base_candidate, base_candidate)
-        if mapped in ANALYTE_NAME_SET:
-            return mapped
-        return mapped or component_name.strip()
+        return map_component_to_analyte(component_name)
 
     def _fill_amounts_from_dict(self, analyte_to_amount):
         """Pone 0 en todos y luego llena los analitos presentes con sus Amounts."""
-        for a_name, w in self.analyte_amount_inputs.items():
-            w.blockSignals(True); w.setText("0"); w.blockSignals(False)
-        for a_name, amount_val in analyte_to_amount.items():
-            if a_name in self.analyte_amount_inputs:
-                w = self.analyte_amount_inputs[a_name]
-                w.blockSignals(True); w.setText(str(amount_val)); w.blockSignals(False)
+        texts = {row: "0" for row in range(len(ANALYTES))}
+        for row, a_name in enumerate(ANALYTES):
+            if a_name in analyte_to_amount:
+                texts[row] = str(analyte_to_amount[a_name])
+        self.analytes_model.set_amount_texts(texts)
         self._update_results_table()
 
     @staticmethod
     def _make_output_filename(sample_number, out_dir):
-        date_str = datetime.date.today().strftime("%Y%m%d")
-        safe_sample = "".join(c for c in str(sample_number) if c.isalnum() or c in ('_', '-')).rstrip() or "NoSampleNum"
-        return os.path.join(out_dir, f"{date_str}_{safe_sample}_PSQuants.xlsx")
+        return make_output_filename(sample_number, out_dir)
 
     def save_current_sample_silent(self):
         """Guarda la muestra actual en la BD sin diálogos (INSERT OR REPLACE)."""
@@ -1048,7 +969,7 @@ class PSCalculatorApp(QWidget):
         if not sample_number:
             return
         sample_date_str = self.sample_date_input.date().toString(Qt.ISODate)
-        db_key = f"{sample_date_str.replace('-', '')}_{sample_number}"
+        db_key = ps_db.make_db_key(sample_date_str, sample_number)
         client_name = self.client_name_input.text().strip()
         try:
             dilution_factor = float(self.dilution_input.text().strip() or 0.0)
@@ -1057,135 +978,64 @@ class PSCalculatorApp(QWidget):
             dilution_factor, mass_mg = 0.0, 0.0
 
         analyte_amounts = {}
-        for analyte_name, input_widget in self.analyte_amount_inputs.items():
+        for analyte_name, amount_text in zip(ANALYTES, self.analytes_model.amount_texts()):
             try:
-                analyte_amounts[analyte_name] = float(input_widget.text().strip() or 0.0)
+                analyte_amounts[analyte_name] = float(amount_text.strip() or 0.0)
             except ValueError:
                 analyte_amounts[analyte_name] = 0.0
 
         analyte_data_json = json.dumps(analyte_amounts)
         try:
-            cursor = self.db_conn.cursor()
-            cursor.execute("""
-                INSERT OR REPLACE INTO samples
-                (sample_number, original_sample_number, client_name, sample_date, dilution_factor, mass_mg, analyte_data)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (db_key, sample_number, client_name, sample_date_str, dilution_factor, mass_mg, analyte_data_json))
-            self.db_conn.commit()
+            ps_db.upsert_sample(self.db_conn, (db_key, sample_number, client_name, sample_date_str,
+                                               dilution_factor, mass_mg, analyte_data_json, None))
         except sqlite3.Error as e:
             print(f"[Batch save] DB error: {e}")
+            return
+        self.refresh_saved_samples([db_key])
 
-    def batch_generate_reports_from_excel(self, xlsx_path, output_dir, limit_reports=None):
+    def batch_generate_reports_from_excel(self, xlsx_path, output_dir, limit_reports=None, workers=None,
+                                          profile=False, trace_memory=False):
         """
-        Un reporte por sample (solo samples con al menos un componente include=YES):
-        - Identifica de manera EXPLÍCITA la lista de samples únicos (sin inventar).
-        - Si limit_reports es None -> procesa todos; si es un número, procesa hasta ese máximo.
-        - Para cada sample:
-            * Dentro del sample, filtra filas con include=YES (columna G).
-            * Toma la PRIMERA ocurrencia por analito (si hay X 1 y X 2, se queda solo con el primero).
-            * Amount = col D (calc_conc).
-            * Mass (mg) = col E; DF = col F (tal cual).
-            * Final result lo calcula _update_results_table() con la nueva fórmula.
-            * Exporta y guarda en BD en silencio.
+        Un reporte por sample (solo samples con al menos un componente include=YES).
+        El cálculo lo hace el motor headless (ps_batch.run_batch) directamente desde
+        el DataFrame, sin pasar por los widgets; aquí solo se actualizan en 'Saved
+        Samples' las muestras guardadas (recarga completa si el batch falla).
+        El Client Name actual de la UI se aplica a todos los reportes del batch.
+        Devuelve el resumen de ps_batch.run_batch (processed / failed), con las
+        métricas de la corrida en summary["metrics"] (etapas del motor más
+        'ui_refresh'; ver ps_batch.log_batch_run).
         """
-        if not os.path.isfile(xlsx_path):
-            raise FileNotFoundError(f"Archivo no encontrado: {xlsx_path}")
-        if not os.path.isdir(output_dir):
-            raise NotADirectoryError(f"Carpeta de salida inválida: {output_dir}")
-
-        df = self._read_raw_results_excel(xlsx_path)
-
-        batch_date = None
-        date_str = self._extract_batch_date_from_path(xlsx_path)
-        if date_str:
-            parsed_date = QDate.fromString(date_str, "yyyyMMdd")
-            if parsed_date.isValid():
-                batch_date = parsed_date
-
-        # 1) Filtra SOLO filas YES
-        df_yes = df[df['include']].copy()
-        if df_yes.empty:
-            raise ValueError("No hay filas con include=YES en la hoja seleccionada.")
-
-        # 2) Lista explícita de samples únicos (en orden de aparición), normalizados
-        samples_unique = list(dict.fromkeys(df_yes['sample'].tolist()))
-        if not samples_unique:
-            self.load_samples_table()
-            return 0
-
-        # Si se especifica un límite, recorta la lista; si no, procesa todos
-        if limit_reports is not None:
+        import ps_batch
+        import ps_metrics
+        self._finish_startup()
+        metrics = ps_metrics.BatchMetrics(profile=profile, trace_memory=trace_memory)
+        summary = None
+        with metrics.run():
             try:
-                nmax = int(limit_reports)
-                samples_unique = samples_unique[:max(0, nmax)]
-            except:
-                pass  # si el límite no es válido, ignora y procesa todos
-
-        processed = 0
-        for sample in samples_unique:
-            # Subconjunto del sample actual con YES
-            sub = df_yes[df_yes['sample'] == sample]
-            if sub.empty:
-                continue
-
-            # Mass (mg) y DF por muestra (primer no nulo)
-            mass_val = sub['mass_mg'].dropna().iloc[0] if sub['mass_mg'].dropna().size > 0 else None
-            df_val = sub['df'].dropna().iloc[0] if sub['df'].dropna().size > 0 else None
-
-            # Mapea componente -> analito base y QUÉDATE con la PRIMERA ocurrencia por analito
-            sub = sub.copy()
-            sub['analyte_base'] = sub['component'].astype(str).map(self._map_component_to_analyte)
-            dedup = sub.dropna(subset=['calc_conc']).drop_duplicates(subset=['analyte_base'], keep='first')
-
-            analyte_to_amount = {}
-            for _, row in dedup.iterrows():
-                analyte_name = str(row['analyte_base'])
-                val = row['calc_conc']
-                if pd.isna(val):
-                    continue
-                if analyte_name in self.analyte_amount_inputs:
-                    analyte_to_amount[analyte_name] = float(val)
-
-            if not analyte_to_amount:
-                continue
-
-            # ======= RELLENAR UI PARA ESTE SAMPLE =======
-            safe_sample = self._normalize_sample_id_text(sample)
-            self.sample_input.setText(safe_sample)
-            if batch_date is not None:
-                self.sample_date_input.setDate(batch_date)
-            else:
-                self.sample_date_input.setDate(QDate.currentDate())
-
-            # Mass (mg) tal cual
-            if mass_val is not None and not pd.isna(mass_val):
-                self.mass_mg_input.setText(f"{float(mass_val):g}")
-            else:
-                self.mass_mg_input.clear()
-
-            # Dilution Factor tal cual
-            if df_val is not None and not pd.isna(df_val):
-                self.dilution_input.setText(f"{float(df_val):g}")
-            else:
-                self.dilution_input.clear()
-
-            # Amounts por analito (desde col D)
-            self._fill_amounts_from_dict(analyte_to_amount)
-
-            # ======= EXPORTAR =======
-            out_path = self._make_output_filename(sample_number=safe_sample, out_dir=output_dir)
-            self.export_results_to_path(out_path)
-
-            # ======= GUARDAR EN BD (silencioso) =======
-            self.save_current_sample_silent()
-
-            processed += 1
-
-        self.load_samples_table()
-        return processed
+                summary = ps_batch.run_batch(
+                    xlsx_path, output_dir,
+                    db_conn=self.db_conn,
+                    limit_reports=limit_reports,
+                    client_name=self.client_name_input.text().strip(),
+                    workers=workers,
+                    metrics=metrics,
+                )
+            finally:
+                with metrics.stage("ui_refresh"):
+                    if summary is None or summary["db_error"]:
+                        self.load_samples_table()
+                    else:
+                        self.refresh_saved_samples(summary["db_keys"])
+        ps_batch.log_batch_run(metrics, summary, xlsx_path)
+        return summary
 
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
+    startup_report = "--startup-report" in sys.argv
+    app = QApplication([arg for arg in sys.argv if arg != "--startup-report"])
+    record_startup_phase("QApplication")
     ex = PSCalculatorApp()
+    if startup_report:
+        # Después de _finish_startup (también pendiente en la cola de eventos)
+        QTimer.singleShot(0, lambda: print(format_startup_report(), flush=True))
     sys.exit(app.exec_())
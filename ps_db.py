@@ -0,0 +1,453 @@
+"""
+Acceso a la base de datos SQLite de muestras guardadas.
+
+Las conexiones se abren en modo WAL (ver configure_connection): los lectores no
+bloquean al escritor ni al revés, así que la lista de 'Saved Samples' se puede
+consultar mientras un batch escribe y varias instancias pueden compartir el
+mismo archivo. SampleDB reparte conexiones de lectura y escritura por hilo.
+
+WAL y mmap dependen de memoria compartida entre procesos del mismo equipo: con
+el .db en una carpeta de red (SMB/NFS) usada desde varios equipos pueden
+corromper la base. En ese caso se usa journal_mode=DELETE sin mmap
+(SHARED_CONNECTION_PRAGMAS); ver connection_pragmas y DB_JOURNAL_ENV.
+"""
+import os
+import sys
+import json
+import sqlite3
+import threading
+
+import numpy as np
+
+from ps_quants_core import calculate_results_matrix
+
+DB_NAME = "saved_samples.db"
+
+BUSY_TIMEOUT_S = 10.0            # espera ante "database is locked" antes de fallar
+# Solo para un .db en disco local: WAL y mmap no son seguros en carpetas de red
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",     # con WAL no se corrompe; solo fsync en checkpoints
+    "PRAGMA cache_size=-16000",      # ~16 MB de caché de páginas
+    "PRAGMA mmap_size=67108864",     # 64 MB de I/O mapeada en memoria
+    "PRAGMA temp_store=MEMORY",
+)
+# .db compartido en red: journal clásico (bloqueos de archivo) y sin mmap
+SHARED_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=DELETE",
+    "PRAGMA synchronous=FULL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=0",
+    "PRAGMA temp_store=MEMORY",
+)
+# 'auto' (por defecto: WAL salvo en rutas de red), 'wal' o 'delete'
+DB_JOURNAL_ENV = "PSQUANTS_DB_JOURNAL"
+NETWORK_FS_TYPES = ("nfs", "nfs4", "cifs", "smb3", "smbfs", "afpfs", "9p", "fuse.sshfs", "davfs", "webdav")
+
+SAMPLE_COLUMNS = (
+    "sample_number", "original_sample_number", "client_name", "sample_date",
+    "dilution_factor", "mass_mg", "analyte_data", "fingerprint",
+)
+
+UPSERT_SAMPLE_SQL = """
+    INSERT OR REPLACE INTO samples
+    (sample_number, original_sample_number, client_name, sample_date, dilution_factor, mass_mg, analyte_data,
+     fingerprint)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Resultados por analito (una fila por sample x analito), derivados de analyte_data
+ANALYTE_COLUMNS = ("sample_number", "analyte", "amount", "final_result", "status")
+INSERT_ANALYTE_SQL = """
+    INSERT INTO sample_analytes (sample_number, analyte, amount, final_result, status)
+    VALUES (?, ?, ?, ?, ?)
+"""
+DELETE_ANALYTES_SQL = "DELETE FROM sample_analytes WHERE sample_number = ?"
+
+SCHEMA_VERSION = 2   # PRAGMA user_version (ver migrate_schema)
+
+
+def create_schema(conn):
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS samples (
+            sample_number TEXT PRIMARY KEY,      -- yyyymmdd_originalSampleNumber
+            original_sample_number TEXT,
+            client_name TEXT,
+            sample_date TEXT,                    -- YYYY-MM-DD
+            dilution_factor REAL,
+            mass_mg REAL,
+            analyte_data TEXT,
+            fingerprint TEXT                     -- huella del contenido (batch); NULL si se guardó a mano
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sample_analytes (
+            sample_number TEXT NOT NULL,         -- samples.sample_number
+            analyte TEXT NOT NULL,
+            amount REAL,
+            final_result TEXT,                   -- texto reportado (ND, 0.25, Invalid Mass, ...)
+            status TEXT,                         -- Pass / Fail / -
+            PRIMARY KEY (sample_number, analyte)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sample_analytes_analyte_status "
+                   "ON sample_analytes (analyte, status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_samples_sample_date ON samples (sample_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_samples_client_name ON samples (client_name)")
+    # Índices de la lista paginada (mismo orden que fetch_sample_page)
+    for column in SAMPLE_LIST_COLUMNS:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_samples_list_{column} "
+                       f"ON samples ({SAMPLE_SORT_EXPRESSIONS[column]}, sample_number)")
+    conn.commit()
+    migrate_schema(conn)
+
+
+def migrate_schema(conn):
+    """
+    Migraciones pendientes según PRAGMA user_version:
+    - 0 -> 1: rellena sample_analytes a partir del JSON de samples.analyte_data
+      (una sola vez, en una transacción).
+    - 1 -> 2: columna samples.fingerprint (BDs creadas antes de que existiera).
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+    try:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(samples)")}
+        if "fingerprint" not in columns:
+            conn.execute("ALTER TABLE samples ADD COLUMN fingerprint TEXT")
+        if version < 1:
+            rows = conn.execute(f"SELECT {', '.join(SAMPLE_COLUMNS)} FROM samples").fetchall()
+            conn.execute("DELETE FROM sample_analytes")
+            conn.executemany(INSERT_ANALYTE_SQL, analyte_rows(rows))
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def analyte_rows(sample_rows):
+    """
+    Filas de sample_analytes (orden de ANALYTE_COLUMNS) para filas de 'samples'
+    (orden de SAMPLE_COLUMNS). Final Result y Status se calculan igual que en la
+    app (calculate_results_matrix), agrupando las muestras con el mismo conjunto
+    de analitos en una sola matriz. Las muestras con JSON ilegible se omiten.
+    """
+    groups = {}
+    for row in sample_rows:
+        db_key, dilution_factor, mass_mg, analyte_data = row[0], row[4], row[5], row[6]
+        try:
+            amounts = json.loads(analyte_data)
+            amounts = {str(name): float(value) for name, value in amounts.items()}
+        except (TypeError, ValueError, AttributeError):
+            continue
+        if not amounts:
+            continue
+        group = groups.setdefault(tuple(amounts), [])
+        group.append((db_key, list(amounts.values()), _as_float(mass_mg), _as_float(dilution_factor)))
+
+    out = []
+    for analytes, samples in groups.items():
+        amounts = np.array([s[1] for s in samples], dtype=float)
+        matrix = calculate_results_matrix(
+            amounts, [s[2] for s in samples], [s[3] for s in samples], analytes=list(analytes))
+        final_result, status = matrix["final_result"], matrix["status"]
+        for i, (db_key, amount_row, _mass, _df) in enumerate(samples):
+            out.extend(zip([db_key] * len(analytes), analytes, amount_row,
+                           final_result[i].tolist(), status[i].tolist()))
+    return out
+
+
+def _as_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _mount_fs_type(path):
+    """Tipo de sistema de archivos (según /proc/mounts) que contiene 'path', o None."""
+    try:
+        with open("/proc/mounts", encoding="utf-8") as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) >= 3]
+    except OSError:
+        return None
+    best, fs_type = "", None
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        prefix = mount_point.rstrip("/") + "/"
+        if (path == mount_point or path.startswith(prefix)) and len(mount_point) > len(best):
+            best, fs_type = mount_point, mount_type
+    return fs_type
+
+
+def is_network_path(db_path):
+    """True si el .db está en una carpeta de red (ruta UNC, unidad de red o montaje NFS/SMB)."""
+    if db_path in ("", ":memory:") or str(db_path).startswith("file:"):
+        return False
+    path = os.path.abspath(db_path)
+    if path.startswith(("\\\\", "//")):
+        return True
+    if sys.platform == "win32":
+        import ctypes
+        drive = os.path.splitdrive(path)[0]
+        # GetDriveTypeW: 4 = DRIVE_REMOTE (unidad de red mapeada)
+        return bool(drive) and ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == 4
+    fs_type = _mount_fs_type(os.path.realpath(path))
+    return fs_type is not None and fs_type.lower() in NETWORK_FS_TYPES
+
+
+def connection_pragmas(db_path=DB_NAME):
+    """
+    CONNECTION_PRAGMAS (WAL + mmap) o SHARED_CONNECTION_PRAGMAS (journal DELETE,
+    sin mmap) según DB_JOURNAL_ENV: 'wal', 'delete' o 'auto' (por defecto;
+    DELETE si is_network_path).
+    """
+    mode = os.environ.get(DB_JOURNAL_ENV, "auto").strip().lower()
+    if mode == "wal":
+        return CONNECTION_PRAGMAS
+    if mode == "delete" or is_network_path(db_path):
+        return SHARED_CONNECTION_PRAGMAS
+    return CONNECTION_PRAGMAS
+
+
+def configure_connection(conn, read_only=False, pragmas=CONNECTION_PRAGMAS):
+    """Aplica 'pragmas' (ver connection_pragmas); con read_only=True la conexión rechaza escrituras."""
+    cursor = conn.cursor()
+    for pragma in pragmas:
+        cursor.execute(pragma)
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    return conn
+
+
+def connect(db_path=DB_NAME, read_only=False):
+    """
+    Abre la BD con los pragmas de connection_pragmas(db_path) y se asegura de que
+    exista la tabla 'samples' (salvo en conexiones de solo lectura).
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_S, check_same_thread=False)
+    pragmas = connection_pragmas(db_path)
+    if not read_only:
+        configure_connection(conn, pragmas=pragmas)
+        create_schema(conn)
+    else:
+        configure_connection(conn, read_only=True, pragmas=pragmas)
+    return conn
+
+
+class SampleDB:
+    """
+    Gestor de conexiones a la BD de muestras.
+
+    - writer(): conexión de escritura (crea el esquema la primera vez).
+    - reader(): conexión de solo lectura (PRAGMA query_only), para listar/cargar
+      muestras sin competir con el escritor.
+    Cada hilo obtiene sus propias conexiones (sqlite3 no comparte conexiones
+    entre hilos de forma segura); close() las cierra todas.
+    """
+
+    def __init__(self, db_path=DB_NAME):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def _get(self, attr, read_only):
+        conn = getattr(self._local, attr, None)
+        if conn is None:
+            if read_only:
+                # El esquema lo crea la conexión de escritura
+                self.writer()
+            conn = connect(self.db_path, read_only=read_only)
+            setattr(self._local, attr, conn)
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def writer(self):
+        return self._get("writer", read_only=False)
+
+    def reader(self):
+        return self._get("reader", read_only=True)
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+def make_db_key(sample_date_str, sample_number):
+    """yyyymmdd_sampleNumber a partir de la fecha ISO (YYYY-MM-DD)."""
+    return f"{sample_date_str.replace('-', '')}_{sample_number}"
+
+
+def upsert_sample(conn, row):
+    """INSERT OR REPLACE de una fila (tupla en el orden de SAMPLE_COLUMNS) y commit."""
+    upsert_samples(conn, [row])
+
+
+# Lista de 'Saved Samples': columnas visibles y expresión SQL con la que se ordena
+# cada una (IFNULL para que la paginación por clave no pierda filas con NULL).
+SAMPLE_LIST_COLUMNS = ("sample_date", "original_sample_number", "dilution_factor", "mass_mg")
+SAMPLE_SORT_EXPRESSIONS = {
+    "sample_number": "sample_number",
+    "sample_date": "IFNULL(sample_date, '')",
+    "original_sample_number": "IFNULL(original_sample_number, '')",
+    "dilution_factor": "IFNULL(dilution_factor, 0)",
+    "mass_mg": "IFNULL(mass_mg, 0)",
+}
+SAMPLE_FILTER_COLUMNS = ("sample_date", "client_name", "original_sample_number")
+
+
+def _sample_list_select(sort_column):
+    return (f"""SELECT sample_number, original_sample_number, sample_date, dilution_factor, mass_mg,
+                       {SAMPLE_SORT_EXPRESSIONS[sort_column]} AS sort_value
+                FROM samples""")
+
+
+def _sample_filter_sql(filter_text):
+    """Condición LIKE '%texto%' sobre fecha, cliente y número de muestra (o None)."""
+    filter_text = (filter_text or "").strip()
+    if not filter_text:
+        return None, []
+    pattern = "%" + filter_text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    sql = " OR ".join(f"{column} LIKE ? ESCAPE '\\'" for column in SAMPLE_FILTER_COLUMNS)
+    return f"({sql})", [pattern] * len(SAMPLE_FILTER_COLUMNS)
+
+
+def fetch_sample_page(conn, sort_column="sample_number", descending=True, after=None,
+                      filter_text="", limit=200):
+    """
+    Una página de la lista de muestras, ordenada y filtrada en SQLite.
+
+    Paginación por clave (keyset): 'after' es el (sort_value, sample_number) de la
+    última fila ya cargada; se devuelven las 'limit' filas siguientes.
+    Filas: (sample_number, original_sample_number, sample_date, dilution_factor,
+    mass_mg, sort_value).
+    """
+    sort_expr = SAMPLE_SORT_EXPRESSIONS[sort_column]
+    direction = "DESC" if descending else "ASC"
+    op = "<" if descending else ">"
+    filter_sql, filter_params = _sample_filter_sql(filter_text)
+
+    def page(conditions, params, limit):
+        if filter_sql:
+            conditions = conditions + [filter_sql]
+            params = params + filter_params
+        sql = _sample_list_select(sort_column)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {sort_expr} {direction}, sample_number {direction} LIMIT ?"
+        return conn.execute(sql, params + [limit]).fetchall()
+
+    if after is None:
+        return page([], [], limit)
+    # Dos consultas que buscan directamente en el índice (sort_expr, sample_number):
+    # primero el resto de filas empatadas con la última cargada y luego las
+    # siguientes por valor (columnas con muchos empates como Dilution no se
+    # recorren desde el principio).
+    sort_value, db_key = after
+    rows = page([f"{sort_expr} = ?", f"sample_number {op} ?"], [sort_value, db_key], limit)
+    if len(rows) < limit:
+        rows += page([f"{sort_expr} {op} ?"], [sort_value], limit - len(rows))
+    return rows
+
+
+def fetch_sample_summaries(conn, db_keys, sort_column="sample_number", filter_text="", chunk_size=500):
+    """
+    Filas de la lista (mismo formato que fetch_sample_page) de las muestras
+    indicadas que existan y pasen el filtro.
+    """
+    db_keys = list(db_keys)
+    filter_sql, filter_params = _sample_filter_sql(filter_text)
+    rows = []
+    for start in range(0, len(db_keys), chunk_size):
+        chunk = db_keys[start:start + chunk_size]
+        sql = f"{_sample_list_select(sort_column)} WHERE sample_number IN ({', '.join('?' * len(chunk))})"
+        if filter_sql:
+            sql += f" AND {filter_sql}"
+        rows.extend(conn.execute(sql, chunk + filter_params).fetchall())
+    return rows
+
+
+def fetch_fingerprints(conn, db_keys, chunk_size=500):
+    """{sample_number: fingerprint} de las muestras indicadas que existan en la BD."""
+    db_keys = list(db_keys)
+    fingerprints = {}
+    for start in range(0, len(db_keys), chunk_size):
+        chunk = db_keys[start:start + chunk_size]
+        fingerprints.update(conn.execute(
+            f"SELECT sample_number, fingerprint FROM samples WHERE sample_number IN ({', '.join('?' * len(chunk))})",
+            chunk).fetchall())
+    return fingerprints
+
+
+def delete_sample(conn, db_key):
+    """Borra una muestra y sus resultados por analito, y hace commit."""
+    try:
+        conn.execute("DELETE FROM samples WHERE sample_number = ?", (db_key,))
+        conn.execute(DELETE_ANALYTES_SQL, (db_key,))
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+
+def upsert_samples(conn, rows, commit_every=None):
+    """
+    INSERT OR REPLACE de muchas filas con executemany dentro de una sola
+    transacción (un solo commit/fsync), reemplazando también sus filas de
+    sample_analytes. Si falla, se hace rollback del lote y se relanza el error.
+
+    commit_every=N hace commit cada N filas: ante un error solo se pierde el
+    bloque en curso (los anteriores ya quedaron guardados).
+    Devuelve el número de filas guardadas.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    chunk_size = commit_every if commit_every and commit_every > 0 else len(rows)
+    saved = 0
+    cursor = conn.cursor()
+    try:
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            cursor.executemany(UPSERT_SAMPLE_SQL, chunk)
+            cursor.executemany(DELETE_ANALYTES_SQL, [(row[0],) for row in chunk])
+            cursor.executemany(INSERT_ANALYTE_SQL, analyte_rows(chunk))
+            conn.commit()
+            saved += len(chunk)
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return saved
+
+
+def query_analyte_results(conn, analyte=None, status=None, date_from=None, date_to=None, client_name=None):
+    """
+    Resultados por analito filtrados en SQLite (usa los índices de analito/estado,
+    fecha y cliente). Las fechas son ISO (YYYY-MM-DD), ambos extremos incluidos.
+    Devuelve filas (sample_number, original_sample_number, client_name, sample_date,
+    analyte, amount, final_result, status).
+    """
+    where, params = [], []
+    for column, value in (("a.analyte = ?", analyte), ("a.status = ?", status),
+                          ("s.sample_date >= ?", date_from), ("s.sample_date <= ?", date_to),
+                          ("s.client_name = ?", client_name)):
+        if value is not None:
+            where.append(column)
+            params.append(value)
+    sql = """
+        SELECT s.sample_number, s.original_sample_number, s.client_name, s.sample_date,
+               a.analyte, a.amount, a.final_result, a.status
+        FROM sample_analytes a JOIN samples s ON s.sample_number = a.sample_number
+    """
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY s.sample_date, s.sample_number"
+    return conn.execute(sql, params).fetchall()
@@ -0,0 +1,349 @@
+"""
+Lectura del archivo de "raw results" del instrumento.
+
+Formatos (detectados por extensión, ver raw_results_format):
+- Excel (.xlsx/.xlsm/.xls): hoja RAW_SHEET_NAME.
+- CSV (.csv) y TSV (.tsv/.tab/.txt): exportaciones de LIMS, primera fila = cabecera.
+- Parquet (.parquet/.pq): requiere pyarrow.
+En todos los casos se usan las columnas por posición A, B, D, E, F, G.
+"""
+import os
+import csv
+import json
+import math
+import time
+import hashlib
+import importlib.util
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from ps_quants_core import RAW_SHEET_NAME, normalize_sample_id_text, normalize_sample_id_column
+
+RAW_COLUMNS = ('sample', 'component', 'calc_conc', 'mass_mg', 'df', 'include')
+RAW_COLUMN_INDEXES = (0, 1, 3, 4, 5, 6)   # A, B, D, E, F, G
+INCLUDE_VALUES = ['YES', 'Y', 'TRUE', '1']
+
+RAW_FORMAT_EXTENSIONS = {
+    '.xlsx': 'excel', '.xlsm': 'excel', '.xls': 'excel',
+    '.csv': 'csv',
+    '.tsv': 'tsv', '.tab': 'tsv', '.txt': 'tsv',
+    '.parquet': 'parquet', '.pq': 'parquet',
+}
+CSV_DELIMITERS = {'csv': ',', 'tsv': '\t'}
+CSV_ENCODING = 'utf-8-sig'   # tolera el BOM de las exportaciones de Excel/LIMS
+
+# Caché en disco de raw results ya normalizados (ver read_raw_results_cached)
+RAW_CACHE_DIRNAME = ".ps_quants_cache"
+RAW_CACHE_MAX_BYTES = 256 * 1024 * 1024
+RAW_CACHE_VERSION = 2        # subirlo si cambia normalize_raw_results o el formato del índice
+RAW_CACHE_INDEX = "index.json"
+RAW_CACHE_STATS = {"hits": 0, "misses": 0}
+_RAW_CACHE_WARNED = set()    # avisos de la caché ya impresos (uno por motivo)
+
+
+def raw_results_format(path):
+    """'excel', 'csv', 'tsv' o 'parquet' según la extensión (por defecto 'excel')."""
+    _, ext = os.path.splitext(str(path))
+    return RAW_FORMAT_EXTENSIONS.get(ext.lower(), 'excel')
+
+
+def _read_raw_frame(path, fmt):
+    """Lee el archivo completo en un DataFrame sin normalizar (columnas por posición)."""
+    if fmt == 'parquet':
+        return pd.read_parquet(path)
+    # Solo la celda vacía es NaN: 'NA', 'null', ... quedan como texto, igual que en iter_raw_results_rows
+    na = dict(keep_default_na=False, na_values=[''])
+    if fmt in CSV_DELIMITERS:
+        read = lambda **kw: pd.read_csv(path, sep=CSV_DELIMITERS[fmt], encoding=CSV_ENCODING,
+                                        float_precision='round_trip', **na, **kw)
+    else:
+        read = lambda **kw: pd.read_excel(path, sheet_name=RAW_SHEET_NAME, engine='openpyxl', **na, **kw)
+    try:
+        return read()
+    except Exception:
+        return read(header=None)
+
+
+def _to_number(value):
+    """Equivalente escalar de pd.to_numeric(errors='coerce'): float o NaN."""
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            return math.nan
+    return math.nan
+
+
+def _to_numeric_column(series):
+    """
+    pd.to_numeric(errors='coerce') para columnas numéricas; las columnas de texto
+    (CSV/Parquet o celdas mixtas) se convierten valor a valor con float(), porque
+    el parser rápido de pandas no siempre devuelve el float más cercano al texto.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_numeric(series, errors='coerce')
+    return series.map(_to_number).astype(float)
+
+
+def normalize_raw_results(df):
+    """
+    Normaliza columnas clave de la tabla de raw results:
+    A: sample, B: component, D: calc_conc, E: mass_mg, F: df, G: include (YES/NO)
+    (OJO: 'RESULT' ya no existe; ahora G es el include)
+    """
+    if df is None or df.empty:
+        raise ValueError(f"No se pudo leer datos de la hoja '{RAW_SHEET_NAME}'.")
+
+    # Necesitamos al menos hasta la columna G => 7 columnas
+    if df.shape[1] < 7:
+        raise ValueError("La hoja no tiene al menos 7 columnas (A..G). Verifica el formato.")
+
+    norm = pd.DataFrame({
+        'sample': df.iloc[:, 0],   # A
+        'component': df.iloc[:, 1],# B
+        'calc_conc': df.iloc[:, 3],# D (Amount)
+        'mass_mg': df.iloc[:, 4],  # E
+        'df': df.iloc[:, 5],       # F
+        'include': df.iloc[:, 6],  # G (YES/NO)
+    })
+
+    # Celdas vacías de sample/component: fila descartada (no sample 'nan'), igual que iter_raw_results_rows
+    empty_cells = norm['sample'].isna() | norm['component'].isna()
+
+    # Normaliza
+    norm['sample'] = normalize_sample_id_column(norm['sample'])
+    norm['component'] = norm['component'].astype(str).str.strip()
+    norm['calc_conc'] = _to_numeric_column(norm['calc_conc'])
+    norm['mass_mg'] = _to_numeric_column(norm['mass_mg'])
+    norm['df'] = _to_numeric_column(norm['df'])
+    norm['include'] = norm['include'].astype(str).str.strip().str.upper().isin(INCLUDE_VALUES)
+
+    # Filtra filas con sample y component no vacíos
+    norm = norm[~empty_cells & (norm['sample'] != '') & (norm['component'] != '')]
+    return norm
+
+
+def read_raw_results(path):
+    """Lee y normaliza un archivo de raw results en cualquiera de los formatos soportados."""
+    return normalize_raw_results(_read_raw_frame(path, raw_results_format(path)))
+
+
+# =========================
+# Caché de raw results parseados
+# =========================
+def default_raw_cache_dir():
+    """./.ps_quants_cache (junto a saved_samples.db y 'Excel reports')."""
+    return os.path.join(os.getcwd(), RAW_CACHE_DIRNAME)
+
+
+def _file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_cache_index(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, RAW_CACHE_INDEX), encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get("version") == RAW_CACHE_VERSION:
+            return index
+    except (OSError, ValueError):
+        pass
+    return {"version": RAW_CACHE_VERSION, "paths": {}, "entries": {}}
+
+
+def _save_cache_index(cache_dir, index):
+    tmp_path = os.path.join(cache_dir, f"{RAW_CACHE_INDEX}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(cache_dir, RAW_CACHE_INDEX))
+
+
+def _evict_cache(cache_dir, index, max_bytes):
+    """Borra las entradas menos usadas recientemente hasta quedar bajo max_bytes."""
+    entries = index["entries"]
+    total = sum(entry["bytes"] for entry in entries.values())
+    for digest in sorted(entries, key=lambda d: entries[d]["last_used"]):
+        if total <= max_bytes:
+            break
+        total -= entries[digest]["bytes"]
+        entry = entries.pop(digest)
+        try:
+            os.remove(os.path.join(cache_dir, entry["file"]))
+        except OSError:
+            pass
+    index["paths"] = {p: v for p, v in index["paths"].items() if v["sha256"] in entries}
+
+
+def _warn_cache_once(reason, message):
+    if reason not in _RAW_CACHE_WARNED:
+        _RAW_CACHE_WARNED.add(reason)
+        print(f"[Cache] {message}")
+
+
+def _raw_cache_format():
+    """'parquet' si hay pyarrow; si no, 'pickle' (avisando una vez)."""
+    if importlib.util.find_spec("pyarrow") is not None:
+        return 'parquet'
+    _warn_cache_once("pyarrow", "pyarrow no está instalado: la caché de raw results usa pickle.")
+    return 'pickle'
+
+
+def read_raw_results_cached(path, cache_dir=None, max_bytes=RAW_CACHE_MAX_BYTES):
+    """
+    read_raw_results con caché en disco del DataFrame normalizado (Parquet con
+    pyarrow; si no está instalado, pickle de pandas).
+
+    - Clave: ruta + mtime + tamaño (sin releer el archivo) y, si cambiaron, el
+      hash SHA-256 del contenido: un archivo tocado pero idéntico se reutiliza y
+      uno modificado se vuelve a parsear.
+    - Tamaño acotado (max_bytes) con expulsión LRU.
+    - Si la carpeta de la caché no se puede usar se lee el archivo sin caché
+      (con un aviso la primera vez).
+    """
+    cache_format = _raw_cache_format()
+    entry_ext = ".parquet" if cache_format == 'parquet' else ".pkl"
+    cache_dir = cache_dir or default_raw_cache_dir()
+    abs_path = os.path.abspath(path)
+    stat = os.stat(abs_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        index = _load_cache_index(cache_dir)
+        known = index["paths"].get(abs_path)
+        if known and known["mtime_ns"] == stat.st_mtime_ns and known["size"] == stat.st_size:
+            digest = known["sha256"]
+        else:
+            digest = _file_sha256(abs_path)
+        entry = index["entries"].get(digest)
+        if entry is not None and not entry["file"].endswith(entry_ext):
+            entry = None     # guardada con el otro formato (se instaló / quitó pyarrow)
+        entry_name = f"{digest}{entry_ext}"
+        entry_path = os.path.join(cache_dir, entry_name)
+
+        df = None
+        if entry is not None and os.path.isfile(entry_path):
+            try:
+                df = pd.read_parquet(entry_path) if cache_format == 'parquet' else pd.read_pickle(entry_path)
+                RAW_CACHE_STATS["hits"] += 1
+            except Exception:
+                df = None
+        if df is None:
+            RAW_CACHE_STATS["misses"] += 1
+            df = read_raw_results(abs_path)
+            tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+            if cache_format == 'parquet':
+                df.to_parquet(tmp_path)
+            else:
+                df.to_pickle(tmp_path, compression=None)
+            os.replace(tmp_path, entry_path)
+            old = index["entries"].get(digest)
+            if old is not None and old["file"] != entry_name:
+                try:
+                    os.remove(os.path.join(cache_dir, old["file"]))
+                except OSError:
+                    pass
+            index["entries"][digest] = {"bytes": os.path.getsize(entry_path), "file": entry_name}
+
+        index["entries"][digest]["last_used"] = time.time()
+        index["paths"][abs_path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": digest}
+        _evict_cache(cache_dir, index, max_bytes)
+        _save_cache_index(cache_dir, index)
+        return df
+    except OSError as e:
+        _warn_cache_once("oserror", f"No se pudo usar la caché de raw results ({e}); se lee sin caché.")
+        return read_raw_results(abs_path)
+
+
+# =========================
+# Lectura streaming (fila a fila)
+# =========================
+def _iter_excel_table(path):
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        if RAW_SHEET_NAME not in workbook.sheetnames:
+            raise ValueError(f"No se pudo leer datos de la hoja '{RAW_SHEET_NAME}'.")
+        yield from workbook[RAW_SHEET_NAME].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _iter_csv_table(path, delimiter):
+    with open(path, newline='', encoding=CSV_ENCODING) as f:
+        for values in csv.reader(f, delimiter=delimiter):
+            # Celda vacía = sin valor (como NaN en pd.read_csv)
+            yield tuple(value if value != '' else None for value in values)
+
+
+def _iter_parquet_table(path):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Leer archivos Parquet requiere el paquete 'pyarrow'.")
+    parquet_file = pq.ParquetFile(path)
+    names = parquet_file.schema_arrow.names
+    yield tuple(names)
+    # Solo se leen las columnas A, B, D, E, F, G (por posición), por lotes
+    columns = [names[i] for i in RAW_COLUMN_INDEXES if i < len(names)]
+    for batch in parquet_file.iter_batches(columns=columns):
+        data = batch.to_pydict()
+        for row in zip(*(data[name] for name in columns)):
+            values = [None] * 7
+            for i, value in zip(RAW_COLUMN_INDEXES, row):
+                values[i] = value
+            yield tuple(values)
+
+
+def _iter_raw_table(path, fmt):
+    """Filas crudas (tuplas por posición de columna), empezando por la cabecera."""
+    if fmt == 'parquet':
+        return _iter_parquet_table(path)
+    if fmt in CSV_DELIMITERS:
+        return _iter_csv_table(path, CSV_DELIMITERS[fmt])
+    return _iter_excel_table(path)
+
+
+def iter_raw_results_rows(path, include_only=True):
+    """
+    Recorre el archivo de raw results fila a fila (Excel en modo read-only de
+    openpyxl, CSV/TSV con el módulo csv, Parquet por lotes), sin cargarlo entero
+    en memoria, y devuelve solo las columnas A, B, D, E, F, G como tuplas
+    (sample, component, calc_conc, mass_mg, df, include) ya normalizadas igual
+    que normalize_raw_results.
+
+    - La primera fila es la cabecera.
+    - Con include_only=True las filas cuyo include (G) no es YES se descartan
+      antes de normalizar el resto de columnas.
+    - Las celdas vacías de sample/component cuentan como vacías (fila descartada).
+    """
+    rows = _iter_raw_table(path, raw_results_format(path))
+    try:
+        header = next(rows, None)
+        if header is None:
+            raise ValueError(f"No se pudo leer datos de la hoja '{RAW_SHEET_NAME}'.")
+        # Necesitamos al menos hasta la columna G => 7 columnas
+        if len(header) < 7:
+            raise ValueError("La hoja no tiene al menos 7 columnas (A..G). Verifica el formato.")
+
+        include_values = set(INCLUDE_VALUES)
+        for values in rows:
+            if len(values) < 7:
+                values = tuple(values) + (None,) * (7 - len(values))
+            sample, component, calc_conc, mass_mg, df, include = (values[i] for i in RAW_COLUMN_INDEXES)
+            include = str(include).strip().upper() in include_values
+            if include_only and not include:
+                continue
+            sample = normalize_sample_id_text(sample)
+            component = "" if component is None else str(component).strip()
+            if sample == '' or component == '':
+                continue
+            yield (sample, component, _to_number(calc_conc), _to_number(mass_mg), _to_number(df), include)
+    finally:
+        rows.close()
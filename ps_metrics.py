@@ -0,0 +1,229 @@
+"""
+Métricas de una corrida de batch (ps_batch.run_batch).
+
+BatchMetrics acumula, por etapa (lectura, mapeo, cálculo, reportes, BD…), el
+tiempo de reloj y de CPU; la latencia de cada reporte (histograma y
+percentiles); y contadores (filas leídas, samples, reportes, filas de BD,
+aciertos / fallos de la caché de componentes) de los que salen filas/s y
+reportes/s. Opcionalmente captura un perfil cProfile y la
+memoria con tracemalloc.
+
+El resumen (BatchMetrics.summary) se agrega como una línea JSON al registro de
+corridas METRICS_LOG_NAME, que queda junto a la carpeta de salida (en
+./Excel reports/ para la carpeta del día, ver metrics_log_path).
+"""
+import os
+import io
+import json
+import time
+import bisect
+import pstats
+import cProfile
+import datetime
+import tracemalloc
+from contextlib import contextmanager
+
+METRICS_LOG_NAME = "psquants_batch_runs.jsonl"
+METRICS_VERSION = 1
+# Límites superiores (ms) de los buckets del histograma de latencia; el último es "+inf"
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+PROFILE_TOP = 25        # funciones del perfil (por tiempo acumulado) incluidas en el resumen
+TRACEMALLOC_TOP = 10    # líneas con más memoria asignada incluidas en el resumen
+
+
+def metrics_log_path(output_dir):
+    """Registro de corridas junto a la carpeta de salida (en su carpeta padre)."""
+    parent = os.path.dirname(os.path.abspath(output_dir)) or os.getcwd()
+    return os.path.join(parent, METRICS_LOG_NAME)
+
+
+def append_run_log(path, record):
+    """Agrega el resumen de una corrida como una línea JSON."""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+def _percentile(sorted_values, q):
+    """Percentil q (0-100) con interpolación lineal; None si no hay valores."""
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def latency_histogram(values_s):
+    """{"buckets_ms": [...], "counts": [...], "p50_ms", "p90_ms", "p99_ms", "max_ms", "mean_ms"}."""
+    counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    values_ms = sorted(v * 1000.0 for v in values_s)
+    for v in values_ms:
+        counts[bisect.bisect_left(LATENCY_BUCKETS_MS, v)] += 1
+    return {
+        "count": len(values_ms),
+        "buckets_ms": list(LATENCY_BUCKETS_MS) + ["+inf"],
+        "counts": counts,
+        "mean_ms": sum(values_ms) / len(values_ms) if values_ms else None,
+        "p50_ms": _percentile(values_ms, 50),
+        "p90_ms": _percentile(values_ms, 90),
+        "p99_ms": _percentile(values_ms, 99),
+        "max_ms": values_ms[-1] if values_ms else None,
+    }
+
+
+class BatchMetrics:
+    """
+    Uso:
+        metrics = BatchMetrics(profile=False, trace_memory=False)
+        with metrics.run():
+            with metrics.stage("read"):
+                ...
+            metrics.count("rows_read", n)
+            metrics.observe("report", segundos)
+        record = metrics.summary()
+
+    - stage(name): se puede usar varias veces con el mismo nombre (se acumula).
+    - profile=True: cProfile del hilo que llama a run() (los procesos del pool de
+      reportes no quedan incluidos); con profile_path se guarda además el .prof.
+    - trace_memory=True: pico de memoria y líneas con más memoria asignada (tracemalloc).
+    """
+
+    def __init__(self, profile=False, trace_memory=False, profile_path=None):
+        self.profile = profile
+        self.trace_memory = trace_memory
+        self.profile_path = profile_path
+        self.stages = {}
+        self.counters = {}
+        self.latencies = {}
+        self.wall_s = None
+        self.cpu_s = None
+        self.started_at = None
+        self._profile_stats = None
+        self._memory = None
+
+    @contextmanager
+    def stage(self, name):
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            entry = self.stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0})
+            entry["wall_s"] += time.perf_counter() - wall0
+            entry["cpu_s"] += time.process_time() - cpu0
+            entry["calls"] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        self.latencies.setdefault(name, []).append(seconds)
+
+    @contextmanager
+    def run(self):
+        """Mide la corrida completa (y activa cProfile / tracemalloc si se pidieron)."""
+        self.started_at = datetime.datetime.now().isoformat(timespec="seconds")
+        profiler = None
+        if self.profile:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError as e:
+                # Ya hay otro profiler activo en el proceso
+                print(f"[Metrics] No se pudo activar cProfile: {e}")
+                profiler = None
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        try:
+            yield self
+        finally:
+            self.wall_s = time.perf_counter() - wall0
+            self.cpu_s = time.process_time() - cpu0
+            if profiler is not None:
+                profiler.disable()
+                self._collect_profile(profiler)
+            if self.trace_memory and tracemalloc.is_tracing():
+                self._collect_memory()
+                if started_tracing:
+                    tracemalloc.stop()
+
+    def _collect_profile(self, profiler):
+        if self.profile_path:
+            try:
+                profiler.dump_stats(self.profile_path)
+            except OSError as e:
+                print(f"[Metrics] No se pudo guardar el perfil: {e}")
+                self.profile_path = None
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        rows = []
+        for (filename, line, func), (_cc, ncalls, tottime, cumtime, _callers) in stats.stats.items():
+            rows.append({"function": f"{os.path.basename(filename)}:{line}({func})",
+                         "calls": ncalls, "tottime_s": tottime, "cumtime_s": cumtime})
+        rows.sort(key=lambda r: r["cumtime_s"], reverse=True)
+        self._profile_stats = rows[:PROFILE_TOP]
+
+    def _collect_memory(self):
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics("lineno")[:TRACEMALLOC_TOP]
+        self._memory = {
+            "current_bytes": current,
+            "peak_bytes": peak,
+            "top": [{"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                     "size_bytes": stat.size, "count": stat.count} for stat in top],
+        }
+
+    def rates(self):
+        """Filas/s (lectura), reportes/s (escritura) y samples/s (corrida completa)."""
+        def per_second(counter, seconds):
+            n = self.counters.get(counter)
+            return n / seconds if n and seconds else None
+
+        read_s = sum(self.stages.get(name, {}).get("wall_s", 0.0) for name in ("read", "map"))
+        # Con lectura fila a fila solo se cuentan las filas include=YES
+        rows_counter = "rows_read" if "rows_read" in self.counters else "rows_included"
+        return {
+            "rows_per_s": per_second(rows_counter, read_s),
+            "reports_per_s": per_second("reports_written", self.stages.get("write_reports", {}).get("wall_s")),
+            "samples_per_s": per_second("samples", self.wall_s),
+        }
+
+    def summary(self):
+        """Resumen serializable a JSON (una línea del registro de corridas)."""
+        record = {
+            "metrics_version": METRICS_VERSION,
+            "started_at": self.started_at,
+            "wall_s": self.wall_s,
+            "cpu_s": self.cpu_s,
+            "stages": self.stages,
+            "counters": self.counters,
+            "rates": self.rates(),
+            "latency": {name: latency_histogram(values) for name, values in self.latencies.items()},
+        }
+        if self.profile:
+            record["profile"] = {"path": self.profile_path, "top": self._profile_stats}
+        if self.trace_memory:
+            record["memory"] = self._memory
+        return record
+
+
+def format_metrics(record):
+    """Texto corto con las etapas y ritmos de un resumen (para la consola)."""
+    lines = [f"Tiempo total: {record['wall_s']:.2f} s (CPU {record['cpu_s']:.2f} s)"]
+    for name, stage in record["stages"].items():
+        lines.append(f"  {name:<16} {stage['wall_s'] * 1000:10.1f} ms  (CPU {stage['cpu_s'] * 1000:.1f} ms)")
+    rates = record["rates"]
+    parts = [f"{label} {rates[key]:.1f}" for key, label in
+             (("rows_per_s", "filas/s"), ("reports_per_s", "reportes/s"), ("samples_per_s", "samples/s"))
+             if rates[key] is not None]
+    if parts:
+        lines.append("  " + " · ".join(parts))
+    counters = record["counters"]
+    if "component_cache_misses" in counters:
+        lines.append(f"  caché de componentes: {counters['component_cache_hits']} aciertos"
+                     f" · {counters['component_cache_misses']} fallos")
+    report_latency = record["latency"].get("report")
+    if report_latency and report_latency["count"]:
+        lines.append(f"  reporte: p50 {report_latency['p50_ms']:.1f} ms · p90 {report_latency['p90_ms']:.1f} ms"
+                     f" · max {report_latency['max_ms']:.1f} ms")
+    return "\n".join(lines)
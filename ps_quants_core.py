@@ -0,0 +1,411 @@
+"""
+Lógica de cálculo de PS Quants sin dependencias de Qt.
+
+La usan tanto la GUI (ps_calculator_app.py) como el motor batch headless
+(ps_batch.py), de modo que ambos producen exactamente los mismos resultados.
+pandas se importa dentro de las funciones que lo usan, para que la GUI no lo
+cargue al arrancar.
+"""
+import os
+import numpy as np
+import datetime
+import re
+import functools
+
+from ps_sigfigs import format_sigfigs_no_sci, format_sigfigs_array, round_sigfigs_array
+
+# =========================
+# CONFIGURACIÓN
+# =========================
+# Por defecto: procesa TODOS los samples con YES (puedes pasar un número para limitar)
+DEFAULT_BATCH_LIMIT = None
+RAW_SHEET_NAME = "raw results"        # hoja de entrada del Excel
+
+LOQ = 0.1  # Limit of Quantitation
+
+STATE_LIMITS = {
+    "Abamectin": 0.5, "Acephate": 0.4, "Acequinocyl": 2.0, "Acetamiprid": 0.2, "Aldicarb": 0.4,
+    "Azoxystrobin": 0.2, "Bifenazate": 0.2, "Bifenthrin": 0.2, "Boscalid": 0.4, "Carbaryl": 0.2,
+    "Carbofuran": 0.2, "Chlorantraniliprole": 0.2, "Chlorfenapyr": 1.0, "Chlorpyrifos": 0.2,
+    "Clofentezine": 0.2, "Cyfluthrin": 1.0, "Cypermethrin": 1.0, "Daminozide": 1.0, "Diazinon": 0.2,
+    "Dichlorvos": 1.0, "Dimethoate": 0.2, "Ethoprophos": 0.2, "Etofenprox": 0.4, "Etoxazole": 0.2,
+    "Fenoxycarb": 0.2, "Fenpyroximate": 0.4, "Fipronil": 0.4, "Flonicamid": 1.0, "Fludioxonil": 0.4,
+    "Hexythiazox": 1.0, "Imazalil": 0.2, "Imidacloprid": 0.4, "Kresoxim-methyl": 0.4, "Malathion A": 0.2,
+    "Metalaxyl": 0.2, "Methiocarb": 0.2, "Methomyl": 0.4, "Methyl parathion": 0.2, "MGK 264": 0.2,
+    "Myclobutanil": 0.2, "Naled": 0.5, "Oxamyl": 1.0, "Paclobutrazol": 0.4, "Permethrins*": 0.2,
+    "Phosmet": 0.2, "Piperonyl butoxide": 2.0, "Prallethrin": 0.2, "Propiconazole": 0.4, "Propoxure": 0.2,
+    "Pyrethrins*": 1.0, "Pyridaben": 0.2, "Spinosad*": 0.2, "Spiromesifen": 0.2, "Spirotetramat": 0.2,
+    "Spiroxamine": 0.4, "Tebuconazole": 0.4, "Thiacloprid": 0.2, "Thiamethoxam": 0.2, "Trifloxystrobin": 0.2
+}
+ANALYTES = list(STATE_LIMITS.keys())
+ANALYTE_ALIAS_MAP = {
+    "Permethrins": "Permethrins*",
+    "Pyrethrins": "Pyrethrins*",
+    "Spinosad": "Spinosad*",
+}
+ANALYTE_NAME_SET = set(ANALYTES)
+
+# Valores de 'Final Result' que no son numéricos (Status = "-")
+NON_NUMERIC_RESULTS = ("-", "Invalid Mass", "Invalid Amt", "Error")
+
+
+# =========================
+# Formato & cálculo
+# =========================
+# El formato de cifras significativas está en ps_sigfigs (escalar y vectorizado)
+
+# calculate_final_result / status_for_result: cálculo escalar (una celda). La app y
+# el batch usan calculate_results_matrix; estas dos quedan solo como referencia de
+# los tests de paridad (tests/test_quants_core.py).
+def calculate_final_result(analyte_amount, mass_mg, dilution_factor):
+    """
+    Final result = (Amount / Mass_mg) * DF
+    - ND si Amount == 0 o si el resultado < LOQ.
+    - 'Invalid Amt' si el Amount no es finito (inf / nan).
+    - 'Invalid Mass' si la masa no es > 0.
+    - Formato: 3 cifras significativas sin notación científica.
+    """
+    if analyte_amount == 0.0:
+        return "ND"
+    if not np.isfinite(analyte_amount):
+        return "Invalid Amt"
+    if not mass_mg > 0:
+        return "Invalid Mass"
+    result_numeric = (analyte_amount / mass_mg) * dilution_factor
+    if result_numeric < LOQ:
+        return "ND"
+    return format_sigfigs_no_sci(result_numeric, sig=3)
+
+
+def status_for_result(final_result_str, analyte_name):
+    """Pass/Fail contra STATE_LIMITS a partir del 'Final Result' ya formateado."""
+    if final_result_str == "ND":
+        return "Pass"
+    if final_result_str in NON_NUMERIC_RESULTS:
+        return "-"
+    state_limit = STATE_LIMITS.get(analyte_name, float('inf'))
+    try:
+        return "Fail" if float(final_result_str) > state_limit else "Pass"
+    except ValueError:
+        return "Error"
+
+
+def calculate_results_matrix(amounts, mass_mg, dilution_factor, analytes=ANALYTES):
+    """
+    Versión vectorizada de calculate_final_result/status_for_result para una
+    matriz samples x analitos.
+
+    - amounts: array 2D (n_samples, len(analytes)).
+    - mass_mg, dilution_factor: escalares o arrays 1D de largo n_samples.
+
+    Devuelve un dict de arrays (n_samples, len(analytes)):
+        'result'         -> valor numérico (Amount / Mass_mg) * DF (NaN si el Amount o la masa es inválido)
+        'nd'             -> True donde el Final Result es ND
+        'invalid_amount' -> True donde el Final Result es 'Invalid Amt' (Amount inf / nan)
+        'invalid_mass'   -> True donde el Final Result es 'Invalid Mass'
+        'final_result'   -> texto del Final Result (3 cifras significativas)
+        'status'         -> 'Pass' / 'Fail' / '-'
+
+    El Status se decide con el valor ya redondeado a 3 cifras (el que se reporta),
+    igual que status_for_result, pero sin volver a parsear el texto.
+    """
+    amounts = np.atleast_2d(np.asarray(amounts, dtype=float))
+    n_samples = amounts.shape[0]
+    mass_mg = np.broadcast_to(np.asarray(mass_mg, dtype=float).reshape(-1, 1), (n_samples, 1))
+    dilution_factor = np.broadcast_to(np.asarray(dilution_factor, dtype=float).reshape(-1, 1), (n_samples, 1))
+    limits = np.array([STATE_LIMITS.get(a, float('inf')) for a in analytes], dtype=float)
+
+    zero_amount = amounts == 0.0
+    invalid_amount = ~zero_amount & ~np.isfinite(amounts)
+    invalid_mass = ~zero_amount & ~invalid_amount & ~(mass_mg > 0)
+    invalid = invalid_amount | invalid_mass
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.where(invalid, np.nan, (amounts / mass_mg) * dilution_factor)
+    nd = zero_amount | (~invalid & (result < LOQ))
+    reported = ~nd & ~invalid
+
+    final_result = np.full(amounts.shape, "ND", dtype=object)
+    final_result[invalid_amount] = "Invalid Amt"
+    final_result[invalid_mass] = "Invalid Mass"
+    status = np.full(amounts.shape, "Pass", dtype=object)
+    status[invalid] = "-"
+
+    if reported.any():
+        values = result[reported]
+        final_result[reported] = format_sigfigs_array(values, sig=3)
+        rounded = round_sigfigs_array(values, sig=3)
+        rounded[~np.isfinite(rounded)] = 0.0
+        row_limits = np.broadcast_to(limits, amounts.shape)[reported]
+        status[reported] = np.where(rounded > row_limits, "Fail", "Pass")
+
+    return {
+        "result": result,
+        "nd": nd,
+        "invalid_amount": invalid_amount,
+        "invalid_mass": invalid_mass,
+        "final_result": final_result,
+        "status": status,
+    }
+
+
+# =========================
+# Normalización de datos de entrada
+# =========================
+# Enteros que pd.to_numeric devuelve como int64 exacto: basta int(), sin pd.to_numeric por celda
+_PLAIN_INT_RE = re.compile(r"[+-]?[0-9]{1,18}")
+
+
+def normalize_sample_id_text(x):
+    """
+    Normaliza el Sample Number:
+    - Si viene como 14936.0 (float/string), devuelve '14936'
+    - Si trae espacios, los recorta
+    """
+    if x is None:
+        return ""
+    s = str(x).strip()
+    # quita .0 al final si es float-like
+    if s.endswith(".0"):
+        try:
+            f = float(s)
+            if f.is_integer():
+                return str(int(f))
+        except:
+            pass
+    if _PLAIN_INT_RE.fullmatch(s):
+        return str(int(s))
+    # intenta castear a num y detectar entero
+    import pandas as pd
+    try:
+        v = pd.to_numeric(s, errors='coerce')
+        if pd.notna(v) and float(v).is_integer():
+            return str(int(v))
+    except:
+        pass
+    return s
+
+
+_EXACT_INT_LIMIT = 2.0 ** 53   # por encima, float64 ya no representa todos los enteros
+
+
+def normalize_sample_id_column(values):
+    """
+    Versión por columna de normalize_sample_id_text (mismo resultado celda a
+    celda) con operaciones vectorizadas de pandas/NumPy:
+    - None => ''
+    - texto recortado; si es numérico y entero ('14936.0', 14936.0, ' 14936 ')
+      => '14936'
+    Los pocos casos que float64 no resuelve igual que el escalar (enteros
+    > 2**53, textos largos, textos '.0' que solo entiende float()) se delegan a
+    la función escalar.
+    Devuelve una Serie de str con el mismo índice.
+    """
+    import pandas as pd
+    series = pd.Series(values)
+    if (pd.api.types.is_integer_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
+            and not series.isna().any()):
+        return series.astype(str)
+    if series.dtype == np.float64:
+        # Columna numérica (Excel): enteros exactos => '14936'; el resto como str(x)
+        numbers = series.to_numpy(dtype=float, na_value=np.nan)
+        with np.errstate(invalid='ignore'):
+            exact = np.isfinite(numbers) & (np.abs(numbers) < _EXACT_INT_LIMIT)
+            integral = exact & (np.floor(numbers) == numbers)
+        out = np.empty(len(series), dtype=object)
+        out[integral] = numbers[integral].astype(np.int64).astype(str)
+        for i in np.flatnonzero(~integral):
+            out[i] = normalize_sample_id_text(numbers[i]) if np.isfinite(numbers[i]) else str(numbers[i])
+        return pd.Series(list(out), index=series.index)
+
+    if series.dtype != object:
+        # Otros dtypes (float32, nullables, ...): los mismos valores que ve el escalar
+        series = pd.Series(series.tolist(), index=series.index, dtype=object)
+    is_none = np.fromiter((v is None for v in series.array), dtype=bool, count=len(series))
+    text = series.astype(str)
+    missing = text.isna().to_numpy(dtype=bool)
+    if missing.any():
+        # NaN/NA: el escalar usa str(x) ('nan', '<NA>', ...)
+        text = text.astype(object)
+        text[missing] = [str(v) for v in series[missing]]
+    text = text.str.strip()
+    numbers = pd.to_numeric(text, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+    with np.errstate(invalid='ignore'):
+        exact = np.isfinite(numbers) & (np.abs(numbers) < _EXACT_INT_LIMIT)
+        integral = exact & (np.floor(numbers) == numbers)
+    out = text.to_numpy(dtype=object, copy=True)
+    if integral.any():
+        out[integral] = numbers[integral].astype(np.int64).astype(str).astype(object)
+
+    # Casos que resuelve distinto el escalar: enteros enormes, textos largos (el
+    # parser rápido de pandas puede desviarse en el último dígito) y textos '.0'
+    # que pd.to_numeric no reconoce (float() sí)
+    ends_zero = text.str.endswith('.0').to_numpy(dtype=bool)
+    long_text = (text.str.len() > 15).to_numpy(dtype=bool)
+    with np.errstate(invalid='ignore'):
+        fallback = ~is_none & (
+            (~exact & ~np.isnan(numbers)) | (ends_zero & np.isnan(numbers)) | (long_text & ~np.isnan(numbers)))
+    for i in np.flatnonzero(fallback):
+        out[i] = normalize_sample_id_text(series.iat[i])
+    out[is_none] = ""
+    return pd.Series(list(out), index=series.index)
+
+
+# Solo comas en grupos de 3 cifras (1,234 / 1,234,567): separador de miles, no decimal
+_THOUSANDS_COMMA_RE = re.compile(r"[+-]?[1-9][0-9]{0,2}(,[0-9]{3})+")
+
+
+def normalize_amount_text(cell: str) -> str:
+    """
+    Normaliza una celda de Amount pegada desde el portapapeles:
+    - vacía => '0'
+    - coma decimal (1,5 / 1.234,5 / 1,234.5) => punto decimal sin separador de miles
+    - solo comas cada 3 cifras (1,234 / 1,234,567) => separador de miles (1234 / 1234567)
+    - lo que no sea numérico se devuelve tal cual (la UI lo mostrará como 'Invalid Amt').
+    """
+    cell = cell.strip().replace("\u00a0", "").replace(" ", "")
+    if cell == "":
+        return "0"
+    if "," in cell:
+        if "." in cell:
+            # El separador que aparece último es el decimal
+            if cell.rfind(",") > cell.rfind("."):
+                candidate = cell.replace(".", "").replace(",", ".")
+            else:
+                candidate = cell.replace(",", "")
+        elif _THOUSANDS_COMMA_RE.fullmatch(cell):
+            candidate = cell.replace(",", "")
+        else:
+            candidate = cell.replace(",", ".")
+        try:
+            float(candidate)
+            return candidate
+        except ValueError:
+            return cell
+    return cell
+
+
+def _is_number_text(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def parse_pasted_amounts(text: str):
+    """
+    Convierte un bloque pegado (Excel / software del instrumento) en la lista de
+    textos de Amount, uno por fila. Acepta CRLF/CR/LF y varias columnas
+    separadas por tabulador: se usa la primera columna con algún valor numérico
+    (p. ej. 'Analito<TAB>Amount' => la segunda), o la primera si no hay ninguna.
+    """
+    lines = text.splitlines()
+    if not lines:
+        return []
+    rows = [line.split("\t") for line in lines]
+    n_columns = max(len(cells) for cells in rows)
+    columns = [[cells[c] if c < len(cells) else "" for cells in rows] for c in range(n_columns)]
+    amount_column = next(
+        (column for column in columns
+         if any(cell.strip() and _is_number_text(normalize_amount_text(cell)) for cell in column)),
+        columns[0])
+    return [normalize_amount_text(cell) for cell in amount_column]
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_ROMAN_NUMERAL_RE = re.compile(r"[IVXLCDM]+")
+COMPONENT_CACHE_SIZE = 4096   # nombres de componente distintos que se memorizan
+
+
+def _is_suffix_token(token: str) -> bool:
+    """True si el token es un sufijo numérico/romano ('2', '(1)', 'II', ...)."""
+    clean = token.strip()
+    if not clean:
+        return False
+    clean = clean.strip("()[]{}.,;:-")
+    if not clean:
+        return False
+    if clean.isdigit():
+        return True
+    return _ROMAN_NUMERAL_RE.fullmatch(clean.upper()) is not None
+
+
+@functools.lru_cache(maxsize=COMPONENT_CACHE_SIZE)
+def _map_component_cached(component_name: str) -> str:
+    name = component_name.strip()
+    if not name:
+        return ""
+
+    name = _WHITESPACE_RE.sub(" ", name)
+    tokens = name.split(" ")
+
+    while tokens:
+        candidate = " ".join(tokens)
+        mapped = ANALYTE_ALIAS_MAP.get(candidate, candidate)
+        if mapped in ANALYTE_NAME_SET:
+            return mapped
+        if not _is_suffix_token(tokens[-1]):
+            break
+        tokens.pop()
+
+    base_candidate = " ".join(tokens).strip()
+    mapped = ANALYTE_ALIAS_MAP.get(base_candidate, base_candidate)
+    if mapped in ANALYTE_NAME_SET:
+        return mapped
+    return mapped or component_name.strip()
+
+
+def map_component_to_analyte(component_name: str) -> str:
+    """
+    Normaliza etiquetas de componentes para coincidir con ANALYTES.
+    Memorizado (LRU): un archivo repite unos pocos cientos de nombres en miles de filas.
+    """
+    return _map_component_cached(component_name)
+
+
+def map_components_to_analytes(components):
+    """
+    map_component_to_analyte sobre una Serie (o iterable) de nombres: se mapea
+    cada valor distinto una sola vez y se reexpande a todas las filas.
+    Devuelve una Serie con el mismo índice.
+    """
+    import pandas as pd
+    components = pd.Series(components).astype(str)
+    codes, uniques = pd.factorize(components, use_na_sentinel=False)
+    mapped = np.array([_map_component_cached(name) for name in uniques], dtype=object)
+    return pd.Series(mapped[codes], index=components.index, dtype=object)
+
+
+def component_mapping_cache_info():
+    """Estadísticas del memo de componentes (hits, misses, maxsize, currsize)."""
+    return _map_component_cached.cache_info()
+
+
+# =========================
+# Rutas y nombres de archivo
+# =========================
+def extract_batch_date_from_path(file_path):
+    """Devuelve la fecha YYYYMMDD embebida en el nombre del archivo o None."""
+    base_name = os.path.basename(file_path)
+    name_part, _ = os.path.splitext(base_name)
+    match = re.search(r'([0-9]{8})', name_part)
+    if match:
+        return match.group(1)
+    return None
+
+
+def make_output_filename(sample_number, out_dir):
+    date_str = datetime.date.today().strftime("%Y%m%d")
+    safe_sample = "".join(c for c in str(sample_number) if c.isalnum() or c in ('_', '-')).rstrip() or "NoSampleNum"
+    return os.path.join(out_dir, f"{date_str}_{safe_sample}_PSQuants.xlsx")
+
+
+def get_default_output_dir_today(base_dir=None):
+    """Devuelve ./Excel reports/<YYYYMMDD>, creándolo si no existe."""
+    if base_dir is None:
+        base_dir = os.path.join(os.getcwd(), "Excel reports")
+    today_folder = datetime.date.today().strftime("%Y%m%d")
+    out_dir = os.path.join(base_dir, today_folder)
+    os.makedirs(out_dir, exist_ok=True)
+    return out_dir
@@ -0,0 +1,290 @@
+"""
+Generación de los reportes PSQuants (.xlsx) por muestra.
+"""
+import io
+import re
+import math
+import datetime
+import functools
+import zipfile
+from xml.sax.saxutils import escape as xml_escape
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell.cell import ERROR_CODES, ILLEGAL_CHARACTERS_RE
+from openpyxl.utils import get_column_letter
+
+from ps_quants_core import (
+    ANALYTES, LOQ, STATE_LIMITS, NON_NUMERIC_RESULTS, calculate_results_matrix,
+)
+
+EXPORT_COLUMNS = ["Analyte Name", "Analyte Amount", "LOQ", "State Limit", "Final Result", "Status"]
+
+
+def make_export_rows(amount_row, final_result_row, status_row):
+    """
+    Filas del reporte (una por analito de ANALYTES) a partir de una fila de
+    calculate_results_matrix(). Devuelve (export_data, has_calculable_data).
+    """
+    export_data = []
+    has_calculable_data = False
+    for analyte_name, analyte_amount, final_result_text, status_text in zip(
+            ANALYTES, amount_row, final_result_row, status_row):
+        export_data.append({
+            "Analyte Name": analyte_name,
+            "Analyte Amount": float(analyte_amount),
+            "LOQ": str(LOQ),
+            "State Limit": str(STATE_LIMITS.get(analyte_name, 0.0)),
+            "Final Result": final_result_text,
+            "Status": status_text
+        })
+        if final_result_text not in NON_NUMERIC_RESULTS:
+            has_calculable_data = True
+    return export_data, has_calculable_data
+
+
+def build_export_rows(analyte_amounts, mass_mg, dilution_factor):
+    """Igual que make_export_rows() para una sola muestra ({analito: Amount})."""
+    amount_row = [float(analyte_amounts.get(a, 0.0)) for a in ANALYTES]
+    calc = calculate_results_matrix([amount_row], mass_mg, dilution_factor)
+    return make_export_rows(amount_row, calc["final_result"][0], calc["status"][0])
+
+
+def make_sample_info(sample_number, client_name, sample_date_str, dilution_factor, mass_mg):
+    """Bloque de cabecera del reporte (Parameter -> Value)."""
+    return {
+        "Sample Number:": sample_number,
+        "Client Name:": client_name,
+        "Sample Date:": sample_date_str,
+        "Dilution Factor:": dilution_factor,    # sin forzar decimal
+        "Mass (g):": mass_mg / 1000.0
+    }
+
+
+def write_export_excel(file_path, df_results, sample_info):
+    with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
+        df_info_keys = pd.DataFrame(list(sample_info.keys()), columns=["Parameter"])
+        df_info_vals = pd.DataFrame(list(sample_info.values()), columns=["Value"])
+        df_info_keys.to_excel(writer, sheet_name='Sheet1', index=False, header=False, startrow=0, startcol=0)
+        df_info_vals.to_excel(writer, sheet_name='Sheet1', index=False, header=False, startrow=0, startcol=1)
+
+        start_row_results = len(sample_info) + 1
+        df_results.to_excel(writer, sheet_name='Sheet1', index=False, startrow=start_row_results)
+
+        worksheet = writer.sheets['Sheet1']
+        for col_idx, column in enumerate(worksheet.columns):
+            max_length = 0
+            column_letter = get_column_letter(col_idx + 1)
+            for cell in column:
+                try:
+                    if cell.value:
+                        cell_length = len(str(cell.value))
+                        if cell_length > max_length:
+                            max_length = cell_length
+                except:
+                    pass
+            adjusted_width = max_length + 2
+            worksheet.column_dimensions[column_letter].width = adjusted_width
+
+
+def report_column_widths(rows):
+    """Ancho de cada columna = texto más largo (ignorando celdas vacías/0) + 2, como en write_export_excel."""
+    widths = [0] * max(len(row) for row in rows)
+    for row in rows:
+        for col_idx, value in enumerate(row):
+            if value:
+                widths[col_idx] = max(widths[col_idx], len(str(value)))
+    return [width + 2 for width in widths]
+
+
+def write_export_excel_streaming(file_path, export_data, sample_info):
+    """
+    Mismo layout que write_export_excel (cabecera Parameter/Value, fila vacía y
+    tabla de resultados) pero con un Workbook de openpyxl en modo write-only:
+    sin DataFrames intermedios y con los anchos de columna calculados antes de
+    escribir, en lugar de recorrer la hoja otra vez.
+    """
+    rows = [[key, value] for key, value in sample_info.items()]
+    rows.append([])
+    rows.append(list(EXPORT_COLUMNS))
+    rows.extend([row[col] for col in EXPORT_COLUMNS] for row in export_data)
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Sheet1')
+    for col_idx, width in enumerate(report_column_widths(rows)):
+        worksheet.column_dimensions[get_column_letter(col_idx + 1)].width = width
+    for row in rows:
+        worksheet.append(row)
+    workbook.save(file_path)
+
+
+# =========================
+# Writer por plantilla
+# =========================
+# Las columnas Analyte Name / LOQ / State Limit (y la cabecera) son iguales en
+# todos los reportes: se pre-renderizan una vez como XML y por cada muestra solo
+# se rellenan Amount / Final Result / Status y el bloque Sample Number..Mass (g).
+_NUM_INFO_ROWS = 5
+_RESULTS_HEADER_ROW = _NUM_INFO_ROWS + 2
+_SHEET_PATH = "xl/worksheets/sheet1.xml"
+_CORE_PATH = "docProps/core.xml"
+
+
+def _xml_string_cell(ref, text):
+    if text == "":
+        return f'<c r="{ref}" t="inlineStr" />'
+    space = ' xml:space="preserve"' if text.strip() and text != text.strip() else ""
+    return f'<c r="{ref}" t="inlineStr"><is><t{space}>{xml_escape(text)}</t></is></c>'
+
+
+def _xml_number_cell(ref, value):
+    return f'<c r="{ref}" t="n"><v>{"%.16g" % value}</v></c>'
+
+
+def _xml_cell(ref, value):
+    if isinstance(value, str):
+        return _xml_string_cell(ref, value)
+    return _xml_number_cell(ref, value)
+
+
+def _template_can_render(value):
+    """
+    True si la celda se escribe igual que con openpyxl. Lo raro (fórmulas '=...',
+    códigos de error, caracteres ilegales, no finitos) se deja al writer streaming.
+    """
+    if isinstance(value, str):
+        if len(value) > 1 and value.startswith("="):
+            return False
+        return value not in ERROR_CODES and len(value) <= 32767 and not ILLEGAL_CHARACTERS_RE.search(value)
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+@functools.lru_cache(maxsize=1)
+def _report_template():
+    """
+    Esqueleto del reporte, calculado una sola vez a partir de ANALYTES /
+    STATE_LIMITS / LOQ: partes estáticas del .xlsx, XML estático de cada fila y
+    anchos mínimos de columna que aportan las celdas estáticas.
+    """
+    dummy_info = make_sample_info("0", "", "", 0.0, 0.0)
+    dummy_rows, _ = build_export_rows({}, 0.0, 0.0)
+    buffer = io.BytesIO()
+    write_export_excel_streaming(buffer, dummy_rows, dummy_info)
+
+    with zipfile.ZipFile(buffer) as archive:
+        parts = [(info.filename, archive.read(info.filename)) for info in archive.infolist()]
+    sheet_xml = dict(parts)[_SHEET_PATH].decode("utf-8")
+    sheet_prefix = sheet_xml[:sheet_xml.index("<cols>")]
+    sheet_suffix = sheet_xml[sheet_xml.index("</sheetData>"):]
+
+    info_rows = [
+        (f'<row r="{row}">' + _xml_string_cell(f"A{row}", key), "</row>")
+        for row, key in enumerate(dummy_info.keys(), start=1)
+    ]
+    analyte_rows = []
+    for row, analyte_name in enumerate(ANALYTES, start=_RESULTS_HEADER_ROW + 1):
+        analyte_rows.append((
+            f'<row r="{row}">' + _xml_string_cell(f"A{row}", analyte_name),
+            _xml_string_cell(f"C{row}", str(LOQ)) + _xml_string_cell(f"D{row}", str(STATE_LIMITS.get(analyte_name, 0.0))),
+            "</row>",
+        ))
+    static_rows = (
+        f'<row r="{_NUM_INFO_ROWS + 1}"></row>'
+        f'<row r="{_RESULTS_HEADER_ROW}">'
+        + "".join(_xml_string_cell(f"{get_column_letter(col)}{_RESULTS_HEADER_ROW}", name)
+                  for col, name in enumerate(EXPORT_COLUMNS, start=1))
+        + "</row>"
+    )
+    static_widths = report_column_widths(
+        [[key] for key in dummy_info.keys()]
+        + [list(EXPORT_COLUMNS)]
+        + [[name, None, str(LOQ), str(STATE_LIMITS.get(name, 0.0))] for name in ANALYTES]
+    )
+    return {
+        "parts": parts,
+        "sheet_prefix": sheet_prefix,
+        "sheet_suffix": sheet_suffix,
+        "info_rows": info_rows,
+        "static_rows": static_rows,
+        "analyte_rows": analyte_rows,
+        "static_widths": static_widths,
+    }
+
+
+def write_export_excel_template(file_path, export_data, sample_info):
+    """
+    Mismo contenido que write_export_excel_streaming, pero clonando el esqueleto
+    cacheado por _report_template() y parcheando solo las celdas variables.
+    """
+    info_values = list(sample_info.values())
+    variable_values = info_values + [row[col] for row in export_data
+                                     for col in ("Analyte Amount", "Final Result", "Status")]
+    if (len(info_values) != _NUM_INFO_ROWS
+            or [row["Analyte Name"] for row in export_data] != ANALYTES
+            or not all(_template_can_render(value) for value in variable_values)):
+        write_export_excel_streaming(file_path, export_data, sample_info)
+        return
+
+    template = _report_template()
+
+    # Anchos: mínimos estáticos + valores de esta muestra (columnas B, E, F)
+    widths = list(template["static_widths"])
+    variable_widths = report_column_widths(
+        [[None, value] for value in info_values]
+        + [[None, row["Analyte Amount"], None, None, row["Final Result"], row["Status"]] for row in export_data]
+    )
+    widths = [max(static, variable) for static, variable in zip(widths, variable_widths)]
+
+    parts = [template["sheet_prefix"], "<cols>"]
+    for col_idx, width in enumerate(widths, start=1):
+        parts.append(f'<col width="{"%.16g" % width}" customWidth="1" min="{col_idx}" max="{col_idx}" />')
+    parts.append("</cols><sheetData>")
+    for row, ((row_start, row_end), value) in enumerate(zip(template["info_rows"], info_values), start=1):
+        parts.append(row_start + _xml_cell(f"B{row}", value) + row_end)
+    parts.append(template["static_rows"])
+    for row, ((row_start, row_static, row_end), data) in enumerate(
+            zip(template["analyte_rows"], export_data), start=_RESULTS_HEADER_ROW + 1):
+        parts.append(
+            row_start
+            + _xml_number_cell(f"B{row}", data["Analyte Amount"])
+            + row_static
+            + _xml_string_cell(f"E{row}", data["Final Result"])
+            + _xml_string_cell(f"F{row}", data["Status"])
+            + row_end
+        )
+    parts.append(template["sheet_suffix"])
+    sheet_xml = "".join(parts).encode("utf-8")
+
+    now = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    with zipfile.ZipFile(file_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in template["parts"]:
+            if name == _SHEET_PATH:
+                data = sheet_xml
+            elif name == _CORE_PATH:
+                data = re.sub(rb"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z", now.encode("ascii"), data)
+            archive.writestr(name, data)
+
+
+# Writers disponibles para write_sample_report (flag 'writer')
+REPORT_WRITERS = ("pandas", "streaming", "template")
+
+
+def write_sample_report(file_path, export_data, sample_info, writer="pandas"):
+    """
+    Escribe el reporte de una muestra a partir de las filas de build_export_rows().
+    writer: 'pandas' (ExcelWriter + DataFrame.to_excel), 'streaming' (openpyxl
+    write-only) o 'template' (esqueleto pre-renderizado, ver _report_template).
+    """
+    if not export_data:
+        raise ValueError("No data to export.")
+    if writer == "streaming":
+        write_export_excel_streaming(file_path, export_data, sample_info)
+        return
+    if writer == "template":
+        write_export_excel_template(file_path, export_data, sample_info)
+        return
+    if writer != "pandas":
+        raise ValueError(f"Writer de reportes desconocido: {writer}")
+    df_results = pd.DataFrame(export_data)
+    df_results = df_results[EXPORT_COLUMNS]
+    write_export_excel(file_path, df_results, sample_info)
@@ -0,0 +1,182 @@
+"""
+Modelo Qt de la lista 'Saved Samples'.
+
+SavedSamplesModel no carga toda la tabla 'samples': trae páginas de la BD bajo
+demanda (canFetchMore/fetchMore, paginación por clave en ps_db.fetch_sample_page)
+y delega el orden y el filtro a SQLite, de modo que la lista abre al instante
+aunque la BD tenga cientos de miles de muestras.
+"""
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+import ps_db
+
+SAMPLE_LIST_HEADERS = ("Date", "Sample Number", "Dilution", "Mass (mg)")
+DEFAULT_PAGE_SIZE = 200
+
+
+class SavedSamplesModel(QAbstractTableModel):
+    """
+    Filas: (db_key, original_sample_number, sample_date, dilution_factor, mass_mg,
+    sort_value), en el orden de ps_db.fetch_sample_page. La clave BD de cada fila
+    se expone con Qt.UserRole en la columna 0.
+    """
+
+    def __init__(self, conn=None, page_size=DEFAULT_PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self.conn = conn
+        self.page_size = page_size
+        self.sort_column = "sample_date"
+        self.descending = True
+        self.filter_text = ""
+        self._rows = []
+        self._after = None        # (sort_value, sample_number) de la última fila traída
+        self._exhausted = True
+
+    # ---------- Carga ----------
+    def set_connection(self, conn):
+        self.conn = conn
+        self.reload()
+
+    def reload(self):
+        """Descarta lo cargado y trae la primera página con el orden/filtro actuales."""
+        self.beginResetModel()
+        self._rows = []
+        self._after = None
+        self._exhausted = self.conn is None
+        self.endResetModel()
+        if self.canFetchMore():
+            self.fetchMore()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted:
+            return
+        rows = ps_db.fetch_sample_page(self.conn, self.sort_column, self.descending, self._after,
+                                       self.filter_text, self.page_size)
+        if len(rows) < self.page_size:
+            self._exhausted = True
+        if not rows:
+            return
+        self._after = (rows[-1][5], rows[-1][0])
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = ps_db.SAMPLE_LIST_COLUMNS[column]
+        self.descending = order == Qt.DescendingOrder
+        self.reload()
+
+    def set_filter(self, text):
+        self.filter_text = text.strip()
+        self.reload()
+
+    # ---------- Actualización incremental ----------
+    def _sort_key(self, row):
+        return (row[5], row[0])
+
+    def _sorts_before(self, a, b):
+        return a > b if self.descending else a < b
+
+    def row_for_key(self, db_key):
+        for row, values in enumerate(self._rows):
+            if values[0] == db_key:
+                return row
+        return -1
+
+    def key_at(self, row):
+        if 0 <= row < len(self._rows):
+            return self._rows[row][0]
+        return None
+
+    def refresh_keys(self, db_keys):
+        """
+        Aplica inserciones, cambios y bajas de las claves indicadas sin recargar:
+        las filas nuevas se insertan en su posición si caen dentro de lo ya
+        cargado (si no, llegarán con fetchMore). Muchas claves => reload().
+        """
+        db_keys = list(dict.fromkeys(db_keys))
+        if self.conn is None or not db_keys:
+            return
+        if len(db_keys) > self.page_size:
+            self.reload()
+            return
+        current = {row[0]: row for row in ps_db.fetch_sample_summaries(
+            self.conn, db_keys, self.sort_column, self.filter_text)}
+        try:
+            for db_key in db_keys:
+                values = current.get(db_key)
+                row = self.row_for_key(db_key)
+                if row >= 0 and values is not None and self._sort_key(values) == self._sort_key(self._rows[row]):
+                    # Misma posición: se actualiza en el sitio (conserva la selección)
+                    self._rows[row] = values
+                    self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+                    continue
+                self.remove_key(db_key)
+                if values is not None:
+                    self._insert_sorted(values)
+        except TypeError:
+            # Valores de orden de tipos no comparables en Python: se recarga
+            self.reload()
+
+    def remove_key(self, db_key):
+        row = self.row_for_key(db_key)
+        if row >= 0:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._rows[row]
+            self.endRemoveRows()
+
+    def _insert_sorted(self, values):
+        key = self._sort_key(values)
+        position = len(self._rows)
+        for row, other in enumerate(self._rows):
+            if self._sorts_before(key, self._sort_key(other)):
+                position = row
+                break
+        if (position == len(self._rows) and not self._exhausted
+                and (self._after is None or not self._sorts_before(key, self._after))):
+            # Va después de lo cargado: llegará con fetchMore al hacer scroll
+            return
+        self.beginInsertRows(QModelIndex(), position, position)
+        self._rows.insert(position, values)
+        self.endInsertRows()
+
+    # ---------- Interfaz de QAbstractTableModel ----------
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(SAMPLE_LIST_HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return SAMPLE_LIST_HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        db_key, original_num, sample_date, dilution, mass_mg, _sort_value = self._rows[index.row()]
+        if role == Qt.UserRole:
+            return db_key
+        if role != Qt.DisplayRole:
+            return None
+        column = index.column()
+        if column == 0:
+            return sample_date or '(NoDate)'
+        if column == 1:
+            return original_num or '(NoNum)'
+        if column == 2:
+            try:
+                return f"{float(dilution):g}"
+            except Exception:
+                return str(dilution)
+        return str(mass_mg)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled
@@ -0,0 +1,151 @@
+"""
+Formato de resultados con cifras significativas, sin notación científica.
+
+format_sigfigs_no_sci formatea un valor; format_sigfigs_array / round_sigfigs_array
+hacen lo mismo para un array completo (p.ej. todos los Final Result de un batch)
+con numpy, dando exactamente el mismo texto y el mismo valor redondeado que la
+versión escalar:
+
+- El valor se escala a un entero q (las 'sig' cifras) y el texto sale de una tabla
+  precalculada por número de decimales (_mantissa_texts), en lugar de log10 /
+  round / f-string por celda.
+- Los casos en que numpy podría no coincidir con math.log10 / round (valores a un
+  paso de una potencia de 10, casi empates en .5, enteros sobre 2**53, magnitudes
+  fuera de 1e±22) se resuelven con la versión escalar.
+"""
+import math
+import functools
+
+import numpy as np
+
+# 10**k es exacto en double hasta k = 22: escalar por él es una sola operación redondeada
+_POW10 = np.array([float(10 ** k) for k in range(23)])
+_MAX_SCALE_DIGITS = len(_POW10) - 1
+# Margen (en unidades del último dígito) para considerar un valor "casi empate" o
+# "casi potencia de 10"; el error de escalar es ~1e-12 para sig <= _MAX_TABLE_SIG
+_TIE_TOLERANCE = 1e-9
+_MAX_TABLE_SIG = 4   # tabla de 10**sig + 1 textos por número de decimales; con más cifras, escalar
+_MAX_EXACT_INT = float(2 ** 53)
+
+
+def round_sigfigs(x: float, sig: int = 3):
+    """Devuelve (valor redondeado a 'sig' cifras significativas, decimales usados)."""
+    power = math.floor(math.log10(abs(x)))
+    decimals = sig - 1 - power
+    # Redondeo a 'decimals' (si decimals < 0 redondea a decenas, centenas, etc.)
+    return round(x, decimals), decimals
+
+
+def format_sigfigs_no_sci(x: float, sig: int = 3) -> str:
+    """
+    Formatea 'x' con 'sig' cifras significativas SIN notación científica.
+    - Redondea correctamente (usa round con decimales calculados por orden de magnitud).
+    - No agrega ceros extra al final (quita ceros/punto sobrantes).
+    """
+    if x == 0 or not math.isfinite(x):
+        return "0"
+    rounded, decimals = round_sigfigs(x, sig)
+    if decimals > 0:
+        s = f"{rounded:.{decimals}f}"
+        s = s.rstrip("0").rstrip(".")  # no agregar ceros innecesarios
+        return s if s else "0"
+    else:
+        # Sin decimales
+        return f"{rounded:.0f}"
+
+
+@functools.lru_cache(maxsize=None)
+def _mantissa_texts(sig, decimals):
+    """
+    Textos de q * 10**-decimals para q = 0..10**sig (el índice es q), igual que
+    los arma format_sigfigs_no_sci: (positivos, negativos).
+    """
+    texts = []
+    for q in range(10 ** sig + 1):
+        if decimals > 0:
+            digits = str(q).zfill(decimals + 1)
+            s = (digits[:-decimals] + "." + digits[-decimals:]).rstrip("0").rstrip(".")
+        else:
+            s = str(q) + "0" * -decimals
+        texts.append(s or "0")
+    positive = np.array(texts, dtype=object)
+    negative = np.array(["-" + s for s in texts], dtype=object)
+    return positive, negative
+
+
+def _sigfig_parts(values, sig):
+    """
+    Para cada valor: q (entero con las 'sig' cifras, como float), decimales y si
+    va por el camino rápido (nunca con sig > _MAX_TABLE_SIG). Devuelve
+    (x, nonzero, decimals, q, fast).
+    """
+    x = np.asarray(values, dtype=float)
+    nonzero = np.isfinite(x) & (x != 0)
+    ax = np.abs(np.where(nonzero, x, 1.0))
+    lg = np.log10(ax)
+    power = np.floor(lg)
+    # A un paso de una potencia de 10, np.log10 y math.log10 pueden diferir en el último bit
+    near_power = nonzero & (np.abs(lg - np.rint(lg)) < _TIE_TOLERANCE)
+    if near_power.any():
+        power[near_power] = [math.floor(math.log10(v)) for v in ax[near_power].tolist()]
+    decimals = (sig - 1 - power).astype(np.int64)
+
+    in_range = np.abs(decimals) <= _MAX_SCALE_DIGITS
+    scale = _POW10[np.where(in_range, np.abs(decimals), 0)]
+    scaled = np.where(decimals >= 0, ax * scale, ax / scale)
+    q = np.rint(scaled)
+    # round() decide los empates sobre el valor exacto: los casi .5 van por la versión escalar
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < _TIE_TOLERANCE
+    # Sobre 2**53 el texto de f"{:.0f}" son los dígitos binarios del double, no q seguido de ceros
+    exact_int = (decimals >= 0) | (q * scale <= _MAX_EXACT_INT)
+    fast = nonzero & in_range & ~near_tie & exact_int & (q <= 10 ** sig)
+    if sig > _MAX_TABLE_SIG:
+        fast[...] = False
+    return x, nonzero, decimals, q, fast
+
+
+def format_sigfigs_array(values, sig: int = 3):
+    """
+    format_sigfigs_no_sci aplicado a cada elemento de 'values' (array o lista de
+    floats, cualquier forma). Devuelve un array de textos (dtype object) con la
+    misma forma.
+    """
+    if sig > _MAX_TABLE_SIG:
+        x = np.asarray(values, dtype=float)
+        out = np.empty(x.shape, dtype=object)
+        out.flat[:] = [format_sigfigs_no_sci(v, sig=sig) for v in x.ravel().tolist()]
+        return out
+
+    x, nonzero, decimals, q, fast = _sigfig_parts(values, sig)
+    out = np.full(x.shape, "0", dtype=object)
+    if fast.any():
+        q_fast = q[fast].astype(np.int64)
+        decimals_fast = decimals[fast]
+        negative = x[fast] < 0
+        texts = np.empty(q_fast.shape, dtype=object)
+        for d in np.unique(decimals_fast).tolist():
+            positive_texts, negative_texts = _mantissa_texts(sig, d)
+            sel = decimals_fast == d
+            texts[sel] = np.where(negative[sel], negative_texts[q_fast[sel]], positive_texts[q_fast[sel]])
+        out[fast] = texts
+    for idx in np.flatnonzero(nonzero & ~fast).tolist():
+        out.flat[idx] = format_sigfigs_no_sci(float(x.flat[idx]), sig=sig)
+    return out
+
+
+def round_sigfigs_array(values, sig: int = 3):
+    """
+    round_sigfigs(x, sig)[0] para cada elemento (mismo double que devuelve round).
+    Los ceros y los no finitos se devuelven sin cambios.
+    """
+    x, nonzero, decimals, q, fast = _sigfig_parts(values, sig)
+    rounded = x.copy()
+    if fast.any():
+        decimals_fast = decimals[fast]
+        scale = _POW10[np.abs(decimals_fast)]
+        # q y 10**|d| son exactos: una sola operación da el double más cercano, como round()
+        magnitude = np.where(decimals_fast >= 0, q[fast] / scale, q[fast] * scale)
+        rounded[fast] = np.copysign(magnitude, x[fast])
+    for idx in np.flatnonzero(nonzero & ~fast).tolist():
+        rounded.flat[idx] = round_sigfigs(float(x.flat[idx]), sig)[0]
+    return rounded
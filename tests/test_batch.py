@@ -0,0 +1,89 @@
+"""
+run_batch(incremental=True): solo se rehacen los reportes y filas de BD que cambiaron.
+Contadores de la caché de componentes en BatchMetrics.
+"""
+import os
+
+import ps_batch
+import ps_db
+import ps_metrics
+import ps_quants_core
+
+N_SAMPLES = 4
+HEADER = "Sample,Component,RT,Calc Conc,Mass (mg),DF,Include\n"
+
+
+def _write_raw(path, amounts):
+    lines = [HEADER]
+    for i, amount in enumerate(amounts):
+        lines.append(f"{15000 + i},Abamectin,1.0,{amount},250,1,YES\n")
+        lines.append(f"{15000 + i},Acephate,1.1,0.5,250,1,YES\n")
+    path.write_text("".join(lines), encoding="utf-8")
+
+
+def _fingerprints(conn):
+    return dict(conn.execute("SELECT sample_number, fingerprint FROM samples"))
+
+
+def test_incremental_rerun_rewrites_only_changed_samples(tmp_path):
+    raw = tmp_path / "20250919_raw.csv"
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    amounts = [10.0 * (i + 1) for i in range(N_SAMPLES)]
+    _write_raw(raw, amounts)
+    conn = ps_db.connect(str(tmp_path / "samples.db"))
+
+    def run(**kwargs):
+        return ps_batch.run_batch(str(raw), str(out_dir), db_conn=conn, workers=1, use_cache=False, **kwargs)
+
+    try:
+        first = run()
+        assert (first["processed"], first["db_saved"], first["skipped"]) == (N_SAMPLES, N_SAMPLES, [])
+        reports = sorted(name for name in os.listdir(out_dir) if name.endswith(".xlsx"))
+        assert len(reports) == N_SAMPLES
+        before = _fingerprints(conn)
+
+        second = run()
+        assert (second["processed"], second["db_saved"]) == (0, 0)
+        assert len(second["skipped"]) == N_SAMPLES
+
+        # Un Amount distinto: un reporte y una fila de BD
+        amounts[2] = 99.0
+        _write_raw(raw, amounts)
+        third = run()
+        assert (third["processed"], third["db_saved"]) == (1, 1)
+        assert third["db_keys"] == ["20250919_15002"]
+        assert len(third["skipped"]) == N_SAMPLES - 1
+        after = _fingerprints(conn)
+        assert [key for key in after if after[key] != before[key]] == ["20250919_15002"]
+
+        # Otro writer: se reescriben los reportes, pero no las filas de BD
+        fourth = run(report_writer="streaming")
+        assert (fourth["processed"], fourth["db_saved"]) == (N_SAMPLES, 0)
+        assert run(report_writer="streaming")["processed"] == 0
+    finally:
+        conn.close()
+
+
+def test_metrics_count_component_cache_per_run(tmp_path):
+    raw = tmp_path / "20250919_raw.csv"
+    out_dir = tmp_path / "out"
+    out_dir.mkdir()
+    _write_raw(raw, [10.0 * (i + 1) for i in range(N_SAMPLES)])
+
+    def run(**kwargs):
+        metrics = ps_metrics.BatchMetrics()
+        with metrics.run():
+            ps_batch.run_batch(str(raw), str(out_dir), workers=1, use_cache=False, incremental=False,
+                               metrics=metrics, **kwargs)
+        return metrics.summary()
+
+    ps_quants_core._map_component_cached.cache_clear()
+    # DataFrame: se mapean los componentes distintos (Abamectin, Acephate)
+    first = run()["counters"]
+    assert (first["component_cache_hits"], first["component_cache_misses"]) == (0, 2)
+    # Fila a fila: cada fila es un acierto; los contadores son de la corrida, no acumulados
+    record = run(stream=True)
+    counters = record["counters"]
+    assert (counters["component_cache_hits"], counters["component_cache_misses"]) == (2 * N_SAMPLES, 0)
+    assert "caché de componentes: 8 aciertos · 0 fallos" in ps_metrics.format_metrics(record)
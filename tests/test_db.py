@@ -0,0 +1,169 @@
+"""
+upsert_samples: una transacción por lote (o por bloque con commit_every).
+Pragmas de conexión: WAL + mmap en disco local, journal DELETE sin mmap en red.
+Migración de BDs anteriores a sample_analytes y consultas por analito.
+"""
+import sqlite3
+
+import pytest
+
+import ps_db
+
+
+# Esquema de las BDs creadas antes de sample_analytes (user_version = 0)
+V0_SCHEMA = """
+    CREATE TABLE samples (
+        sample_number TEXT PRIMARY KEY,
+        original_sample_number TEXT,
+        client_name TEXT,
+        sample_date TEXT,
+        dilution_factor REAL,
+        mass_mg REAL,
+        analyte_data TEXT
+    )
+"""
+V0_ROWS = [
+    ("20250919_14936", "14936", "Cliente A", "2025-09-19", 1.0, 250.0, '{"Abamectin": 150.0, "Acephate": 0.0}'),
+    ("20250920_14937", "14937", "Cliente B", "2025-09-20", 2.0, 100.0, '{"Abamectin": 10.0, "Naled": 30.0}'),
+    ("20250921_14938", "14938", "Cliente A", "2025-09-21", 1.0, 0.0, '{"Abamectin": 1.0}'),
+    ("20250922_14939", "14939", "Cliente A", "2025-09-22", 1.0, 250.0, "no es json"),
+]
+
+
+def _row(i, analyte_data='{"Abamectin": 1.0}', fingerprint=None):
+    return (f"20250919_{i}", str(i), "", "2025-09-19", 1.0, 250.0, analyte_data, fingerprint)
+
+
+def _saved_keys(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return sorted(row[0] for row in conn.execute("SELECT sample_number FROM samples"))
+    finally:
+        conn.close()
+
+
+def test_upsert_samples_rolls_back_whole_batch(tmp_path):
+    db_path = str(tmp_path / "samples.db")
+    conn = ps_db.connect(db_path)
+    try:
+        ps_db.upsert_sample(conn, _row(0))
+        with pytest.raises(sqlite3.Error):
+            # Un valor que sqlite3 no sabe guardar hace fallar la última fila
+            ps_db.upsert_samples(conn, [_row(1), _row(2), _row(3, analyte_data={"no": "json"})])
+        assert _saved_keys(db_path) == ["20250919_0"]
+        # El siguiente commit no arrastra filas del lote fallido
+        assert ps_db.upsert_samples(conn, [_row(4)]) == 1
+        assert _saved_keys(db_path) == ["20250919_0", "20250919_4"]
+    finally:
+        conn.close()
+
+
+def test_upsert_samples_commit_every_keeps_committed_chunks(tmp_path):
+    db_path = str(tmp_path / "samples.db")
+    conn = ps_db.connect(db_path)
+    try:
+        rows = [_row(i) for i in range(5)] + [_row(5, analyte_data={"no": "json"})]
+        with pytest.raises(sqlite3.Error):
+            ps_db.upsert_samples(conn, rows, commit_every=2)
+        # Bloques [0, 1] y [2, 3] guardados; del bloque [4, 5] no queda nada
+        assert _saved_keys(db_path) == [f"20250919_{i}" for i in range(4)]
+        assert not conn.in_transaction
+    finally:
+        conn.close()
+
+
+def _journal_and_mmap(conn):
+    return conn.execute("PRAGMA journal_mode").fetchone()[0], conn.execute("PRAGMA mmap_size").fetchone()[0]
+
+
+def test_local_db_uses_wal(tmp_path, monkeypatch):
+    monkeypatch.delenv(ps_db.DB_JOURNAL_ENV, raising=False)
+    monkeypatch.setattr(ps_db, "is_network_path", lambda db_path: False)
+    conn = ps_db.connect(str(tmp_path / "local.db"))
+    try:
+        assert _journal_and_mmap(conn) == ("wal", 67108864)
+    finally:
+        conn.close()
+
+
+def test_network_db_uses_delete_journal_without_mmap(tmp_path, monkeypatch):
+    monkeypatch.delenv(ps_db.DB_JOURNAL_ENV, raising=False)
+    monkeypatch.setattr(ps_db, "is_network_path", lambda db_path: True)
+    db_path = str(tmp_path / "shared.db")
+    writer, reader = ps_db.connect(db_path), ps_db.connect(db_path, read_only=True)
+    try:
+        assert _journal_and_mmap(writer) == ("delete", 0)
+        assert _journal_and_mmap(reader) == ("delete", 0)
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_journal_env_overrides_detection(monkeypatch):
+    monkeypatch.setattr(ps_db, "is_network_path", lambda db_path: True)
+    monkeypatch.setenv(ps_db.DB_JOURNAL_ENV, "wal")
+    assert ps_db.connection_pragmas("x.db") == ps_db.CONNECTION_PRAGMAS
+    monkeypatch.setattr(ps_db, "is_network_path", lambda db_path: False)
+    monkeypatch.setenv(ps_db.DB_JOURNAL_ENV, "delete")
+    assert ps_db.connection_pragmas("x.db") == ps_db.SHARED_CONNECTION_PRAGMAS
+
+
+def test_unc_paths_are_network():
+    assert ps_db.is_network_path("//server/share/saved_samples.db")
+    assert not ps_db.is_network_path(":memory:")
+
+
+def _make_v0_db(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute(V0_SCHEMA)
+    conn.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?, ?)", V0_ROWS)
+    conn.commit()
+    conn.close()
+
+
+def test_migration_backfills_sample_analytes(tmp_path):
+    db_path = str(tmp_path / "v0.db")
+    _make_v0_db(db_path)
+    conn = ps_db.connect(db_path)
+    try:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == ps_db.SCHEMA_VERSION == 2
+        # 1 -> 2: columna fingerprint, vacía en las muestras migradas
+        assert conn.execute("SELECT COUNT(*) FROM samples WHERE fingerprint IS NULL").fetchone()[0] == len(V0_ROWS)
+        rows = conn.execute("SELECT sample_number, analyte, amount, final_result, status FROM sample_analytes "
+                            "ORDER BY sample_number, analyte").fetchall()
+        assert rows == [
+            ("20250919_14936", "Abamectin", 150.0, "0.6", "Fail"),
+            ("20250919_14936", "Acephate", 0.0, "ND", "Pass"),
+            ("20250920_14937", "Abamectin", 10.0, "0.2", "Pass"),
+            ("20250920_14937", "Naled", 30.0, "0.6", "Fail"),
+            ("20250921_14938", "Abamectin", 1.0, "Invalid Mass", "-"),
+        ]
+        # JSON ilegible: la muestra queda en 'samples' sin filas por analito
+        assert conn.execute("SELECT COUNT(*) FROM samples").fetchone()[0] == len(V0_ROWS)
+    finally:
+        conn.close()
+
+    # Reabrir no vuelve a migrar
+    conn = ps_db.connect(db_path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM sample_analytes").fetchone()[0] == 5
+    finally:
+        conn.close()
+
+
+def test_query_analyte_results_filters(tmp_path):
+    db_path = str(tmp_path / "v0.db")
+    _make_v0_db(db_path)
+    conn = ps_db.connect(db_path)
+    try:
+        fails = ps_db.query_analyte_results(conn, status="Fail")
+        assert [(r[0], r[4]) for r in fails] == [("20250919_14936", "Abamectin"), ("20250920_14937", "Naled")]
+        assert fails[0] == ("20250919_14936", "14936", "Cliente A", "2025-09-19", "Abamectin", 150.0, "0.6", "Fail")
+
+        abamectin = ps_db.query_analyte_results(conn, analyte="Abamectin", client_name="Cliente A")
+        assert [r[0] for r in abamectin] == ["20250919_14936", "20250921_14938"]
+        in_range = ps_db.query_analyte_results(conn, analyte="Abamectin", date_from="2025-09-20", date_to="2025-09-21")
+        assert [r[0] for r in in_range] == ["20250920_14937", "20250921_14938"]
+        assert len(ps_db.query_analyte_results(conn)) == 5
+    finally:
+        conn.close()
@@ -0,0 +1,155 @@
+"""
+read_raw_results (DataFrame) e iter_raw_results_rows (fila a fila) leen lo mismo en todos los formatos.
+Caché de raw results parseados (read_raw_results_cached).
+"""
+import csv
+import importlib.util
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+import ps_ingest
+from ps_ingest import RAW_COLUMNS, iter_raw_results_rows, read_raw_results
+from ps_quants_core import RAW_SHEET_NAME
+
+HEADER = ["Sample", "Component", "RT", "Calc Conc", "Mass (mg)", "DF", "Include"]
+RAW_ROWS = [
+    [14936, "Abamectin", 1.1, 0.25, 250, 1, "YES"],
+    [14936.0, " Acephate ", 1.2, "1.5", 250, 1, "yes"],
+    [" 14750 ", "Bifenazate", 1.3, 12, "100", "2.5", "Y"],
+    ["15001-B", "Spinosad A", 1.4, "abc", None, 10, 1],
+    ["15001-B", "Spinosad D", 1.5, None, 1, 10, True],
+    ["15002", "Naled", 1.6, 3, 50, 1, "NO"],
+    ["15002", "Oxamyl", 1.7, 4, 50, 1, None],
+    [None, "Carbaryl", 1.8, 5, 50, 1, "YES"],          # sample vacío: se descarta
+    ["   ", "Carbaryl", 1.9, 5, 50, 1, "YES"],
+    ["15003", None, 2.0, 6, 50, 1, "YES"],             # component vacío: se descarta
+    ["15003", "  ", 2.1, 6, 50, 1, "YES"],
+    ["NA", "Boscalid", 2.2, -1.5, 0, -1, "TRUE"],      # 'NA' es un sample, no un valor vacío
+]
+FORMATS = ["xlsx", "csv", "tsv", "parquet"]
+
+
+def _as_text(value):
+    return "" if value is None else str(value)
+
+
+def _as_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def write_raw_file(path, fmt):
+    if fmt == "xlsx":
+        workbook = Workbook()
+        worksheet = workbook.active
+        worksheet.title = RAW_SHEET_NAME
+        worksheet.append(HEADER)
+        for row in RAW_ROWS:
+            worksheet.append(row)
+        workbook.save(path)
+    elif fmt in ("csv", "tsv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, delimiter="," if fmt == "csv" else "\t")
+            writer.writerow(HEADER)
+            writer.writerows([_as_text(v) for v in row] for row in RAW_ROWS)
+    else:
+        pytest.importorskip("pyarrow")
+        # Parquet tipado: texto en sample/component/include, números (o nulos) en el resto
+        columns = list(zip(*RAW_ROWS))
+        pd.DataFrame({
+            name: [None if v is None else (str(v) if i in (0, 1, 6) else _as_number(v)) for v in values]
+            for i, (name, values) in enumerate(zip(HEADER, columns))
+        }).to_parquet(path, index=False)
+    return str(path)
+
+
+@pytest.fixture(params=FORMATS)
+def raw_file(request, tmp_path):
+    return write_raw_file(tmp_path / f"raw.{request.param}", request.param)
+
+
+@pytest.mark.parametrize("include_only", [True, False])
+def test_dataframe_and_streaming_readers_agree(raw_file, include_only):
+    expected = read_raw_results(raw_file)
+    if include_only:
+        expected = expected[expected["include"]]
+    expected = expected.reset_index(drop=True)
+    streamed = pd.DataFrame(list(iter_raw_results_rows(raw_file, include_only=include_only)),
+                            columns=list(RAW_COLUMNS))
+    pd.testing.assert_frame_equal(streamed, expected, check_dtype=False)
+
+
+def test_empty_sample_and_component_cells_are_dropped(raw_file):
+    df = read_raw_results(raw_file)
+    assert "nan" not in set(df["sample"]) and "nan" not in set(df["component"])
+    assert "Carbaryl" not in set(df["component"])
+    assert df["sample"].tolist()[:3] == ["14936", "14936", "14750"]
+    assert df["sample"].tolist()[-1] == "NA"
+    assert len(df) == 8
+
+RAW_CSV = (
+    "Sample,Component,x,Calc Conc,Mass (mg),DF,Include\n"
+    "14936.0,Abamectin,,1.25,500.5,5,YES\n"
+    "14936.0,Acephate,,0,500.5,5,YES\n"
+    " 14937 ,Spinosad,,0.1,480,5,NO\n"
+)
+
+
+@pytest.fixture
+def raw_csv(tmp_path):
+    path = tmp_path / "20250101_raw.csv"
+    path.write_text(RAW_CSV, encoding="utf-8")
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def reset_cache_state(monkeypatch):
+    monkeypatch.setattr(ps_ingest, "RAW_CACHE_STATS", {"hits": 0, "misses": 0})
+    monkeypatch.setattr(ps_ingest, "_RAW_CACHE_WARNED", set())
+
+
+@pytest.mark.parametrize("cache_format", ["parquet", "pickle"])
+def test_cached_matches_uncached(tmp_path, raw_csv, monkeypatch, cache_format):
+    if cache_format == "parquet":
+        pytest.importorskip("pyarrow")
+    monkeypatch.setattr(ps_ingest, "_raw_cache_format", lambda: cache_format)
+    cache_dir = str(tmp_path / "cache")
+    expected = ps_ingest.read_raw_results(raw_csv)
+
+    first = ps_ingest.read_raw_results_cached(raw_csv, cache_dir=cache_dir)
+    second = ps_ingest.read_raw_results_cached(raw_csv, cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(first, expected)
+    pd.testing.assert_frame_equal(second, expected)
+    assert ps_ingest.RAW_CACHE_STATS == {"hits": 1, "misses": 1}
+
+    # Contenido distinto => se vuelve a parsear
+    with open(raw_csv, "a", encoding="utf-8") as f:
+        f.write("14938,Naled,,2,400,1,YES\n")
+    third = ps_ingest.read_raw_results_cached(raw_csv, cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(third, ps_ingest.read_raw_results(raw_csv))
+    assert ps_ingest.RAW_CACHE_STATS == {"hits": 1, "misses": 2}
+
+
+def test_pickle_fallback_warns_once(tmp_path, raw_csv, monkeypatch, capsys):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name, *args: None if name == "pyarrow"
+                        else find_spec(name, *args))
+    cache_dir = tmp_path / "cache"
+    ps_ingest.read_raw_results_cached(raw_csv, cache_dir=str(cache_dir))
+    ps_ingest.read_raw_results_cached(raw_csv, cache_dir=str(cache_dir))
+    assert capsys.readouterr().out.count("pyarrow") == 1
+    assert ps_ingest.RAW_CACHE_STATS == {"hits": 1, "misses": 1}
+    assert any(p.suffix == ".pkl" for p in cache_dir.iterdir())
+
+
+def test_unusable_cache_dir_warns_once(tmp_path, raw_csv, capsys):
+    not_a_dir = tmp_path / "file"
+    not_a_dir.write_text("x")
+    for _ in range(2):
+        df = ps_ingest.read_raw_results_cached(raw_csv, cache_dir=str(not_a_dir / "cache"))
+        pd.testing.assert_frame_equal(df, ps_ingest.read_raw_results(raw_csv))
+    assert capsys.readouterr().out.count("sin caché") == 1
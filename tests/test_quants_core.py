@@ -0,0 +1,127 @@
+"""
+calculate_results_matrix coincide celda a celda con el cálculo escalar.
+Normalización de Amounts pegados (normalize_amount_text / parse_pasted_amounts).
+Mapeo memorizado de componentes a analitos.
+"""
+import numpy as np
+import pytest
+
+from ps_quants_core import (
+    ANALYTES, LOQ, STATE_LIMITS, calculate_final_result, calculate_results_matrix, status_for_result,
+    normalize_amount_text, parse_pasted_amounts,
+    map_component_to_analyte, map_components_to_analytes, component_mapping_cache_info, _map_component_cached,
+)
+
+SEED = 20251018
+MASSES = [250.0, 100.0, 1.0, 0.5, 0.0, -5.0, float("nan"), float("inf")]
+DILUTION_FACTORS = [1.0, 2.5, 10.0, 0.0, -1.0, -2.5]
+
+
+def _boundary_rows():
+    """(amounts, mass_mg, dilution_factor) con los bordes de LOQ, límites y valores inválidos."""
+    rows = []
+    mass, df = 100.0, 2.0
+    loq_amount = LOQ * mass / df
+    # LOQ: justo debajo (ND), exacto y justo encima
+    rows.append(([np.nextafter(loq_amount, 0.0), loq_amount, np.nextafter(loq_amount, np.inf)]
+                 * len(ANALYTES))[:len(ANALYTES)])
+    # State limit: exacto (Pass), redondeado al límite y medio paso de 3 cifras por encima/debajo
+    for rel in (-1e-3, -5e-4, 0.0, 4e-4, 5e-4, 2.5e-3, 5e-3, 1e-2):
+        rows.append([STATE_LIMITS[a] * mass / df * (1.0 + rel) for a in ANALYTES])
+    # Amounts no finitos, negativos y cero
+    rows.append(([float("inf"), float("-inf"), float("nan"), -3.0, 0.0, -0.0] * len(ANALYTES))[:len(ANALYTES)])
+    return [(row, mass, df) for row in rows]
+
+
+def _random_rows(rng, n_samples):
+    rows = []
+    for _ in range(n_samples):
+        amounts = 10.0 ** rng.uniform(-4, 4, len(ANALYTES))
+        amounts[rng.random(len(ANALYTES)) < 0.4] = 0.0
+        special = rng.random(len(ANALYTES)) < 0.05
+        amounts[special] = rng.choice([np.inf, -np.inf, np.nan, -1.0], special.sum())
+        rows.append((amounts.tolist(), float(rng.choice(MASSES)), float(rng.choice(DILUTION_FACTORS))))
+    return rows
+
+
+@pytest.mark.parametrize("source", ["boundaries", "random"])
+def test_results_matrix_matches_scalar(source):
+    if source == "boundaries":
+        rows = _boundary_rows()
+        # Las mismas filas con masa 0 / NaN / negativa (Invalid Mass) y DF negativo
+        rows += [(amounts, mass, df) for amounts, _, _ in rows[:1] + rows[-1:]
+                 for mass, df in ((0.0, 1.0), (float("nan"), 1.0), (-1.0, 1.0), (100.0, -2.0))]
+    else:
+        rows = _random_rows(np.random.default_rng(SEED), 200)
+    amounts = np.array([r[0] for r in rows])
+    calc = calculate_results_matrix(amounts, [r[1] for r in rows], [r[2] for r in rows])
+
+    for i, (amount_row, mass_mg, dilution_factor) in enumerate(rows):
+        for j, analyte in enumerate(ANALYTES):
+            expected = calculate_final_result(amount_row[j], mass_mg, dilution_factor)
+            assert calc["final_result"][i, j] == expected, (amount_row[j], mass_mg, dilution_factor)
+            assert calc["status"][i, j] == status_for_result(expected, analyte), (amount_row[j], analyte)
+
+
+def test_results_matrix_labels():
+    calc = calculate_results_matrix([[0.0, float("inf"), float("nan"), 5.0, 5.0]], 0.0, 1.0,
+                                    analytes=ANALYTES[:5])
+    assert calc["final_result"][0].tolist() == ["ND", "Invalid Amt", "Invalid Amt", "Invalid Mass", "Invalid Mass"]
+    assert calc["status"][0].tolist() == ["Pass", "-", "-", "-", "-"]
+
+    limit = STATE_LIMITS["Abamectin"]
+    calc = calculate_results_matrix([[limit * 100.0, limit * 100.0 * 1.01, LOQ * 100.0 * 0.999]], 100.0, 1.0,
+                                    analytes=["Abamectin"] * 3)
+    assert calc["final_result"][0].tolist() == [f"{limit:g}", f"{limit * 1.01:g}", "ND"]
+    assert calc["status"][0].tolist() == ["Pass", "Fail", "Pass"]
+
+
+@pytest.mark.parametrize("cell, expected", [
+    ("", "0"),
+    ("   ", "0"),
+    ("12.5", "12.5"),
+    ("1,5", "1.5"),
+    ("0,123", "0.123"),
+    ("12,3456", "12.3456"),
+    ("1.234,5", "1234.5"),
+    ("1,234.5", "1234.5"),
+    ("1,234", "1234"),               # separador de miles inglés, no 1.234
+    ("1,234,567", "1234567"),
+    ("-1,234", "-1234"),
+    ("1 234,5", "1234.5"),
+    ("1,23,4", "1,23,4"),            # ambiguo: queda inválido (Invalid Amt)
+    ("abc", "abc"),
+])
+def test_normalize_amount_text(cell, expected):
+    assert normalize_amount_text(cell) == expected
+
+
+def test_parse_pasted_amounts_thousands():
+    text = "Abamectin\t1,234\r\nAcephate\t0,5\r\nAldicarb\t1,234,567\r\nBifenazate\t\r\n"
+    assert parse_pasted_amounts(text) == ["1234", "0.5", "1234567", "0"]
+
+
+COMPONENT_NAMES = {
+    "Permethrins 1": "Permethrins*",
+    "Abamectin  II": "Abamectin",
+    "Spinosad (2)": "Spinosad*",
+    "Pyrethrins": "Pyrethrins*",
+    "  Naled ": "Naled",
+    "Malathion A": "Malathion A",
+    "Cypermethrin-1": "Cypermethrin-1",
+}
+
+
+def test_map_components_to_analytes_and_cache_info():
+    _map_component_cached.cache_clear()
+    components = list(COMPONENT_NAMES) * 50
+    mapped = map_components_to_analytes(components)
+    assert mapped.tolist() == [COMPONENT_NAMES[name] for name in components]
+    # Cada nombre distinto se mapea una vez (factorize antes del memo)
+    info = component_mapping_cache_info()
+    assert (info.hits, info.misses, info.currsize) == (0, len(COMPONENT_NAMES), len(COMPONENT_NAMES))
+
+    # Fila a fila (lectura streaming) o en una segunda corrida: todo sale del memo
+    assert [map_component_to_analyte(name) for name in components] == mapped.tolist()
+    info = component_mapping_cache_info()
+    assert (info.hits, info.misses) == (len(components), len(COMPONENT_NAMES))
@@ -0,0 +1,44 @@
+"""Todos los writers de REPORT_WRITERS producen el mismo .xlsx celda por celda."""
+import pytest
+from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
+
+from ps_quants_core import ANALYTES
+from ps_reports import REPORT_WRITERS, build_export_rows, make_sample_info, write_sample_report
+
+SAMPLES = [
+    # (sample_number, client_name, sample_date, dilution_factor, mass_mg, {analito: Amount})
+    ("14936", "", "2025-09-19", 1.0, 250.0, {}),
+    ("14750", "Cliente A", "2025-09-13", 2.5, 100.0,
+     {"Abamectin": 12.5, "Acephate": 0.001, "Bifenazate": 999.5, "Naled": 0.0995, "Oxamyl": 3.14159}),
+    ("15001-B", "  espacios  ", "2025-01-01", 10, 1.0, {"Spinosad*": 123456.789, "Carbaryl": 9.995}),
+    ("15002", "Cliente <&>", "2025-01-02", 1.0, 0.0, {"Abamectin": 1.0}),       # Invalid Mass
+    ("15003", "=SUM(A1)", "2025-01-03", 1.0, 50.0, {"Abamectin": 5.0}),         # texto con forma de fórmula: el template delega al streaming
+]
+
+
+def _read_report(path):
+    worksheet = load_workbook(path).active
+    cells = [[(cell.value, cell.data_type) for cell in row] for row in worksheet.iter_rows()]
+    widths = [worksheet.column_dimensions[get_column_letter(col)].width for col in range(1, 7)]
+    return cells, widths
+
+
+@pytest.mark.parametrize("sample", SAMPLES, ids=[s[0] for s in SAMPLES])
+def test_writers_equivalent(tmp_path, sample):
+    sample_number, client_name, sample_date, dilution_factor, mass_mg, amounts = sample
+    export_data, _ = build_export_rows(amounts, mass_mg, dilution_factor)
+    sample_info = make_sample_info(sample_number, client_name, sample_date, dilution_factor, mass_mg)
+
+    reports = {}
+    for writer in REPORT_WRITERS:
+        path = tmp_path / f"{writer}.xlsx"
+        write_sample_report(str(path), export_data, sample_info, writer=writer)
+        reports[writer] = _read_report(path)
+
+    expected_cells, expected_widths = reports["pandas"]
+    assert len(expected_cells) == 7 + len(ANALYTES)
+    for writer in REPORT_WRITERS:
+        cells, widths = reports[writer]
+        assert cells == expected_cells, writer
+        assert widths == expected_widths, writer
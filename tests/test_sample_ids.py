@@ -0,0 +1,141 @@
+"""
+normalize_sample_id_column y normalize_sample_id_text dan, celda a celda, lo
+mismo que la versión original de la app (_baseline_normalize_sample_id_text).
+"""
+import glob
+import os
+import random
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from ps_ingest import normalize_raw_results
+from ps_quants_core import normalize_sample_id_column, normalize_sample_id_text
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Reportes de ejemplo del repo: el Sample Number está en B1 y en el nombre (<fecha>_<sample>_PSQuants.xlsx)
+REPORT_FILES = sorted(glob.glob(os.path.join(REPO_DIR, "*_PSQuants.xlsx")))
+
+EDGE_CASES = [
+    "14936.0", " 14936 ", "14936", 14936, 14936.0, "-12", "+7", "007", "0", "-0", "-0.0", "0.0",
+    None, np.nan, float("nan"), pd.NA, float("inf"), "inf", "nan", "NaN", "",
+    "  ", "ABC-123", "14936.5", 14936.5, "1e3", "1E3", "1.0e3", "12.0 ", ".0", "0.0.0", "1_000",
+    2 ** 53, 2 ** 53 + 1, 2 ** 63, 2 ** 64 + 3, -(2 ** 53) - 1, float(2 ** 53), float(2 ** 60), 1e20, 1e300,
+    "9007199254740993", "9007199254740993.0", "123456789012345678901234567890",
+    "12345678901234567890.0", "1234567890123456.7", "0.1234567890123456789", "99999999999999999999.5",
+    "999999999999999999", "-999999999999999999", "1000000000000000000", "+0", "00", "٣", "1 2", "--1",
+    True, False,
+]
+
+
+def _baseline_normalize_sample_id_text(x):
+    """
+    Copia literal de PSCalculatorApp._normalize_sample_id_text (ps_calculator_app.py
+    antes de ps_quants_core), usada como referencia.
+    """
+    if x is None:
+        return ""
+    s = str(x).strip()
+    # quita .0 al final si es float-like
+    if s.endswith(".0"):
+        try:
+            f = float(s)
+            if f.is_integer():
+                return str(int(f))
+        except:
+            pass
+    # intenta castear a num y detectar entero
+    try:
+        v = pd.to_numeric(s, errors='coerce')
+        if pd.notna(v) and float(v).is_integer():
+            return str(int(v))
+    except:
+        pass
+    return s
+
+
+def assert_parity(values):
+    expected = [_baseline_normalize_sample_id_text(v) for v in values]
+    assert [normalize_sample_id_text(v) for v in values] == expected
+    assert list(normalize_sample_id_column(values)) == expected
+
+
+def _committed_sample_ids():
+    ids = []
+    for path in REPORT_FILES:
+        ids.append(load_workbook(path, read_only=True).active["B1"].value)
+        ids.append(os.path.basename(path).split("_")[1])
+    return ids
+
+
+def test_committed_report_sample_ids():
+    ids = _committed_sample_ids()
+    assert len(ids) >= 2
+    variants = []
+    for sample_id in ids:
+        variants += [sample_id, f" {sample_id} ", f"{sample_id}.0", f"{sample_id}.0 "]
+        try:
+            variants += [int(sample_id), float(sample_id)]
+        except ValueError:
+            pass
+    assert_parity(pd.Series(variants, dtype=object))
+    numeric = [float(v) for v in variants if isinstance(v, (int, float))]
+    assert_parity(pd.Series(numeric, dtype=np.float64))      # como columna numérica de Excel
+
+
+def test_edge_cases():
+    assert_parity(pd.Series(EDGE_CASES, dtype=object))
+    for value in EDGE_CASES:
+        assert_parity(pd.Series([value], dtype=object))
+
+
+def test_numeric_dtypes():
+    assert_parity(pd.Series([14936.0, 1.5, np.nan, 2.0 ** 53, 2.0 ** 60, -3.0, 1e300, float("inf")]))
+    assert_parity(pd.Series([14936, 2 ** 53 + 1, -5], dtype=np.int64))
+    assert_parity(pd.Series([14936, None, 3], dtype="Int64"))
+    assert_parity(pd.Series([14936.0, 2.5], dtype=np.float32))
+
+
+def test_random_ids():
+    rng = random.Random(20250919)
+    values = []
+    for _ in range(5000):
+        kind = rng.randrange(6)
+        n = rng.randrange(10 ** rng.randrange(1, 25))
+        if kind == 0:
+            values.append(n)
+        elif kind == 1:
+            values.append(float(n))
+        elif kind == 2:
+            values.append(f"{rng.choice(['', ' ', '  '])}{n}{rng.choice(['', '.0', '.00', '.5', ' '])}")
+        elif kind == 3:
+            values.append(f"{n}-{rng.choice('ABC')}")
+        elif kind == 4:
+            values.append(rng.choice([None, np.nan, ""]))
+        else:
+            values.append(str(rng.uniform(-1e6, 1e6)))
+    assert_parity(pd.Series(values, dtype=object))
+    assert_parity(pd.Series([v for v in values if isinstance(v, str)], dtype=object))
+
+
+def test_plain_integer_ids():
+    values = [f"{sign}{'0' * zeros}{rng}" for sign in ("", "+", "-") for zeros in (0, 2)
+              for rng in (0, 7, 14936, 10 ** 15 + 1, 10 ** 17 - 1, 10 ** 18 - 1, 10 ** 18, 2 ** 63)]
+    assert_parity(pd.Series(values, dtype=object))
+
+
+def test_empty_sample_cells_are_dropped():
+    # Celdas vacías de la columna A: NaN en una columna numérica (Excel) o None / NaN / '' en una de texto
+    def raw_frame(samples):
+        n = len(samples)
+        return pd.DataFrame({
+            "Sample": samples, "Component": ["Abamectin"] * n, "RT": [1.0] * n, "Calc Conc": [1.0] * n,
+            "Mass (mg)": [250.0] * n, "DF": [1.0] * n, "Include": ["YES"] * n,
+        })
+
+    numeric = raw_frame(pd.Series([14936.0, np.nan, 14937.0]))
+    assert normalize_raw_results(numeric)["sample"].tolist() == ["14936", "14937"]
+    text = raw_frame(pd.Series(["14936", None, "", "  ", np.nan, pd.NA, "nan", "14937.0", " 14938 "], dtype=object))
+    # El texto 'nan' sí es un Sample Number; las celdas vacías no generan un sample 'nan'
+    assert normalize_raw_results(text)["sample"].tolist() == ["14936", "nan", "14937", "14938"]
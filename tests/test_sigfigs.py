@@ -0,0 +1,114 @@
+"""format_sigfigs_array / round_sigfigs_array contra la versión escalar (valor por valor)."""
+import math
+import random
+import struct
+
+import numpy as np
+import pytest
+
+from ps_sigfigs import (
+    _MAX_TABLE_SIG, _sigfig_parts, format_sigfigs_array, format_sigfigs_no_sci, round_sigfigs,
+    round_sigfigs_array,
+)
+
+SIGS = tuple(sorted({1, 2, 3, 4, 5, 6, 9, _MAX_TABLE_SIG, _MAX_TABLE_SIG + 1}))
+SPECIAL = [0.0995, 9.995, 999.5, 0.9995, 99.95, 2.675, 1.005, 0.5, 1.5, 2.5, 0.1, 1.0, 10.0, 1000.0,
+           1e22, 1e-22, 1e23, 1e-23, 2.0 ** 53, 2.0 ** 53 + 2, 9.995e22, 5e-324, 1e300,
+           0.0, -0.0, math.inf, -math.inf, math.nan]
+
+
+def _neighbours(value, steps=3):
+    out = [value]
+    up = down = value
+    for _ in range(steps):
+        up, down = np.nextafter(up, math.inf), np.nextafter(down, -math.inf)
+        out += [float(up), float(down)]
+    return out
+
+
+def _edge_values():
+    values = list(SPECIAL)
+    for k in range(-25, 26):
+        # Vecinos de potencias de 10 (near_power) y de empates .5 en 1-4 cifras (near_tie)
+        for base in (10.0 ** k, 9.995 * 10.0 ** k, 9.95 * 10.0 ** k, 1.005 * 10.0 ** k,
+                     1.235 * 10.0 ** k, 4.5 * 10.0 ** k):
+            values += _neighbours(base)
+    return values + [-v for v in values]
+
+
+def _random_values(seed, n=20000):
+    rng = random.Random(seed)
+    values = []
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.3:
+            v = rng.randint(1, 99999) / 10 ** rng.randint(0, 8) * rng.choice([1, 10, 100])
+        elif r < 0.6:
+            v = 10 ** rng.uniform(-12, 12)
+        elif r < 0.8:
+            v = (rng.randint(1, 9999) + 0.5) * 10.0 ** rng.randint(-10, 10)
+        else:
+            v = struct.unpack("d", struct.pack("Q", rng.getrandbits(64)))[0]
+        values.append(-v if rng.random() < 0.3 else v)
+    return values
+
+
+def _scalar_round(x, sig):
+    if x == 0 or not math.isfinite(x):
+        return x
+    return round_sigfigs(x, sig)[0]
+
+
+def _same_float(a, b):
+    if math.isnan(a) or math.isnan(b):
+        return math.isnan(a) and math.isnan(b)
+    return a == b and math.copysign(1.0, a) == math.copysign(1.0, b)
+
+
+def assert_parity(values, sig):
+    expected_texts, expected_rounded, ok = [], [], []
+    for x in values:
+        try:
+            expected_texts.append(format_sigfigs_no_sci(x, sig=sig))
+            expected_rounded.append(_scalar_round(x, sig))
+            ok.append(x)
+        except OverflowError:
+            # round() desborda (p.ej. 9.9e307 a 1 cifra): la versión array también debe fallar
+            with pytest.raises(OverflowError):
+                format_sigfigs_array([x], sig=sig)
+            with pytest.raises(OverflowError):
+                round_sigfigs_array([x], sig=sig)
+    texts = format_sigfigs_array(np.array(ok), sig=sig)
+    rounded = round_sigfigs_array(np.array(ok), sig=sig)
+    for x, text, expected in zip(ok, texts.tolist(), expected_texts):
+        assert text == expected, (x, sig)
+    for x, value, expected in zip(ok, rounded.tolist(), expected_rounded):
+        assert _same_float(value, expected), (x, sig)
+
+
+@pytest.mark.parametrize("sig", SIGS)
+def test_edge_values(sig):
+    assert_parity(_edge_values(), sig)
+
+
+@pytest.mark.parametrize("sig", SIGS)
+def test_random_values(sig):
+    assert_parity(_random_values(seed=sig), sig)
+
+
+def test_edge_values_exercise_fallbacks():
+    # Los vecinos de potencias de 10 / empates tienen que pasar por la versión escalar
+    _, nonzero, _, _, fast = _sigfig_parts(np.array(_edge_values()), 3)
+    assert (nonzero & ~fast).sum() > 100
+
+
+def test_known_outputs():
+    texts = format_sigfigs_array([0.0995, 9.995, 999.5, -9.995, -0.0, math.inf, math.nan, 0.0])
+    assert texts.tolist() == ["0.0995", "9.99", "1000", "-9.99", "0", "0", "0", "0"]
+
+
+def test_shape_is_preserved():
+    values = np.array([[1.234, 0.0], [math.inf, -5.555]])
+    assert format_sigfigs_array(values).tolist() == [["1.23", "0"], ["0", "-5.55"]]
+    assert round_sigfigs_array(values).shape == (2, 2)
+    assert format_sigfigs_array(3.14159).shape == ()